@@ -1,9 +1,13 @@
 from django.contrib import admin
 from .models import Category, Season, Occasion, Product
+from . import search
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
-    list_display = ('name',)
+    list_display = ('breadcrumb', 'depth')
+    ordering = ('breadcrumb',)
+    search_fields = ['name']
+    readonly_fields = ('path', 'depth', 'breadcrumb')
 
 @admin.register(Season)
 class SeasonAdmin(admin.ModelAdmin):
@@ -23,3 +27,9 @@ class ProductAdmin(admin.ModelAdmin):
     list_filter = ('available', 'is_seasonal', 'category', 'season', 'occasions')
     search_fields = ('name', 'description')
     autocomplete_fields = ['season', 'occasions']
+
+    def get_search_results(self, request, queryset, search_term):
+        # Use the FTS5 index instead of LIKE '%term%' scans
+        if not search_term:
+            return queryset, False
+        return search.filter_queryset(queryset, search_term), False
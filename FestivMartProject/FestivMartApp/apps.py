@@ -1,5 +1,12 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_migrate
 
 
 class FestivmartappConfig(AppConfig):
     name = 'FestivMartApp'
+
+    def ready(self):
+        from . import database, signals
+        post_migrate.connect(signals.restore_search_index, sender=self)
+        connection_created.connect(database.configure_connection)
@@ -0,0 +1,105 @@
+"""
+Batch cart mutations.
+
+apply_cart_operations() takes a list of add/set/remove operations keyed by
+product, folds them over the cart's current quantities in memory and then
+writes the result in one transaction: one upsert on the (cart, product)
+unique pair for everything that stays in the cart and one DELETE for
+everything that leaves it.
+"""
+from django.db import transaction
+
+from .models import CartItem, Product
+
+MAX_OPERATIONS = 100
+OPERATIONS = ('add', 'set', 'remove')
+
+
+class CartOperationError(ValueError):
+    """Raised when a batch is rejected; `errors` maps operation index to message."""
+
+    def __init__(self, errors):
+        super().__init__('Invalid cart operations')
+        self.errors = errors
+
+
+def parse_operations(raw):
+    """Validate the request payload into (op, product_id, quantity) tuples."""
+    if not isinstance(raw, list) or not raw:
+        raise CartOperationError({'operations': 'A non-empty list of operations is required.'})
+    if len(raw) > MAX_OPERATIONS:
+        raise CartOperationError({'operations': f'At most {MAX_OPERATIONS} operations per request.'})
+
+    parsed, errors = [], {}
+    for index, entry in enumerate(raw):
+        if not isinstance(entry, dict):
+            errors[index] = 'Operation must be an object.'
+            continue
+        op = entry.get('op')
+        if op not in OPERATIONS:
+            errors[index] = f"op must be one of {', '.join(OPERATIONS)}."
+            continue
+        try:
+            product_id = int(entry.get('product_id'))
+            quantity = int(entry.get('quantity', 1 if op == 'add' else 0))
+        except (TypeError, ValueError):
+            errors[index] = 'product_id and quantity must be integers.'
+            continue
+        if op == 'add' and quantity < 1:
+            errors[index] = 'add needs a positive quantity.'
+            continue
+        parsed.append((index, op, product_id, quantity))
+    if errors:
+        raise CartOperationError(errors)
+    return parsed
+
+
+def apply_cart_operations(cart, raw_operations):
+    """
+    Apply a batch of operations to a saved cart atomically.
+
+    Returns the number of products whose quantity changed. Raises
+    CartOperationError (and writes nothing) if any operation is invalid.
+    """
+    operations = parse_operations(raw_operations)
+    product_ids = {product_id for _, _, product_id, _ in operations}
+
+    with transaction.atomic():
+        current = dict(
+            CartItem.objects.filter(cart=cart, product_id__in=product_ids)
+            .values_list('product_id', 'quantity')
+        )
+        quantities = dict(current)
+        for _, op, product_id, quantity in operations:
+            if op == 'add':
+                quantities[product_id] = quantities.get(product_id, 0) + quantity
+            elif op == 'set':
+                quantities[product_id] = max(quantity, 0)
+            else:
+                quantities[product_id] = 0
+
+        keep = {pk: qty for pk, qty in quantities.items() if qty > 0 and qty != current.get(pk)}
+        drop = [pk for pk, qty in quantities.items() if qty <= 0 and pk in current]
+
+        new_ids = set(keep) - set(current)
+        if new_ids:
+            available = set(
+                Product.objects.filter(id__in=new_ids, available=True).values_list('id', flat=True)
+            )
+            missing = new_ids - available
+            if missing:
+                raise CartOperationError({
+                    index: 'Product not found.'
+                    for index, _, product_id, _ in operations if product_id in missing
+                })
+
+        if keep:
+            CartItem.objects.bulk_create(
+                [CartItem(cart=cart, product_id=pk, quantity=qty) for pk, qty in keep.items()],
+                update_conflicts=True,
+                unique_fields=['cart', 'product'],
+                update_fields=['quantity'],
+            )
+        if drop:
+            CartItem.objects.filter(cart=cart, product_id__in=drop).delete()
+    return len(keep) + len(drop)
@@ -0,0 +1,207 @@
+"""
+Server-side catalog engine for the shop page and the product listing API.
+
+Filtering happens in SQL and pages are fetched with keyset (cursor)
+pagination, so page N costs the same as page 1 no matter how deep the
+shopper scrolls.
+"""
+import base64
+import datetime
+import json
+from decimal import Decimal, InvalidOperation
+
+from django.db.models import Q
+
+from .categories import get_category_tree
+from .models import Product
+
+PAGE_SIZE = 24
+MAX_PAGE_SIZE = 100
+
+# sort key -> (ordering field, descending)
+SORT_ORDERS = {
+    'newest': ('created_at', True),
+    'price-low': ('price', False),
+    'price-high': ('price', True),
+}
+SORT_ALIASES = {'featured': 'newest'}
+DEFAULT_SORT = 'newest'
+
+
+class InvalidCursor(ValueError):
+    """Raised when a pagination cursor cannot be decoded."""
+
+
+def _parse_decimal(value):
+    if value in (None, ''):
+        return None
+    try:
+        return Decimal(str(value))
+    except InvalidOperation:
+        return None
+
+
+def _parse_flag(value):
+    return str(value).lower() in ('1', 'true', 'on', 'yes')
+
+
+def encode_cursor(sort, value, pk):
+    """Encode the sort key of the last row on a page into an opaque token."""
+    if isinstance(value, datetime.datetime):
+        value = value.isoformat()
+    else:
+        value = str(value)
+    raw = json.dumps([sort, value, pk], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token, sort):
+    """Decode a cursor produced by encode_cursor for the given sort order."""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        cursor_sort, value, pk = json.loads(base64.urlsafe_b64decode(padded))
+        pk = int(pk)
+        if cursor_sort != sort:
+            raise InvalidCursor('Cursor does not match sort order')
+        field, _ = SORT_ORDERS[sort]
+        if field == 'created_at':
+            value = datetime.datetime.fromisoformat(value)
+        else:
+            value = Decimal(value)
+    except InvalidCursor:
+        raise
+    except (ValueError, TypeError, KeyError, InvalidOperation, json.JSONDecodeError) as exc:
+        raise InvalidCursor('Malformed cursor') from exc
+    return value, pk
+
+
+class CatalogPage:
+    """One page of catalog results plus the cursor for the next page."""
+
+    def __init__(self, products, next_cursor):
+        self.products = products
+        self.next_cursor = next_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+
+class CatalogQuery:
+    """Filters and sort order for a catalog listing."""
+
+    def __init__(self, categories=None, min_price=None, max_price=None,
+                 seasonal=False, in_stock=False, on_sale=False,
+                 sort=DEFAULT_SORT, page_size=PAGE_SIZE):
+        sort = SORT_ALIASES.get(sort, sort)
+        self.categories = [int(c) for c in (categories or [])]
+        self.min_price = min_price
+        self.max_price = max_price
+        self.seasonal = seasonal
+        self.in_stock = in_stock
+        self.on_sale = on_sale
+        self.sort = sort if sort in SORT_ORDERS else DEFAULT_SORT
+        self.page_size = max(1, min(page_size, MAX_PAGE_SIZE))
+
+    @classmethod
+    def from_params(cls, params):
+        """Build a query from request.GET (or any QueryDict-like mapping)."""
+        categories = [c for c in params.getlist('category') if c.isdigit()]
+        try:
+            page_size = int(params.get('page_size', PAGE_SIZE))
+        except (TypeError, ValueError):
+            page_size = PAGE_SIZE
+        return cls(
+            categories=categories,
+            min_price=_parse_decimal(params.get('min_price')),
+            max_price=_parse_decimal(params.get('max_price')),
+            seasonal=_parse_flag(params.get('seasonal', '')),
+            in_stock=_parse_flag(params.get('in_stock', '')),
+            on_sale=_parse_flag(params.get('on_sale', '')),
+            sort=params.get('sort', DEFAULT_SORT),
+            page_size=page_size,
+        )
+
+    def queryset(self):
+        """Filtered, sorted queryset (without the cursor condition)."""
+        qs = Product.objects.filter(available=True).select_related('category')
+        if self.categories:
+            # A category matches everything in its subtree
+            qs = qs.filter(get_category_tree().subtree_q(self.categories))
+        if self.min_price is not None:
+            qs = qs.filter(price__gte=self.min_price)
+        if self.max_price is not None:
+            qs = qs.filter(price__lte=self.max_price)
+        if self.seasonal:
+            qs = qs.filter(is_seasonal=True)
+        if self.in_stock:
+            qs = qs.filter(stock__gt=0)
+        if self.on_sale:
+            qs = qs.filter(discount_percent__gt=0)
+
+        field, descending = SORT_ORDERS[self.sort]
+        prefix = '-' if descending else ''
+        return qs.order_by(prefix + field, prefix + 'id')
+
+    def page_queryset(self, cursor=None):
+        """The rows of the page after `cursor`, plus one to tell whether another page exists."""
+        qs = self.queryset()
+        if cursor:
+            field, descending = SORT_ORDERS[self.sort]
+            value, pk = decode_cursor(cursor, self.sort)
+            op = 'lt' if descending else 'gt'
+            # The inclusive bound is implied by the OR below, but SQLite can
+            # only seek the keyset index on a plain range
+            qs = qs.filter(**{f'{field}__{op}e': value}).filter(
+                Q(**{f'{field}__{op}': value}) |
+                Q(**{field: value, f'id__{op}': pk})
+            )
+        return qs[:self.page_size + 1]
+
+    def page(self, cursor=None):
+        """
+        Fetch the page that follows `cursor` (or the first page).
+
+        Raises InvalidCursor if the token is malformed.
+        """
+        rows = list(self.page_queryset(cursor))
+        field, _ = SORT_ORDERS[self.sort]
+        next_cursor = None
+        if len(rows) > self.page_size:
+            rows = rows[:self.page_size]
+            last = rows[-1]
+            next_cursor = encode_cursor(self.sort, getattr(last, field), last.id)
+        return CatalogPage(rows, next_cursor)
+
+    def to_params(self):
+        """Query parameters that reproduce this query (without a cursor)."""
+        params = [('category', c) for c in self.categories]
+        if self.min_price is not None:
+            params.append(('min_price', self.min_price))
+        if self.max_price is not None:
+            params.append(('max_price', self.max_price))
+        for flag in ('seasonal', 'in_stock', 'on_sale'):
+            if getattr(self, flag):
+                params.append((flag, '1'))
+        if self.sort != DEFAULT_SORT:
+            params.append(('sort', self.sort))
+        if self.page_size != PAGE_SIZE:
+            params.append(('page_size', self.page_size))
+        return params
+
+
+def serialize_product(product):
+    """Compact JSON representation of a product for listing responses."""
+    return {
+        'id': product.id,
+        'name': product.name,
+        'price': float(product.price),
+        'discounted_price': float(product.discounted_price),
+        'discount_percent': product.discount_percent,
+        'category': product.category.name,
+        'category_id': product.category_id,
+        'image': product.get_image_url('thumb'),
+        'image_webp': product.get_image_url('thumb', 'webp'),
+        'is_seasonal': product.is_seasonal,
+        'is_in_stock': product.is_in_stock,
+    }
@@ -0,0 +1,112 @@
+"""
+In-process cache of the category tree.
+
+The whole taxonomy (15 roots with ~6 children each) is loaded in a single
+query and kept in memory. A version token in Django's cache is replaced on
+every Category change so other worker processes rebuild on their next read.
+"""
+import threading
+import uuid
+
+from django.core.cache import cache
+from django.db.models import Q
+
+from .models import Category
+from .replicas import primary_reads
+
+VERSION_KEY = 'festivmart:category_tree:version'
+
+_lock = threading.Lock()
+_state = {'version': None, 'tree': None}
+
+
+class CategoryNode:
+    """A category with its children, detached from the ORM."""
+
+    def __init__(self, category):
+        self.id = category.id
+        self.name = category.name
+        self.parent_id = category.parent_id
+        self.path = category.path
+        self.depth = category.depth
+        self.breadcrumb = category.breadcrumb or category.name
+        self.children = []
+
+    def __str__(self):
+        return self.breadcrumb
+
+
+class CategoryTree:
+    def __init__(self, categories):
+        self.nodes = {c.id: CategoryNode(c) for c in categories}
+        self.roots = []
+        for node in sorted(self.nodes.values(), key=lambda n: n.name):
+            parent = self.nodes.get(node.parent_id)
+            if parent is None:
+                self.roots.append(node)
+            else:
+                parent.children.append(node)
+
+    def __iter__(self):
+        """Depth-first walk, parents before their children."""
+        stack = list(reversed(self.roots))
+        while stack:
+            node = stack.pop()
+            yield node
+            stack.extend(reversed(node.children))
+
+    def get(self, category_id):
+        return self.nodes.get(category_id)
+
+    def breadcrumbs(self, category_id):
+        """Nodes from the root down to the given category."""
+        node = self.nodes.get(category_id)
+        if node is None:
+            return []
+        ids = [int(pk) for pk in node.path.strip('/').split('/') if pk]
+        return [self.nodes[pk] for pk in ids if pk in self.nodes]
+
+    def subtree_q(self, category_ids, prefix='category__'):
+        """
+        Q object matching rows whose category lies under any of the given ids.
+
+        Uses the materialized path, so "everything under X" is one range
+        scan of the path index instead of a recursive walk.
+        """
+        query = Q()
+        for category_id in category_ids:
+            node = self.nodes.get(int(category_id))
+            if node is not None:
+                query |= Category.subtree_q(node.path, field=f'{prefix}path')
+        if not query:
+            # Unknown ids match nothing rather than everything
+            return Q(pk__in=[])
+        return query
+
+
+def _current_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # First reader after a restart or cache flush picks the token
+        cache.add(VERSION_KEY, uuid.uuid4().hex, timeout=None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def get_category_tree():
+    """Return the cached tree, rebuilding it when another process changed it."""
+    version = _current_version()
+    tree = _state['tree']
+    if tree is not None and _state['version'] == version:
+        return tree
+    with _lock:
+        if _state['tree'] is None or _state['version'] != version:
+            with primary_reads():
+                _state['tree'] = CategoryTree(Category.objects.all())
+            _state['version'] = version
+        return _state['tree']
+
+
+def invalidate_category_tree():
+    cache.set(VERSION_KEY, uuid.uuid4().hex, timeout=None)
+    _state['tree'] = None
@@ -0,0 +1,128 @@
+"""
+Order placement.
+
+place_order() turns a cart into an Order inside one transaction:
+
+* the cart is re-priced inside the transaction, so the order matches what
+  is actually being bought;
+* stock for every line is reserved with a single conditional UPDATE
+  (``stock = stock - qty WHERE stock >= qty``), so two shoppers racing for
+  the last units cannot both win and stock never goes negative;
+* if any line cannot be reserved the whole transaction rolls back and
+  InsufficientStock names the short products;
+* order lines are written with one bulk_create, the order is credited
+  to the points ledger and the cart is emptied before commit;
+* once committed, the order feeds the related-products index and the
+  cached detail payloads of its products, which show stock, are
+  invalidated.
+"""
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+
+from . import points, product_detail, related
+from .models import CartItem, Order, OrderItem, Product
+from .pricing import compute_totals
+
+
+class EmptyCart(Exception):
+    """Raised when there is nothing in the cart to order."""
+
+
+class InsufficientStock(Exception):
+    """Raised when stock could not be reserved; `shortages` maps product id to units available."""
+
+    def __init__(self, shortages, names=None):
+        self.shortages = shortages
+        self.names = names or {}
+        listed = ', '.join(self.names.get(pk, str(pk)) for pk in shortages)
+        super().__init__(f'Not enough stock for: {listed}')
+
+
+def _per_product(items, value):
+    return Case(
+        *[When(pk=item.product_id, then=Value(value(item))) for item in items],
+        output_field=IntegerField(),
+    )
+
+
+def reserve_stock(items):
+    """
+    Decrement stock for every (product, quantity) line in one statement.
+
+    Returns True if every line was reserved. Must run inside a transaction:
+    on False some rows may have been decremented and the caller rolls back.
+    """
+    quantity = _per_product(items, lambda item: item.quantity)
+    reserved = (
+        Product.objects.filter(pk__in=[item.product_id for item in items], available=True)
+        .filter(stock__gte=quantity)
+        .update(stock=F('stock') - quantity)
+    )
+    return reserved == len(items)
+
+
+def place_order(cart, user, **details):
+    """
+    Create an Order from `cart` for `user`; `details` are the address and
+    payment fields of Order. Raises EmptyCart or InsufficientStock, in which
+    case nothing is written.
+    """
+    with transaction.atomic():
+        totals = compute_totals(cart)
+        if totals.is_empty:
+            raise EmptyCart()
+        items = totals.items
+        if not reserve_stock(items):
+            transaction.set_rollback(True)
+            shortage_items = items
+        else:
+            shortage_items = None
+            order = Order.objects.create(
+                user=user,
+                subtotal=totals.subtotal,
+                discount_amount=totals.discount_amount,
+                tax_amount=totals.tax_amount,
+                shipping_cost=totals.shipping_cost,
+                total=totals.total,
+                coupon_code=totals.coupon_code,
+                **details,
+            )
+            OrderItem.objects.bulk_create([
+                OrderItem(
+                    order=order,
+                    product_id=item.product_id,
+                    product_name=item.product.name,
+                    quantity=item.quantity,
+                    unit_price=item.unit_price,
+                    line_total=item.line_total,
+                )
+                for item in items
+            ])
+            CartItem.objects.filter(cart=cart).delete()
+            points.order_placed(order)
+            transaction.on_commit(lambda: _after_commit(order, items), robust=True)
+            if cart.coupon_code or cart.discount_percent:
+                cart.coupon_code = None
+                cart.discount_percent = 0
+                cart.save(update_fields=['coupon_code', 'discount_percent', 'updated_at'])
+
+    if shortage_items is not None:
+        raise _shortages(shortage_items)
+    return order
+
+
+def _after_commit(order, items):
+    related.record_order(order.pk)
+    # The stock UPDATE bypasses signals; cached detail payloads carry stock
+    product_detail.invalidate_products([item.product_id for item in items])
+
+
+def _shortages(items):
+    """Work out which lines were short, after the failed reservation rolled back."""
+    wanted = {item.product_id: item.quantity for item in items}
+    names = {item.product_id: item.product.name for item in items}
+    stock = dict(
+        Product.objects.filter(pk__in=wanted, available=True).values_list('id', 'stock')
+    )
+    shortages = {pk: stock.get(pk, 0) for pk, qty in wanted.items() if stock.get(pk, 0) < qty}
+    return InsufficientStock(shortages, names)
@@ -0,0 +1,147 @@
+"""
+SQLite production mode: connection pragmas and retried write transactions.
+
+Under concurrent writers, stock SQLite fails with "database is locked":
+rollback journaling blocks readers while anyone writes, and a deferred
+transaction that reads first and then writes cannot wait for the lock,
+it fails on the spot. In production mode (SQLITE_PRODUCTION_MODE, off
+by default; the settings turn it on when FESTIVMART_SQLITE_PRODUCTION=1
+is in the environment)
+
+* every new connection runs SQLITE_PRAGMAS (configure_connection, on
+  connection_created): WAL, so readers never block the writer or each
+  other; synchronous=NORMAL, safe with WAL and one fsync per checkpoint
+  rather than per commit; a busy timeout, so a writer waits for the lock;
+  and a larger page cache and memory-mapped reads;
+* transactions start with BEGIN IMMEDIATE (the transaction_mode option),
+  taking the write lock up front, where the busy timeout applies;
+* connections persist across requests (CONN_MAX_AGE);
+* the write views run through retry_locked: one transaction per
+  request, run again with jittered exponential backoff if it still hits
+  a lock (SQLITE_WRITE_RETRIES times at most);
+* those transactions queue at a write gate (SQLITE_WRITE_GATE): a lock in
+  the process and an flock on a file next to the database across
+  processes. SQLite's busy handler polls, with sleeps growing to 100 ms,
+  so a writer that has waited a while keeps losing the lock to newcomers
+  and can wait out the whole busy timeout; the gate wakes the next writer
+  in the process as soon as the last one is done, and polls the file
+  lock every GATE_POLL seconds. A writer that has not passed the gate
+  within SQLITE_WRITE_GATE_TIMEOUT seconds fails with "database is
+  locked", so it is retried like any other lock.
+
+Out of production mode, none of this applies: stock SQLite settings, no
+retries and no gate.
+"""
+import contextlib
+import functools
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections, router, transaction
+
+from . import metrics
+
+try:
+    import fcntl
+except ImportError:  # Not POSIX: writers rely on the busy timeout alone
+    fcntl = None
+
+# Safe methods do not write, so run as they are
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+MAX_BACKOFF = 1.0
+# Seconds between attempts on the write gate's file lock
+GATE_POLL = 0.002
+
+# {lock file path: (thread lock, open lock file)}, one per process
+_gates = {}
+_gates_lock = threading.Lock()
+
+
+def production_mode():
+    return getattr(settings, 'SQLITE_PRODUCTION_MODE', False)
+
+
+def configure_connection(sender, connection, **kwargs):
+    """connection_created receiver applying SQLITE_PRAGMAS to a new SQLite connection."""
+    if connection.vendor != 'sqlite' or not production_mode():
+        return
+    with connection.cursor() as cursor:
+        for name, value in getattr(settings, 'SQLITE_PRAGMAS', {}).items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+def is_locked(exc):
+    return isinstance(exc, OperationalError) and 'locked' in str(exc)
+
+
+@contextlib.contextmanager
+def _file_gate(path, timeout):
+    deadline = time.monotonic() + timeout
+    with _gates_lock:
+        if path not in _gates:
+            _gates[path] = (threading.Lock(), open(path, 'a'))
+        lock, handle = _gates[path]
+    if not lock.acquire(timeout=timeout):
+        raise OperationalError('database is locked (write gate)')
+    try:
+        while True:
+            try:
+                fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                if time.monotonic() >= deadline:
+                    raise OperationalError('database is locked (write gate)')
+                time.sleep(GATE_POLL)
+        try:
+            yield
+        finally:
+            fcntl.flock(handle, fcntl.LOCK_UN)
+    finally:
+        lock.release()
+
+
+def write_gate(using=DEFAULT_DB_ALIAS):
+    """
+    Context manager holding the write gate of `using` for an outermost
+    transaction on a SQLite file; anything else passes straight through.
+    """
+    connection = connections[using]
+    if (fcntl is None or not production_mode() or not getattr(settings, 'SQLITE_WRITE_GATE', False)
+            or connection.vendor != 'sqlite' or connection.in_atomic_block or connection.is_in_memory_db()):
+        return contextlib.nullcontext()
+    return _file_gate(f"{connection.settings_dict['NAME']}-writers",
+                      getattr(settings, 'SQLITE_WRITE_GATE_TIMEOUT', 5.0))
+
+
+def run_with_retry(fn, using=DEFAULT_DB_ALIAS):
+    """
+    Run fn() in a transaction on `using`, again after a backoff each time it
+    fails on a lock. Inside an outer transaction it runs once: a retry
+    could not undo the outer transaction's work. Count what fn() does
+    with metrics.inc_on_commit, so an attempt run again counts once.
+    """
+    retries = getattr(settings, 'SQLITE_WRITE_RETRIES', 0) if production_mode() else 0
+    backoff = getattr(settings, 'SQLITE_RETRY_BACKOFF', 0.05)
+    attempt = 0
+    while True:
+        try:
+            with write_gate(using), transaction.atomic(using=using):
+                return fn()
+        except OperationalError as exc:
+            if not is_locked(exc) or attempt >= retries or connections[using].in_atomic_block:
+                raise
+        metrics.inc('festivmart_db_lock_retries_total')
+        time.sleep(min(backoff * 2 ** attempt, MAX_BACKOFF) * random.uniform(0.5, 1.5))
+        attempt += 1
+
+
+def retry_locked(view):
+    """Run a view's unsafe-method requests through run_with_retry on the write database."""
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method in SAFE_METHODS:
+            return view(request, *args, **kwargs)
+        return run_with_retry(lambda: view(request, *args, **kwargs), using=router.db_for_write(None))
+    return wrapper
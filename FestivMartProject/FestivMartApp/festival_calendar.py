@@ -0,0 +1,152 @@
+"""
+Festival calendar served as pre-serialized JSON.
+
+Seasons and occasions change a few times a year, so each calendar year is
+serialized once into bytes and cached together with a strong ETag. The
+cache keys carry a version token that is replaced whenever a Season or
+Occasion is saved or deleted, so every year is rebuilt from the new data
+on its next request. Building a year reads only the rows that touch it,
+through the date indexes on both tables.
+
+A range of years is answered by splicing the cached per-year bodies
+together, without decoding or re-serializing them. Without a range the
+API keeps its original answer, every season and occasion, cached the
+same way as one body.
+
+Bodies expire after BODY_TIMEOUT, so those left under a replaced token
+do not stay in the cache for good.
+"""
+import datetime
+import hashlib
+import json
+import uuid
+
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import Occasion, Season
+from .replicas import primary_reads
+
+VERSION_KEY = 'festivmart:calendar:version'
+BODY_TIMEOUT = 24 * 3600
+MAX_YEARS = 10
+MIN_YEAR, MAX_YEAR = 1900, 2999
+
+
+class InvalidRange(ValueError):
+    pass
+
+
+class CalendarBody:
+    """Serialized JSON and its ETag."""
+
+    def __init__(self, body, etag):
+        self.body = body
+        self.etag = etag
+
+
+def _version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, uuid.uuid4().hex, timeout=None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def _etag(body):
+    return '"%s"' % hashlib.sha1(body).hexdigest()
+
+
+def year_key(version, year):
+    return f'festivmart:calendar:{version}:{year}'
+
+
+def all_key(version, year):
+    return f'festivmart:calendar:{version}:all:{year}'
+
+
+def _serialize(data):
+    body = json.dumps(data, cls=DjangoJSONEncoder).encode()
+    return CalendarBody(body, _etag(body))
+
+
+@primary_reads()
+def build_year(year):
+    """Serialize the seasons overlapping `year` and its occasions."""
+    first, last = datetime.date(year, 1, 1), datetime.date(year, 12, 31)
+    seasons = (
+        Season.objects.filter(start_date__lte=last, end_date__gte=first)
+        .order_by('start_date', 'id')
+        .values('name', 'start_date', 'end_date', 'description')
+    )
+    occasions = (
+        Occasion.objects.filter(date__range=(first, last))
+        .order_by('date', 'id')
+        .values('name', 'date', 'description')
+    )
+    return _serialize({'year': year, 'seasons': list(seasons), 'occasions': list(occasions)})
+
+
+@primary_reads()
+def build_all(year):
+    """Serialize every season and occasion, labelled with the current `year`."""
+    seasons = Season.objects.order_by('start_date', 'id').values('name', 'start_date', 'end_date', 'description')
+    occasions = Occasion.objects.order_by('date', 'id').values('name', 'date', 'description')
+    return _serialize({'year': year, 'seasons': list(seasons), 'occasions': list(occasions)})
+
+
+def get_all(year):
+    key = all_key(_version(), year)
+    body = cache.get(key)
+    if body is None:
+        body = build_all(year)
+        cache.set(key, body, BODY_TIMEOUT)
+    return body
+
+
+def get_years(years):
+    """Cached bodies for the given years, building the missing ones."""
+    version = _version()
+    keys = {year: year_key(version, year) for year in years}
+    found = cache.get_many(keys.values())
+    bodies = {}
+    for year, key in keys.items():
+        body = found.get(key)
+        if body is None:
+            body = build_year(year)
+            cache.set(key, body, BODY_TIMEOUT)
+        bodies[year] = body
+    return [bodies[year] for year in years]
+
+
+def get_year(year):
+    return get_years([year])[0]
+
+
+def get_range(first, last):
+    """One body covering the years first..last inclusive."""
+    parts = get_years(list(range(first, last + 1)))
+    body = b''.join([
+        b'{"from": %d, "to": %d, "years": [' % (first, last),
+        b', '.join(part.body for part in parts),
+        b']}',
+    ])
+    return CalendarBody(body, _etag(b''.join(part.etag.encode() for part in parts)))
+
+
+def parse_range(start, end, default):
+    """Validate ?from=&to= year parameters into (first, last)."""
+    try:
+        first = int(start) if start else default
+        last = int(end) if end else first
+    except ValueError:
+        raise InvalidRange('from and to must be years')
+    if not (MIN_YEAR <= first <= last <= MAX_YEAR):
+        raise InvalidRange(f'Years must be within {MIN_YEAR}-{MAX_YEAR}, from before to')
+    if last - first + 1 > MAX_YEARS:
+        raise InvalidRange(f'At most {MAX_YEARS} years per request')
+    return first, last
+
+
+def invalidate_calendar():
+    cache.set(VERSION_KEY, uuid.uuid4().hex, timeout=None)
@@ -0,0 +1,307 @@
+"""
+Proxy and disk cache for product images given as an external image_url.
+
+Shoppers' browsers used to fetch those images from whatever host the
+seller linked, at full size. Product.get_image_url() now points them at
+
+    /img/<signed url>/<size>.<jpg|webp>
+
+and this module serves the image from a local disk cache:
+
+* the URL is signed, so the endpoint only fetches URLs the shop itself
+  handed out and cannot be used as an open proxy;
+* on a miss the remote image is fetched once and normalized into every
+  size and format of images.SIZES / images.FORMATS, the same derivatives
+  uploads get. Concurrent misses for the same URL in a process wait for
+  the first fetch instead of starting their own (single flight);
+* the cache directory is bounded by IMAGE_PROXY_CACHE_BYTES and evicts
+  least recently used files: a hit refreshes the file's mtime and
+  eviction deletes the oldest files first;
+* a failed fetch is remembered for FAILURE_TIMEOUT seconds and answered
+  with the placeholder, so a dead host is not retried on every request;
+* every connection, redirects included, resolves the host once, refuses
+  private addresses and connects to the address it vetted, so a host
+  cannot rebind its name to an internal address between the check and
+  the fetch. The Host header, SNI and certificate check still use the
+  name.
+
+The placeholder shown for products without an image is generated here
+too, in the same sizes, instead of being linked from a third-party host.
+Cached files never change for a given name, so responses are marked
+immutable; a seller changing image_url changes the name.
+"""
+import hashlib
+import http.client
+import io
+import ipaddress
+import os
+import socket
+import tempfile
+import threading
+import urllib.parse
+import urllib.request
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.urls import reverse
+from PIL import Image, ImageDraw
+
+from .images import FORMATS, SIZES, render
+
+SALT = 'festivmart.image-proxy'
+DEFAULT_SIZE = 'medium'
+MAX_BYTES = 10 * 1024 * 1024
+FETCH_TIMEOUT = 5
+FAILURE_TIMEOUT = 300
+# Eviction trims the cache to this fraction of its bound, so it runs rarely
+LOW_WATER = 0.9
+EXTENSIONS = {fmt: ext for fmt, (ext, options) in FORMATS.items()}
+CONTENT_TYPES = {'jpg': 'image/jpeg', 'webp': 'image/webp'}
+
+
+class FetchError(Exception):
+    pass
+
+
+def cache_dir():
+    return getattr(settings, 'IMAGE_PROXY_CACHE_DIR', None) or os.path.join(
+        tempfile.gettempdir(), 'festivmart-images'
+    )
+
+
+def max_bytes():
+    return getattr(settings, 'IMAGE_PROXY_CACHE_BYTES', 512 * 1024 * 1024)
+
+
+def proxy_url(url, size=None, fmt='jpeg'):
+    token = signing.Signer(salt=SALT).sign_object(url)
+    return reverse('image_proxy', args=(token, size or DEFAULT_SIZE, EXTENSIONS[fmt]))
+
+
+def placeholder_url(size=None, fmt='jpeg'):
+    return reverse('image_placeholder', args=(size or DEFAULT_SIZE, EXTENSIONS[fmt]))
+
+
+def unsign(token):
+    """The URL in a proxy token, or None if it was not issued by us."""
+    try:
+        return signing.Signer(salt=SALT).unsign_object(token)
+    except signing.BadSignature:
+        return None
+
+
+def _key(url):
+    return hashlib.sha256(url.encode()).hexdigest()[:32]
+
+
+def _path(key, size, ext):
+    return os.path.join(cache_dir(), f'{key}-{size}.{ext}')
+
+
+class DiskLRU:
+    """Byte-bounded directory of files, least recently used evicted first."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.total = None
+
+    def _scan(self, directory):
+        entries = []
+        with os.scandir(directory) as it:
+            for entry in it:
+                if entry.is_file() and not entry.name.endswith('.tmp'):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def touch(self, path):
+        try:
+            os.utime(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def write(self, files):
+        """Write {path: bytes} atomically, then evict if over the bound."""
+        directory = cache_dir()
+        os.makedirs(directory, exist_ok=True)
+        written = 0
+        for path, data in files.items():
+            tmp = f'{path}.{threading.get_ident()}.tmp'
+            with open(tmp, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, path)
+            written += len(data)
+        with self.lock:
+            if self.total is None:
+                self.total = sum(size for mtime, size, path in self._scan(directory))
+            else:
+                self.total += written
+            if self.total > max_bytes():
+                self._evict(directory)
+
+    def _evict(self, directory):
+        # Re-scan: other processes share the directory
+        entries = sorted(self._scan(directory))
+        self.total = sum(size for mtime, size, path in entries)
+        target = max_bytes() * LOW_WATER
+        for mtime, size, path in entries:
+            if self.total <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self.total -= size
+
+
+lru = DiskLRU()
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+
+def _check_url(url):
+    parts = urllib.parse.urlsplit(url)
+    if parts.scheme not in ('http', 'https') or not parts.hostname:
+        raise FetchError(f'Unsupported image URL: {url}')
+
+
+def _resolve(host, port):
+    try:
+        return [info[4][0] for info in socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)]
+    except socket.gaierror as exc:
+        raise FetchError(str(exc))
+
+
+def vetted_address(host, port):
+    """An address of `host` to connect to; FetchError if any of them is not public."""
+    addresses = _resolve(host, port)
+    if not getattr(settings, 'IMAGE_PROXY_ALLOW_PRIVATE', False):
+        for address in addresses:
+            ip = ipaddress.ip_address(address.split('%')[0])
+            if not ip.is_global:
+                raise FetchError(f'Refusing to fetch from {ip}')
+    return addresses[0]
+
+
+def _connect_vetted(address, *args, **kwargs):
+    host, port = address
+    return socket.create_connection((vetted_address(host, port), port), *args, **kwargs)
+
+
+class _VettedHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._create_connection = _connect_vetted
+
+
+class _VettedHTTPSConnection(http.client.HTTPSConnection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._create_connection = _connect_vetted
+
+
+class _VettedHTTPHandler(urllib.request.HTTPHandler):
+    def http_open(self, req):
+        return self.do_open(_VettedHTTPConnection, req)
+
+
+class _VettedHTTPSHandler(urllib.request.HTTPSHandler):
+    def https_open(self, req):
+        return self.do_open(_VettedHTTPSConnection, req, context=self._context)
+
+
+class _CheckedRedirects(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        _check_url(newurl)
+        return super().redirect_request(req, fp, code, msg, headers, newurl)
+
+
+# An empty ProxyHandler ignores *_proxy variables: a proxy would connect to addresses we never vetted
+_opener = urllib.request.build_opener(
+    urllib.request.ProxyHandler({}), _VettedHTTPHandler, _VettedHTTPSHandler, _CheckedRedirects,
+)
+
+
+def fetch(url):
+    """Download a remote image, at most MAX_BYTES."""
+    _check_url(url)
+    request = urllib.request.Request(url, headers={'User-Agent': 'FestivMart image proxy'})
+    try:
+        with _opener.open(request, timeout=FETCH_TIMEOUT) as response:
+            data = response.read(MAX_BYTES + 1)
+    except (OSError, ValueError, http.client.HTTPException) as exc:
+        raise FetchError(str(exc))
+    if len(data) > MAX_BYTES:
+        raise FetchError(f'Image larger than {MAX_BYTES} bytes')
+    return data
+
+
+def _failure_key(key):
+    return f'festivmart:image-proxy:failed:{key}'
+
+
+def _fill(url, key):
+    """Fetch and normalize `url` into every derivative. Returns False on failure."""
+    if cache.get(_failure_key(key)):
+        return False
+    try:
+        rendered = render(fetch(url))
+    except (FetchError, OSError, ValueError, Image.DecompressionBombError):
+        cache.set(_failure_key(key), True, FAILURE_TIMEOUT)
+        return False
+    lru.write({
+        _path(key, size, ext): data
+        for size, formats in rendered.items() for fmt, (ext, data) in formats.items()
+    })
+    return True
+
+
+def get(url, size, ext):
+    """Path of the cached derivative of `url`, fetching it on a miss; None if it cannot be had."""
+    key = _key(url)
+    path = _path(key, size, ext)
+    if lru.touch(path):
+        return path
+    with _inflight_lock:
+        flight = _inflight.get(key)
+        leader = flight is None
+        if leader:
+            flight = _inflight[key] = threading.Event()
+    if leader:
+        try:
+            _fill(url, key)
+        finally:
+            with _inflight_lock:
+                del _inflight[key]
+            flight.set()
+    else:
+        flight.wait(FETCH_TIMEOUT * 2)
+    return path if os.path.exists(path) else None
+
+
+def placeholder(size, ext):
+    """Path of the generated "no image" placeholder in the given size."""
+    path = _path('placeholder', size, ext)
+    if lru.touch(path):
+        return path
+    edge = SIZES[size]
+    image = Image.new('RGB', (edge, edge), '#F3F4F6')
+    draw = ImageDraw.Draw(image)
+    # A simple picture frame icon, so the tile reads as "no photo"
+    box = [edge * 0.3, edge * 0.32, edge * 0.7, edge * 0.68]
+    draw.rectangle(box, outline='#D1D5DB', width=max(2, edge // 80))
+    draw.polygon(
+        [(edge * 0.34, edge * 0.64), (edge * 0.46, edge * 0.48), (edge * 0.56, edge * 0.58),
+         (edge * 0.6, edge * 0.53), (edge * 0.66, edge * 0.64)],
+        fill='#D1D5DB',
+    )
+    draw.ellipse([edge * 0.58, edge * 0.38, edge * 0.64, edge * 0.44], fill='#D1D5DB')
+    files = {}
+    for fmt, (fmt_ext, options) in FORMATS.items():
+        buffer = io.BytesIO()
+        image.save(buffer, fmt.upper(), **options)
+        files[_path('placeholder', size, fmt_ext)] = buffer.getvalue()
+    lru.write(files)
+    return path
@@ -0,0 +1,206 @@
+"""
+Responsive product image derivatives.
+
+Grids show products in 220px tiles but used to download the original
+upload. Every uploaded image now gets smaller derivatives,
+
+    thumb   fits 320x320  (grid tiles, cart, related products)
+    medium  fits 800x800  (product modal and detail API)
+
+each as JPEG and WebP, stored under content-hashed names
+(products/derived/<sha256 prefix>.<ext>): a derivative's URL changes
+whenever its bytes do, so it can be cached forever, and identical images
+share files. Product.image_variants records the names together with the
+upload they were made from, and Product.get_image_url(size) falls back to
+the original while derivatives are missing or stale. When a product's
+derivatives are replaced, the old files that no product names any more
+are deleted, by store() and, for saves that overwrote image_variants,
+after the save commits.
+
+Resizing is CPU bound, so it runs in a process pool outside the web
+processes: `generate_image_derivatives --loop` picks up new uploads (and
+the command alone backfills existing images) with generate(), whose
+workers only decode and encode bytes; storage and database writes stay
+in the command's process. With IMAGE_WORKERS = 0, uploads are resized
+inline after commit instead (schedule()).
+"""
+import hashlib
+import io
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db.models import F, Q
+from PIL import Image, ImageOps
+
+from . import product_detail
+from .models import Product
+
+logger = logging.getLogger(__name__)
+
+SIZES = {'thumb': 320, 'medium': 800}
+FORMATS = {
+    'jpeg': ('jpg', {'quality': 82, 'optimize': True, 'progressive': True}),
+    'webp': ('webp', {'quality': 80, 'method': 4}),
+}
+DERIVED_DIR = 'products/derived'
+# Images handed to the pool at a time by generate()
+BATCH_SIZE = 64
+
+
+def workers():
+    return getattr(settings, 'IMAGE_WORKERS', None) or os.cpu_count() or 1
+
+
+def render(data):
+    """Encode every size and format of an image: {size: {fmt: (ext, bytes)}}."""
+    with Image.open(io.BytesIO(data)) as original:
+        image = ImageOps.exif_transpose(original)
+        if image.mode in ('RGBA', 'LA', 'P'):
+            image = image.convert('RGBA')
+            flat = Image.new('RGB', image.size, 'white')
+            flat.paste(image, mask=image.getchannel('A'))
+            image = flat
+        elif image.mode != 'RGB':
+            image = image.convert('RGB')
+        rendered = {}
+        for size, edge in SIZES.items():
+            resized = image.copy()
+            resized.thumbnail((edge, edge), Image.Resampling.LANCZOS)
+            rendered[size] = {}
+            for fmt, (ext, options) in FORMATS.items():
+                buffer = io.BytesIO()
+                resized.save(buffer, fmt.upper(), **options)
+                rendered[size][fmt] = (ext, buffer.getvalue())
+    return rendered
+
+
+def content_name(data, ext):
+    return f'{DERIVED_DIR}/{hashlib.sha256(data).hexdigest()[:24]}.{ext}'
+
+
+def _derive(job):
+    """Pool worker: (pk, source, bytes) -> (pk, source, rendered or None, error)."""
+    pk, source, data = job
+    try:
+        return pk, source, render(data), None
+    except (OSError, ValueError, Image.DecompressionBombError) as exc:
+        return pk, source, None, str(exc)
+
+
+def _job(product):
+    with product.image.open('rb') as f:
+        return product.pk, product.image.name, f.read()
+
+
+def variant_names(variants):
+    return {
+        name for size in SIZES for fmt in FORMATS
+        if (name := ((variants or {}).get(size) or {}).get(fmt))
+    }
+
+
+def prune(names):
+    """Delete the derivative files in `names` that no product refers to."""
+    if not names:
+        return
+    referenced = Q()
+    for size in SIZES:
+        for fmt in FORMATS:
+            referenced |= Q(**{f'image_variants__{size}__{fmt}__in': names})
+    in_use = set()
+    for variants in Product.objects.filter(referenced).values_list('image_variants', flat=True):
+        in_use |= variant_names(variants)
+    for name in set(names) - in_use:
+        default_storage.delete(name)
+
+
+def store(pk, source, rendered):
+    """Save derivatives and point the product at them, unless its image changed meanwhile."""
+    previous = Product.objects.filter(pk=pk).values_list('image_variants', flat=True).first()
+    variants = {'source': source}
+    files = {}
+    for size, formats in rendered.items():
+        variants[size] = {}
+        for fmt, (ext, data) in formats.items():
+            name = content_name(data, ext)
+            if not default_storage.exists(name):
+                name = default_storage.save(name, ContentFile(data))
+            variants[size][fmt] = name
+            files[name] = data
+    # update() skips the product signals; the image does not affect search,
+    # merchandising or points, only the cached detail payloads
+    if not Product.objects.filter(pk=pk, image=source).update(image_variants=variants):
+        return False
+    # A shared file may have been pruned by another product's store()
+    # between the exists() check and the update; once this product names
+    # it, later prunes keep it
+    for name, data in files.items():
+        if not default_storage.exists(name):
+            default_storage.save(name, ContentFile(data))
+    prune(list(variant_names(previous) - set(files)))
+    product_detail.invalidate_products([pk])
+    product_detail.invalidate_listing(pk)
+    return True
+
+
+def _finish(result):
+    pk, source, rendered, error = result
+    if rendered is None:
+        logger.warning('Could not derive images for product %s (%s): %s', pk, source, error)
+        return False
+    return store(pk, source, rendered)
+
+
+def schedule(product_ids):
+    """
+    Derive newly uploaded images inline when IMAGE_WORKERS = 0 (tests,
+    management shells). Otherwise they stay pending(), showing the
+    original, until `generate_image_derivatives --loop` gets to them.
+    """
+    if getattr(settings, 'IMAGE_WORKERS', None) != 0:
+        return
+    for product in Product.objects.filter(pk__in=product_ids).exclude(image=''):
+        _finish(_derive(_job(product)))
+
+
+def pending(force=False):
+    """Products with an uploaded image whose derivatives are missing or stale."""
+    products = Product.objects.exclude(image='').exclude(image__isnull=True).only('image', 'image_variants')
+    if force:
+        return products
+    return products.filter(Q(image_variants__source__isnull=True) | ~Q(image_variants__source=F('image')))
+
+
+def generate(products, max_workers=None, batch_size=BATCH_SIZE, failures=None):
+    """
+    Backfill `products` with a process pool; returns (generated, failed)
+    and appends (pk, image name) of each failure to `failures` if given.
+    """
+    generated = failed = 0
+    failures = [] if failures is None else failures
+    products = products.order_by('pk')
+    last_pk = 0
+    with ProcessPoolExecutor(max_workers=max_workers or workers()) as pool:
+        while True:
+            batch = list(products.filter(pk__gt=last_pk)[:batch_size])
+            if not batch:
+                return generated, failed
+            last_pk = batch[-1].pk
+            jobs = []
+            for product in batch:
+                try:
+                    jobs.append(_job(product))
+                except OSError as exc:
+                    logger.warning('Could not read image of product %s: %s', product.pk, exc)
+                    failed += 1
+                    failures.append((product.pk, product.image.name))
+            for result in pool.map(_derive, jobs):
+                if _finish(result):
+                    generated += 1
+                else:
+                    failed += 1
+                    failures.append(result[:2])
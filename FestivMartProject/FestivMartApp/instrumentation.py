@@ -0,0 +1,165 @@
+"""
+Per-request SQL and timing instrumentation, without DEBUG.
+
+InstrumentationMiddleware profiles a sample of requests,
+INSTRUMENTATION_SAMPLE_RATE of them (0 turns it off; what is left then is
+a settings lookup and a comparison per request). For a profiled request
+it records
+
+* every SQL query, through a database execute wrapper: the count, the
+  total time, and duplicates, i.e. the same SQL run again in the request,
+  whether with other parameters (the N+1 shape: one query per item of a
+  loop) or the very same ones (repeated lookups);
+* the time spent rendering templates, outermost templates only;
+* the view time (from process_view to the response) and the total.
+
+The figures are sent back in a Server-Timing header, which browser dev
+tools show next to the request (unless INSTRUMENTATION_SERVER_TIMING is
+False), and logged as one JSON line on this module's logger:
+
+    Server-Timing: total;dur=41.2, view;dur=38.9, db;dur=12.5;desc="23 queries, 18 duplicates", tpl;dur=20.1
+
+Streaming responses are timed until the view returns them, before any
+of their content is produced: the time and queries spent streaming it
+are not counted.
+"""
+import contextlib
+import contextvars
+import functools
+import json
+import logging
+import random
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import connections
+from django.template.base import Template
+
+logger = logging.getLogger(__name__)
+
+# Duplicate query shapes listed in the log line, most repeated first
+TOP_DUPLICATES = 3
+SQL_PREVIEW = 300
+
+_current = contextvars.ContextVar('festivmart_request_profile', default=None)
+
+
+class RequestProfile:
+    """Queries and timings of one request; also the execute wrapper collecting them."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.view_started = None
+        self.view_seconds = 0.0
+        self.sql_seconds = 0.0
+        self.template_seconds = 0.0
+        self.template_depth = 0
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.sql_seconds += elapsed
+            self.queries.append((sql, None if many else repr(params), elapsed))
+
+    def duplicates(self):
+        """(queries repeating an earlier query's SQL, those also repeating its parameters, top shapes)."""
+        shapes = Counter(sql for sql, params, elapsed in self.queries)
+        exact = Counter((sql, params) for sql, params, elapsed in self.queries if params is not None)
+        similar = sum(count - 1 for count in shapes.values())
+        repeated = sum(count - 1 for count in exact.values())
+        top = [
+            {'count': count, 'sql': sql[:SQL_PREVIEW]}
+            for sql, count in shapes.most_common(TOP_DUPLICATES) if count > 1
+        ]
+        return similar, repeated, top
+
+
+def _instrument_templates():
+    """Time top-level Template.render calls made while a request is profiled."""
+    original = Template.render
+    if getattr(original, 'instrumented', False):
+        return
+
+    @functools.wraps(original)
+    def render(self, context):
+        profile = _current.get()
+        if profile is None or profile.template_depth:
+            return original(self, context)
+        profile.template_depth += 1
+        start = time.perf_counter()
+        try:
+            return original(self, context)
+        finally:
+            profile.template_seconds += time.perf_counter() - start
+            profile.template_depth -= 1
+
+    render.instrumented = True
+    Template.render = render
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 2)
+
+
+class InstrumentationMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        _instrument_templates()
+
+    def __call__(self, request):
+        rate = getattr(settings, 'INSTRUMENTATION_SAMPLE_RATE', 0)
+        if not rate or (rate < 1 and random.random() >= rate):
+            return self.get_response(request)
+
+        profile = request._request_profile = RequestProfile()
+        token = _current.set(profile)
+        try:
+            with contextlib.ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(profile))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        total = time.perf_counter() - profile.started
+        if profile.view_started is not None:
+            profile.view_seconds = time.perf_counter() - profile.view_started
+        self.report(request, response, profile, total)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        profile = getattr(request, '_request_profile', None)
+        if profile is not None:
+            profile.view_started = time.perf_counter()
+
+    def report(self, request, response, profile, total):
+        similar, repeated, top = profile.duplicates()
+        queries = len(profile.queries)
+        if getattr(settings, 'INSTRUMENTATION_SERVER_TIMING', True):
+            timing = (
+                f'total;dur={_ms(total)}, view;dur={_ms(profile.view_seconds)}, '
+                f'db;dur={_ms(profile.sql_seconds)};desc="{queries} queries, {similar} duplicates", '
+                f'tpl;dur={_ms(profile.template_seconds)}'
+            )
+            if response.has_header('Server-Timing'):
+                timing = f"{response['Server-Timing']}, {timing}"
+            response['Server-Timing'] = timing
+        match = request.resolver_match
+        logger.info(json.dumps({
+            'method': request.method,
+            'path': request.path,
+            'view': match.view_name if match else None,
+            'status': response.status_code,
+            'total_ms': _ms(total),
+            'view_ms': _ms(profile.view_seconds),
+            'db_ms': _ms(profile.sql_seconds),
+            'queries': queries,
+            'duplicate_queries': similar,
+            'repeated_queries': repeated,
+            'template_ms': _ms(profile.template_seconds),
+            'top_duplicates': top,
+        }))
@@ -0,0 +1,164 @@
+"""
+Points leaderboard.
+
+A user's rank is 1 + the number of profiles with strictly more points
+(tied users share a rank). Counting that with ORDER BY or COUNT over
+UserProfile is linear in the number of users, so the counts live in a
+Fenwick (binary indexed) tree over point values, stored sparsely in the
+RankNode table:
+
+* a profile's points map to position SIZE - OFFSET - points, so higher
+  scores come first and "how many score higher" is a prefix sum; the
+  offset gives negative totals (left by a backfill or a listing removed
+  after the profile became a business) their own positions below zero;
+* a prefix sum reads at most BITS nodes and a change of score writes at
+  most 2 * BITS, each in a single statement, whatever the number of users.
+
+The points ledger moves a profile in the tree in the same transaction
+that changes its points. Top-K and "neighbours around me" are index range
+scans on UserProfile(-total_points, id). They name business profiles by
+their business name and everyone else only as a shopper: the endpoint
+is public.
+"""
+from collections import Counter
+
+from django.db import connection, transaction
+from django.db.models import Count
+
+from .models import RankNode, UserProfile
+
+BITS = 25
+SIZE = 1 << BITS
+OFFSET = 1 << 24
+MIN_POINTS, MAX_POINTS = -OFFSET, SIZE - OFFSET - 1
+BATCH_SIZE = 5000
+# Nodes per upsert statement, under SQLite's bound-parameter limit
+UPSERT_BATCH = 400
+
+
+def position(points):
+    return SIZE - OFFSET - min(max(points, MIN_POINTS), MAX_POINTS)
+
+
+def _prefix_nodes(i):
+    while i > 0:
+        yield i
+        i -= i & -i
+
+
+def _update_nodes(i):
+    while i <= SIZE:
+        yield i
+        i += i & -i
+
+
+def _node_deltas(point_deltas):
+    deltas = Counter()
+    for points, delta in point_deltas.items():
+        if delta:
+            for idx in _update_nodes(position(points)):
+                deltas[idx] += delta
+    return {idx: delta for idx, delta in deltas.items() if delta}
+
+
+def apply(point_deltas):
+    """Add `delta` profiles at each `points` value: {points: delta}."""
+    deltas = sorted(_node_deltas(point_deltas).items())
+    if not deltas:
+        return
+    table = connection.ops.quote_name(RankNode._meta.db_table)
+    count = connection.ops.quote_name('count')
+    with connection.cursor() as cursor:
+        for start in range(0, len(deltas), UPSERT_BATCH):
+            batch = deltas[start:start + UPSERT_BATCH]
+            cursor.execute(
+                f'INSERT INTO {table} (idx, {count}) VALUES {", ".join(["(%s, %s)"] * len(batch))} '
+                f'ON CONFLICT (idx) DO UPDATE SET {count} = {table}.{count} + excluded.{count}',
+                [value for pair in batch for value in pair],
+            )
+
+
+def move(old_points, new_points):
+    if old_points != new_points:
+        apply({old_points: -1, new_points: 1})
+
+
+def ranks(points_values):
+    """{points: rank} for several scores, plus the total, in one query."""
+    wanted = {points: list(_prefix_nodes(position(points) - 1)) for points in points_values}
+    idxs = {idx for nodes in wanted.values() for idx in nodes} | {SIZE}
+    counts = dict(RankNode.objects.filter(idx__in=idxs).values_list('idx', 'count'))
+    result = {points: 1 + sum(counts.get(idx, 0) for idx in nodes) for points, nodes in wanted.items()}
+    return result, counts.get(SIZE, 0)
+
+
+def rank(points):
+    return ranks([points])[0][points]
+
+
+def total():
+    return RankNode.objects.filter(idx=SIZE).values_list('count', flat=True).first() or 0
+
+
+def rebuild():
+    """Rebuild the tree from the current profiles (after bulk changes)."""
+    histogram = dict(
+        UserProfile.objects.values('total_points').annotate(n=Count('id')).values_list('total_points', 'n')
+    )
+    nodes = _node_deltas(histogram)
+    with transaction.atomic():
+        RankNode.objects.all().delete()
+        RankNode.objects.bulk_create(
+            [RankNode(idx=idx, count=count) for idx, count in nodes.items()], batch_size=BATCH_SIZE
+        )
+    return sum(histogram.values())
+
+
+FIELDS = ('id', 'is_business', 'business_name', 'total_points', 'level')
+SHOPPER_NAME = 'FestivMart shopper'
+
+
+def _entry(row, rank, me=None):
+    return {
+        'rank': rank,
+        'name': (row['is_business'] and row['business_name']) or SHOPPER_NAME,
+        'points': row['total_points'],
+        'level': row['level'],
+        'is_me': row['id'] == me,
+    }
+
+
+def top(k, me=None):
+    rows = UserProfile.objects.order_by('-total_points', 'id').values(*FIELDS)[:k]
+    entries, previous = [], None
+    for i, row in enumerate(rows, 1):
+        place = entries[-1]['rank'] if previous == row['total_points'] else i
+        entries.append(_entry(row, place, me))
+        previous = row['total_points']
+    return entries
+
+
+def standing(profile, k, around):
+    """Top-K, the profile's own rank and up to `around` profiles either side."""
+    points, pk = profile.total_points, profile.pk
+    profiles = UserProfile.objects.values(*FIELDS)
+    above = sorted(
+        list(profiles.filter(total_points=points, id__lt=pk).order_by('-id')[:around])
+        + list(profiles.filter(total_points__gt=points).order_by('total_points', '-id')[:around]),
+        key=lambda row: (-row['total_points'], row['id']),
+    )[-around:] if around else []
+    below = sorted(
+        list(profiles.filter(total_points=points, id__gt=pk).order_by('id')[:around])
+        + list(profiles.filter(total_points__lt=points).order_by('-total_points', 'id')[:around]),
+        key=lambda row: (-row['total_points'], row['id']),
+    )[:around]
+    neighbours = above + below
+    places, count = ranks({points} | {row['total_points'] for row in neighbours})
+    return {
+        'total': count,
+        'top': top(k, pk),
+        'me': {'rank': places[points], 'points': points, 'level': profile.level,
+               'percentile': round(100 * places[points] / count, 1) if count else None},
+        'above': [_entry(row, places[row['total_points']], pk) for row in above],
+        'below': [_entry(row, places[row['total_points']], pk) for row in below],
+    }
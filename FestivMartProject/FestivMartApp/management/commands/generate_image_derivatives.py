@@ -0,0 +1,47 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from FestivMartApp.images import generate, pending
+from FestivMartApp.models import Product
+
+
+class Command(BaseCommand):
+    help = ("Generate thumbnail and medium JPEG/WebP derivatives for product images "
+            "that do not have current ones, resizing in a process pool. With --loop, keep "
+            "looking for new uploads every IMAGE_DERIVATIVES_POLL_SECONDS.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, help="Worker processes (default: IMAGE_WORKERS or one per CPU)")
+        parser.add_argument('--force', action='store_true', help="Regenerate images that already have derivatives")
+        parser.add_argument('--loop', action='store_true', help="Process new uploads until interrupted")
+
+    def handle(self, *args, loop, **options):
+        force = options['force']
+        # (pk, image) of uploads that could not be processed, skipped until replaced
+        failures = []
+        while True:
+            products = pending(force)
+            if failures:
+                failed = set(failures)
+                failures = [row for row in Product.objects.filter(pk__in=[pk for pk, _ in failed])
+                            .values_list('pk', 'image') if row in failed]
+                products = products.exclude(pk__in=[pk for pk, _ in failures])
+            if not loop or products.exists():
+                self.run(products, options['workers'], failures)
+            if not loop:
+                return
+            # Only the first pass regenerates current derivatives
+            force = False
+            time.sleep(settings.IMAGE_DERIVATIVES_POLL_SECONDS)
+
+    def run(self, products, workers, failures):
+        start = time.perf_counter()
+        generated, failed = generate(products, max_workers=workers, failures=failures)
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f"{generated} images processed in {elapsed:.1f}s ({generated / elapsed if elapsed else 0:.1f}/s)"
+        ))
+        if failed:
+            self.stdout.write(self.style.WARNING(f"{failed} images could not be processed"))
@@ -0,0 +1,50 @@
+import sys
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from FestivMartApp.product_import import BATCH_SIZE, FORMATS, detect_format, import_products
+
+
+class Command(BaseCommand):
+    help = ("Import products from a CSV or JSON Lines file (- for stdin) in batches. "
+            "Bad rows are reported by line number and skipped.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--seller', help="Username of the seller the products are listed by")
+        parser.add_argument('--format', choices=FORMATS, help="Default: from the file extension, else csv")
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument('--dry-run', action='store_true', help="Validate only, write nothing")
+        parser.add_argument('--max-errors', type=int, default=20, help="Errors to print")
+
+    def handle(self, *args, **options):
+        seller = None
+        if options['seller']:
+            seller = User.objects.filter(username=options['seller']).first()
+            if seller is None:
+                raise CommandError(f"No user named {options['seller']!r}")
+        path = options['path']
+        fmt = options['format'] or detect_format(path)
+        if path == '-':
+            result = self.run(sys.stdin.buffer, seller, fmt, options)
+        else:
+            try:
+                with open(path, 'rb') as f:
+                    result = self.run(f, seller, fmt, options)
+            except OSError as exc:
+                raise CommandError(exc)
+
+        for line, message in result.errors[:options['max_errors']]:
+            self.stderr.write(f"line {line}: {message}")
+        if result.failed > options['max_errors']:
+            self.stderr.write(f"... {result.failed - options['max_errors']} more errors")
+        self.stdout.write(self.style.SUCCESS(
+            f"{result.created} products created, {result.failed} rows rejected, "
+            f"{result.rows} rows in {result.seconds:.1f}s ({result.rows_per_second:.0f} rows/s)"
+        ))
+
+    def run(self, f, seller, fmt, options):
+        return import_products(
+            f, seller=seller, fmt=fmt, batch_size=options['batch_size'], dry_run=options['dry_run'],
+        )
@@ -0,0 +1,27 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from FestivMartApp.merchandising import rebuild_snapshot
+
+
+class Command(BaseCommand):
+    help = ("Rebuild the seasonal merchandising snapshot. Schedule it at 00:00 "
+            "in TIME_ZONE so the first shopper of the day gets a warm page.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help="Local date to build (YYYY-MM-DD); defaults to today")
+
+    def handle(self, *args, **options):
+        day = None
+        if options['date']:
+            try:
+                day = datetime.date.fromisoformat(options['date'])
+            except ValueError:
+                raise CommandError("--date must be YYYY-MM-DD")
+        snapshot = rebuild_snapshot(day)
+        self.stdout.write(self.style.SUCCESS(
+            f"{snapshot['date']}: {len(snapshot['product_ids'])} products "
+            f"({snapshot['mode']}), {len(snapshot['seasons'])} seasons, "
+            f"{len(snapshot['occasions'])} occasions"
+        ))
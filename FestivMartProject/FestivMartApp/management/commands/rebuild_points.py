@@ -0,0 +1,17 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from FestivMartApp.points import rebuild_points
+
+
+class Command(BaseCommand):
+    help = ("Recompute every user's points counters, level and badges from their "
+            "products, orders and account age, and record backfill ledger entries.")
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        updated = rebuild_points()
+        self.stdout.write(self.style.SUCCESS(
+            f"{updated} profiles rebuilt in {time.perf_counter() - start:.1f}s"
+        ))
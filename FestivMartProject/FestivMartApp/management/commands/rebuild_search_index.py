@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from FestivMartApp.search import ensure_search_index
+
+
+class Command(BaseCommand):
+    help = "Reinstall the product FTS5 triggers and rebuild the search index."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        if ensure_search_index(options['database'], rebuild=True):
+            self.stdout.write(self.style.SUCCESS("Search index rebuilt."))
+        else:
+            self.stdout.write("Full-text search needs SQLite; nothing to do.")
@@ -0,0 +1,37 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from FestivMartApp import replicas
+
+
+class Command(BaseCommand):
+    help = ("Copy the primary database into each read replica. With --loop, keep "
+            "doing so every REPLICA_REFRESH_SECONDS so replicas stay within REPLICA_MAX_LAG.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('aliases', nargs='*', help="Replicas to refresh (default: settings.REPLICAS)")
+        parser.add_argument('--loop', action='store_true', help="Refresh until interrupted")
+
+    def handle(self, *args, aliases, loop, **options):
+        aliases = aliases or replicas.replica_aliases()
+        unknown = set(aliases) - set(replicas.replica_aliases())
+        if unknown:
+            raise CommandError(f"Not in settings.REPLICAS: {', '.join(sorted(unknown))}")
+        interval = settings.REPLICA_REFRESH_SECONDS
+        while True:
+            started = time.monotonic()
+            for alias in aliases:
+                seconds = replicas.refresh(alias)
+                if not loop:
+                    self.stdout.write(self.style.SUCCESS(f"{alias} refreshed in {seconds:.2f}s"))
+            cycle = time.monotonic() - started + interval
+            if cycle > settings.REPLICA_MAX_LAG:
+                self.stderr.write(self.style.WARNING(
+                    f"Refreshing every replica and waiting {interval}s takes {cycle:.1f}s, more than "
+                    f"REPLICA_MAX_LAG ({settings.REPLICA_MAX_LAG}s): reads will fall back to the primary"
+                ))
+            if not loop:
+                return
+            time.sleep(interval)
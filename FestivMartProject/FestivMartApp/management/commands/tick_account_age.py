@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from FestivMartApp.points import tick_account_age
+
+
+class Command(BaseCommand):
+    help = ("Credit account-age points for the days since the last tick. "
+            "Schedule it daily; missed days are caught up on the next run.")
+
+    def handle(self, *args, **options):
+        credited = tick_account_age()
+        self.stdout.write(self.style.SUCCESS(f"{credited} profiles credited"))
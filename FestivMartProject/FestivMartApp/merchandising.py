@@ -0,0 +1,174 @@
+"""
+Date-keyed snapshot of what the seasonal page merchandises.
+
+The seasonal page used to work out the active seasons, the occasions in
+the next 60 days and the matching products on every request. That answer
+only changes when the local date rolls over (TIME_ZONE, Asia/Kolkata) or
+when a Season, Occasion or Product is edited, so it is computed once per
+day and cached:
+
+* the cache key carries the local date, so the first request after
+  midnight (or the rebuild_merchandising command run from cron at
+  midnight) builds a fresh snapshot;
+* it also carries a version token, replaced once a Season, Occasion or
+  Product change commits, so the snapshots of every date are rebuilt
+  from the new data on their next read.
+
+Patching a cached snapshot in place would be a read-modify-write of one
+cache entry, and two concurrent product saves would lose one another's
+change; replacing the token cannot. Product saves are edits by sellers
+and staff (checkout updates stock with a queryset update), so a rebuild
+per save is cheap.
+
+Rendering the page is then a single fetch of products by primary key.
+"""
+import datetime
+import threading
+import uuid
+
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import Occasion, Product, Season
+from .replicas import primary_reads
+
+UPCOMING_DAYS = 60
+FALLBACK_LIMIT = 12
+KEY_PREFIX = 'festivmart:merch'
+VERSION_KEY = f'{KEY_PREFIX}:version'
+
+# Snapshot modes, mirroring the fallbacks of the original view
+MATCHED = 'matched'            # products in an active season or upcoming occasion
+ALL_SEASONAL = 'all_seasonal'  # no matches: any seasonal products
+LATEST = 'latest'              # no seasonal products at all: newest products
+
+_rebuild_lock = threading.Lock()
+
+
+def _version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, uuid.uuid4().hex, timeout=None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def cache_key(version, day):
+    return f'{KEY_PREFIX}:{version}:{day.isoformat()}'
+
+
+def seconds_until_midnight(now=None):
+    now = timezone.localtime(now)
+    tomorrow = datetime.datetime.combine(now.date() + datetime.timedelta(days=1), datetime.time.min)
+    tomorrow = timezone.make_aware(tomorrow, now.tzinfo)
+    return max(1, int((tomorrow - now).total_seconds()))
+
+
+def active_seasons(day):
+    return (
+        Season.objects.filter(start_date__lte=day, end_date__gte=day)
+        # The order of season_dates_idx, so no sort
+        .order_by('start_date', 'end_date', 'id')
+        .values('id', 'name', 'start_date', 'end_date', 'description')
+    )
+
+
+def upcoming_occasions(day):
+    return (
+        Occasion.objects.filter(date__gte=day, date__lte=day + datetime.timedelta(days=UPCOMING_DAYS))
+        .order_by('date', 'id')
+        .values('id', 'name', 'date', 'description')
+    )
+
+
+def season_products(season_ids):
+    """(product id, season id) of the live seasonal products of these seasons."""
+    return (
+        Product.objects.filter(is_seasonal=True, available=True, season_id__in=season_ids)
+        .values_list('id', 'season_id')
+    )
+
+
+def occasion_products(occasion_ids):
+    """(product id, occasion id) of the live seasonal products of these occasions."""
+    return (
+        Product.occasions.through.objects
+        .filter(occasion_id__in=occasion_ids, product__is_seasonal=True, product__available=True)
+        .values_list('product_id', 'occasion_id')
+    )
+
+
+def fallback_products(seasonal):
+    """Ids shown when nothing matches: the first seasonal products, or the newest products."""
+    if seasonal:
+        products = Product.objects.filter(is_seasonal=True, available=True).order_by('id')
+    else:
+        products = Product.objects.filter(available=True).order_by('-id')
+    return products.values_list('id', flat=True)[:FALLBACK_LIMIT]
+
+
+@primary_reads()
+def build_snapshot(day):
+    """Compute the merchandising snapshot for a local date."""
+    seasons = list(active_seasons(day))
+    occasions = list(upcoming_occasions(day))
+    season_ids = [s['id'] for s in seasons]
+    occasion_ids = [o['id'] for o in occasions]
+
+    by_season = {pk: [] for pk in season_ids}
+    by_occasion = {pk: [] for pk in occasion_ids}
+    if season_ids:
+        for pk, season_id in season_products(season_ids):
+            by_season[season_id].append(pk)
+    if occasion_ids:
+        for pk, occasion_id in occasion_products(occasion_ids):
+            by_occasion[occasion_id].append(pk)
+    for members in [*by_season.values(), *by_occasion.values()]:
+        members.sort()
+    product_ids = sorted({pk for members in [*by_season.values(), *by_occasion.values()] for pk in members})
+
+    mode = MATCHED
+    if not product_ids:
+        mode = ALL_SEASONAL
+        product_ids = list(fallback_products(seasonal=True))
+    if not product_ids:
+        mode = LATEST
+        product_ids = list(fallback_products(seasonal=False))
+
+    return {
+        'date': day,
+        'mode': mode,
+        'seasons': seasons,
+        'occasions': occasions,
+        'product_ids': product_ids,
+        'by_season': by_season,
+        'by_occasion': by_occasion,
+    }
+
+
+def rebuild_snapshot(day=None):
+    day = day or timezone.localdate()
+    # The token is read before the rows: a change committed in between
+    # replaces it, so this snapshot is never read
+    version = _version()
+    snapshot = build_snapshot(day)
+    timeout = seconds_until_midnight() + 60 if day == timezone.localdate() else 2 * 24 * 3600
+    cache.set(cache_key(version, day), snapshot, timeout)
+    return snapshot
+
+
+def get_snapshot(day=None):
+    """The snapshot for a local date (today by default), built on first use."""
+    day = day or timezone.localdate()
+    snapshot = cache.get(cache_key(_version(), day))
+    if snapshot is None:
+        with _rebuild_lock:
+            snapshot = cache.get(cache_key(_version(), day))
+            if snapshot is None:
+                snapshot = rebuild_snapshot(day)
+    return snapshot
+
+
+def invalidate_snapshot():
+    """Drop the snapshots of every date; call it once the change has committed."""
+    cache.set(VERSION_KEY, uuid.uuid4().hex, timeout=None)
@@ -0,0 +1,296 @@
+"""
+Application metrics in the Prometheus text format, served at /metrics/.
+
+MetricsMiddleware records, for every request, its latency in a histogram
+and its database time and query count, labelled by URL name; cache reads
+are counted as hits and misses; the views count the shop's funnel
+(cart adds, coupon applications, checkouts by outcome and stock-out
+rejections) with inc_on_commit(), so a write transaction run again after
+a lock counts once.
+
+Recording is lock-free: each thread adds to its own shard (plain dicts
+only that thread writes to), and a scrape sums the shards. Shards of
+threads that have ended are folded into the process totals, so a server
+starting a thread per request does not accumulate them.
+
+With several worker processes, set METRICS_DIR to a directory they
+share: each process writes its totals there every METRICS_FLUSH_SECONDS
+(one JSON file per process, replaced atomically), and a scrape, whichever
+process serves it, adds up every file. Other processes' figures are then
+at most METRICS_FLUSH_SECONDS old. Files of processes that have exited
+are kept, so totals do not go down when a worker is recycled; empty the
+directory on deploy. The endpoint answers 404 until METRICS_TOKEN is
+set, and then requires "Authorization: Bearer <token>".
+"""
+import bisect
+import contextlib
+import functools
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections, transaction
+
+# Latency buckets, in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+COUNTER, GAUGE, HISTOGRAM = 'counter', 'gauge', 'histogram'
+
+METRICS = {
+    'festivmart_http_request_duration_seconds': (HISTOGRAM, 'Request latency by URL name.'),
+    'festivmart_http_responses_total': (COUNTER, 'Responses by URL name and status code.'),
+    'festivmart_db_seconds_total': (COUNTER, 'Time spent in database queries by URL name.'),
+    'festivmart_db_queries_total': (COUNTER, 'Database queries by URL name.'),
+    'festivmart_db_lock_retries_total': (COUNTER, 'Write transactions run again after hitting a database lock.'),
+    'festivmart_cache_requests_total': (COUNTER, 'Cache reads by result (hit or miss).'),
+    'festivmart_cache_hit_ratio': (GAUGE, 'Share of cache reads that were hits.'),
+    'festivmart_cart_adds_total': (COUNTER, 'Products added to carts, by API (single add or batch).'),
+    'festivmart_coupon_applications_total': (COUNTER, 'Coupon codes submitted, by result.'),
+    'festivmart_checkouts_total': (COUNTER, 'Checkout attempts by result.'),
+    'festivmart_stock_out_rejections_total': (COUNTER, 'Order lines rejected at checkout for lack of stock.'),
+}
+
+_local = threading.local()
+_shards = []
+_registry = threading.Lock()
+_retired = {}
+_flushing = threading.Lock()
+_last_flush = 0.0
+_started = int(time.time())
+
+
+def _shard():
+    """This thread's {(name, labels): value} dict, created on first use."""
+    try:
+        return _local.shard
+    except AttributeError:
+        shard = _local.shard = {}
+        with _registry:
+            _shards.append((threading.current_thread(), shard))
+        return shard
+
+
+def inc(name, amount=1, **labels):
+    """Add `amount` to the counter `name` with these labels."""
+    shard = _shard()
+    key = (name, tuple(sorted(labels.items())))
+    shard[key] = shard.get(key, 0) + amount
+
+
+def inc_on_commit(name, amount=1, **labels):
+    """inc() once the current transaction commits, or now outside one."""
+    transaction.on_commit(functools.partial(inc, name, amount, **labels))
+
+
+def observe(name, value, **labels):
+    """Record `value` in the histogram `name`: a count per bucket, then the sum."""
+    shard = _shard()
+    key = (name, tuple(sorted(labels.items())))
+    values = shard.get(key)
+    if values is None:
+        values = shard[key] = [0] * (len(BUCKETS) + 2)
+    values[bisect.bisect_left(BUCKETS, value)] += 1
+    values[-1] += value
+
+
+def _add(totals, key, value):
+    if isinstance(value, list):
+        current = totals.get(key)
+        if current is None:
+            totals[key] = list(value)
+        else:
+            for i, v in enumerate(value):
+                current[i] += v
+    else:
+        totals[key] = totals.get(key, 0) + value
+
+
+def _retire():
+    """Fold the shards of threads that have ended into the process totals; returns the live shards."""
+    with _registry:
+        live = []
+        for thread, shard in _shards:
+            if thread.is_alive():
+                live.append((thread, shard))
+            else:
+                for key, value in shard.items():
+                    _add(_retired, key, value)
+        _shards[:] = live
+        return [shard for thread, shard in live]
+
+
+def local_totals():
+    """This process's totals."""
+    live = _retire()
+    totals = {}
+    with _registry:
+        for key, value in _retired.items():
+            _add(totals, key, value)
+    for shard in live:
+        # Copies are taken under the GIL; the owner thread may keep writing
+        for key, value in shard.copy().items():
+            _add(totals, key, value)
+    return totals
+
+
+def _directory():
+    directory = getattr(settings, 'METRICS_DIR', None)
+    return Path(directory) if directory else None
+
+
+def flush():
+    """Write this process's totals to METRICS_DIR, if set."""
+    global _last_flush
+    directory = _directory()
+    if directory is None or not _flushing.acquire(blocking=False):
+        return
+    try:
+        directory.mkdir(parents=True, exist_ok=True)
+        series = [[name, labels, value] for (name, labels), value in local_totals().items()]
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(series, f)
+        os.replace(tmp, directory / f'{os.getpid()}-{_started}.json')
+        _last_flush = time.monotonic()
+    finally:
+        _flushing.release()
+
+
+def maybe_flush():
+    """Flush (or, without METRICS_DIR, just retire ended threads) every METRICS_FLUSH_SECONDS."""
+    global _last_flush
+    if time.monotonic() - _last_flush < getattr(settings, 'METRICS_FLUSH_SECONDS', 5):
+        return
+    if _directory() is None:
+        _last_flush = time.monotonic()
+        _retire()
+    else:
+        flush()
+
+
+def collect():
+    """Totals of every process sharing METRICS_DIR, or of this one without it."""
+    directory = _directory()
+    if directory is None:
+        return local_totals()
+    flush()
+    totals = {}
+    for path in directory.glob('*.json'):
+        try:
+            series = json.loads(path.read_text())
+        except (OSError, ValueError):
+            continue
+        for name, labels, value in series:
+            _add(totals, (name, tuple(tuple(pair) for pair in labels)), value)
+    return totals
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _series(name, labels, value):
+    if labels:
+        name += '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in labels) + '}'
+    return f'{name} {value if isinstance(value, int) else repr(float(value))}'
+
+
+def render(totals=None):
+    """The Prometheus text exposition of `totals` (default: collect())."""
+    totals = collect() if totals is None else totals
+    hits = sum(v for (n, labels), v in totals.items()
+               if n == 'festivmart_cache_requests_total' and ('result', 'hit') in labels)
+    reads = sum(v for (n, labels), v in totals.items() if n == 'festivmart_cache_requests_total')
+    if reads:
+        totals[('festivmart_cache_hit_ratio', ())] = hits / reads
+    by_name = {}
+    for (name, labels), value in sorted(totals.items()):
+        by_name.setdefault(name, []).append((labels, value))
+    lines = []
+    for name, (kind, description) in METRICS.items():
+        lines.append(f'# HELP {name} {description}')
+        lines.append(f'# TYPE {name} {kind}')
+        for labels, value in by_name.get(name, ()):
+            if kind != HISTOGRAM:
+                lines.append(_series(name, labels, value))
+                continue
+            cumulative = 0
+            for bound, count in zip(BUCKETS + (math.inf,), value):
+                cumulative += count
+                lines.append(_series(f'{name}_bucket', labels + (('le', '+Inf' if bound == math.inf else bound),),
+                                     cumulative))
+            lines.append(_series(f'{name}_sum', labels, value[-1]))
+            lines.append(_series(f'{name}_count', labels, cumulative))
+    return '\n'.join(lines) + '\n'
+
+
+class _QueryTimer:
+    """Execute wrapper adding up the queries of one request."""
+
+    def __init__(self):
+        self.seconds = 0.0
+        self.queries = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - start
+            self.queries += 1
+
+
+_MISSING = object()
+
+
+def _instrument_cache(cache):
+    """Count hits and misses of get() (which get_many and get_or_set use) on one cache instance."""
+    original = cache.get
+    if getattr(original, 'instrumented', False):
+        return
+
+    @functools.wraps(original)
+    def get(key, default=None, version=None):
+        value = original(key, _MISSING, version)
+        if value is _MISSING:
+            inc('festivmart_cache_requests_total', result='miss')
+            return default
+        inc('festivmart_cache_requests_total', result='hit')
+        return value
+
+    get.instrumented = True
+    # An instance attribute: the backend class, and caches built outside
+    # requests, are left alone
+    cache.get = get
+
+
+class MetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        # Each thread has its own cache instances; wrap this one's on first use
+        for alias in settings.CACHES:
+            _instrument_cache(caches[alias])
+        timer = _QueryTimer()
+        start = time.perf_counter()
+        with contextlib.ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(timer))
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - start
+        match = request.resolver_match
+        view = match.view_name if match else 'unmatched'
+        observe('festivmart_http_request_duration_seconds', elapsed, view=view)
+        inc('festivmart_http_responses_total', view=view, method=request.method, status=response.status_code)
+        if timer.queries:
+            inc('festivmart_db_seconds_total', timer.seconds, view=view)
+            inc('festivmart_db_queries_total', timer.queries, view=view)
+        maybe_flush()
+        return response
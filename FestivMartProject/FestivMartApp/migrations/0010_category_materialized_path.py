@@ -0,0 +1,51 @@
+# Generated by Django 6.0.1 on 2026-10-17 01:11
+
+from django.db import migrations, models
+
+
+def build_paths(apps, schema_editor):
+    Category = apps.get_model('FestivMartApp', 'Category')
+    categories = {c.pk: c for c in Category.objects.all()}
+
+    def fill(category, seen=()):
+        if category.path:
+            return category
+        parent = categories.get(category.parent_id)
+        if parent is None or parent.pk in seen:
+            category.path, category.depth, category.breadcrumb = f"/{category.pk}/", 0, category.name
+        else:
+            fill(parent, seen + (category.pk,))
+            category.path = f"{parent.path}{category.pk}/"
+            category.depth = parent.depth + 1
+            category.breadcrumb = f"{parent.breadcrumb} > {category.name}"
+        return category
+
+    for category in categories.values():
+        fill(category)
+    Category.objects.bulk_update(categories.values(), ['path', 'depth', 'breadcrumb'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('FestivMartApp', '0009_product_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='breadcrumb',
+            field=models.CharField(blank=True, editable=False, max_length=500),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='path',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=255),
+        ),
+        migrations.RunPython(build_paths, migrations.RunPython.noop),
+    ]
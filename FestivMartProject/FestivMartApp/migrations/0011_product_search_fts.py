@@ -0,0 +1,66 @@
+# Generated by Django 6.0.1 on 2026-10-17 01:12
+
+from django.db import migrations
+
+# External-content FTS5 index over FestivMartApp_product(name, description).
+# Triggers keep it in sync for every write path, including bulk_create and
+# QuerySet.update(), which bypass model signals.
+CREATE_SQL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS FestivMartApp_product_fts USING fts5(
+        name, description,
+        content='FestivMartApp_product', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3 4'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS FestivMartApp_product_fts_ai
+    AFTER INSERT ON FestivMartApp_product BEGIN
+        INSERT INTO FestivMartApp_product_fts(rowid, name, description)
+        VALUES (new.id, new.name, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS FestivMartApp_product_fts_ad
+    AFTER DELETE ON FestivMartApp_product BEGIN
+        INSERT INTO FestivMartApp_product_fts(FestivMartApp_product_fts, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS FestivMartApp_product_fts_au
+    AFTER UPDATE OF name, description ON FestivMartApp_product BEGIN
+        INSERT INTO FestivMartApp_product_fts(FestivMartApp_product_fts, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+        INSERT INTO FestivMartApp_product_fts(rowid, name, description)
+        VALUES (new.id, new.name, new.description);
+    END
+    """,
+    "INSERT INTO FestivMartApp_product_fts(FestivMartApp_product_fts) VALUES ('rebuild')",
+]
+DROP_SQL = [
+    'DROP TRIGGER IF EXISTS FestivMartApp_product_fts_au',
+    'DROP TRIGGER IF EXISTS FestivMartApp_product_fts_ad',
+    'DROP TRIGGER IF EXISTS FestivMartApp_product_fts_ai',
+    'DROP TABLE IF EXISTS FestivMartApp_product_fts',
+]
+
+
+def run(statements):
+    def apply(apps, schema_editor):
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for sql in statements:
+            schema_editor.execute(sql)
+    return apply
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('FestivMartApp', '0010_category_materialized_path'),
+    ]
+
+    operations = [
+        migrations.RunPython(run(CREATE_SQL), run(DROP_SQL)),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 6.0.1 on 2026-10-17 02:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('FestivMartApp', '0012_related_products'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='occasion',
+            index=models.Index(fields=['date'], name='occasion_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='season',
+            index=models.Index(fields=['start_date', 'end_date'], name='season_dates_idx'),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 6.0.1 on 2026-10-17 03:40
+
+from django.conf import settings
+from collections import Counter
+
+from django.db import migrations, models
+
+BITS = 24
+SIZE = 1 << BITS
+
+
+def build_rank_tree(apps, schema_editor):
+    UserProfile = apps.get_model('FestivMartApp', 'UserProfile')
+    RankNode = apps.get_model('FestivMartApp', 'RankNode')
+    nodes = Counter()
+    for points, n in UserProfile.objects.values('total_points').annotate(n=models.Count('id')).values_list(
+        'total_points', 'n'
+    ):
+        i = SIZE - min(max(points, 0), SIZE - 1)
+        while i <= SIZE:
+            nodes[i] += n
+            i += i & -i
+    RankNode.objects.bulk_create(
+        [RankNode(idx=idx, count=count) for idx, count in nodes.items() if count], batch_size=5000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('FestivMartApp', '0014_points_ledger'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RankNode',
+            fields=[
+                ('idx', models.PositiveIntegerField(primary_key=True, serialize=False)),
+                ('count', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='userprofile',
+            index=models.Index(fields=['-total_points', 'id'], name='profile_points_rank_idx'),
+        ),
+        migrations.RunPython(build_rank_tree, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 6.0.1 on 2026-10-17 02:57
+
+from django.conf import settings
+from django.db import migrations, models
+
+# login_view looks users up by email, which auth.User does not index
+USER_EMAIL_INDEX = 'CREATE INDEX IF NOT EXISTS "auth_user_email_idx" ON "auth_user" ("email")'
+DROP_USER_EMAIL_INDEX = 'DROP INDEX IF EXISTS "auth_user_email_idx"'
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('FestivMartApp', '0016_product_image_variants'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        # After auth's own auth_user rebuilds, which would drop the email index
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cart',
+            index=models.Index(fields=['session_key', 'user'], name='cart_session_user_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', 'created_at'], name='order_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('available', True)), fields=['id'], name='product_available_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('available', True), ('is_seasonal', True)), fields=['id'], name='product_seasonal_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('available', True)), fields=['category', 'id'], name='product_category_live_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['seller', 'is_seasonal'], name='product_seller_seasonal_idx'),
+        ),
+        migrations.RunSQL(USER_EMAIL_INDEX, DROP_USER_EMAIL_INDEX),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 6.0.1 on 2026-10-17 04:12
+
+from collections import Counter
+
+from django.db import migrations, models
+
+# The tree grew a bit and an offset, so negative totals rank below zero
+# instead of sharing its position (leaderboard.position)
+BITS = 25
+SIZE = 1 << BITS
+OFFSET = 1 << 24
+
+
+def rebuild_rank_tree(apps, schema_editor):
+    UserProfile = apps.get_model('FestivMartApp', 'UserProfile')
+    RankNode = apps.get_model('FestivMartApp', 'RankNode')
+    nodes = Counter()
+    for points, n in UserProfile.objects.values('total_points').annotate(n=models.Count('id')).values_list(
+        'total_points', 'n'
+    ):
+        i = SIZE - OFFSET - min(max(points, -OFFSET), SIZE - OFFSET - 1)
+        while i <= SIZE:
+            nodes[i] += n
+            i += i & -i
+    RankNode.objects.all().delete()
+    RankNode.objects.bulk_create(
+        [RankNode(idx=idx, count=count) for idx, count in nodes.items() if count], batch_size=5000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('FestivMartApp', '0017_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(rebuild_rank_tree, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,9 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Q
 from django.utils import timezone
 from decimal import Decimal
+from .order_numbers import next_order_number
+from .pricing import compute_totals
 
 class Season(models.Model):
     name = models.CharField(max_length=100)
@@ -8,6 +11,11 @@ class Season(models.Model):
     end_date = models.DateField(help_text="End date for the current year")
     description = models.TextField(blank=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['start_date', 'end_date'], name='season_dates_idx'),
+        ]
+
     def __str__(self):
         return self.name
 
@@ -16,20 +24,78 @@ class Occasion(models.Model):
     date = models.DateField(help_text="Date of the occasion for the current year")
     description = models.TextField(blank=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['date'], name='occasion_date_idx'),
+        ]
+
     def __str__(self):
         return self.name
 
 class Category(models.Model):
     name = models.CharField(max_length=100)
     parent = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True, related_name='subcategories')
+
+    # Materialized path of the hierarchy, maintained by save():
+    # path is the chain of ancestor ids ending with our own ("/3/17/"),
+    # breadcrumb is the matching chain of names ("Home & Living > Lighting").
+    path = models.CharField(max_length=255, blank=True, editable=False, db_index=True)
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)
+    breadcrumb = models.CharField(max_length=500, blank=True, editable=False)
     
     class Meta:
         verbose_name_plural = "Categories"
 
     def __str__(self):
-        if self.parent:
-            return f"{self.parent.name} > {self.name}"
-        return self.name
+        return self.breadcrumb or self.name
+
+    @staticmethod
+    def subtree_q(path, field='path'):
+        """
+        Q object for paths starting with `path`, as a range: SQLite runs
+        startswith as a case-insensitive LIKE, which cannot use the index.
+        """
+        return Q(**{f'{field}__gte': path, f'{field}__lt': path + '\uffff'})
+
+    @property
+    def ancestor_ids(self):
+        """Ids from the root down to (and excluding) this category."""
+        return [int(pk) for pk in self.path.strip('/').split('/')[:-1] if pk]
+
+    def is_descendant_of(self, other):
+        return other.pk != self.pk and self.path.startswith(other.path)
+
+    def save(self, *args, **kwargs):
+        if self.path and self.parent_id and self.parent.path.startswith(self.path):
+            raise ValueError("A category cannot be moved under itself or its descendants.")
+        super().save(*args, **kwargs)
+        self._update_tree_fields()
+
+    def _tree_fields(self, parent):
+        if parent is None:
+            return f"/{self.pk}/", 0, self.name
+        return f"{parent.path}{self.pk}/", parent.depth + 1, f"{parent.breadcrumb} > {self.name}"
+
+    def _update_tree_fields(self):
+        """Recompute path fields for this category and, if they moved, its subtree."""
+        old_path = self.path
+        path, depth, breadcrumb = self._tree_fields(self.parent if self.parent_id else None)
+        if (path, depth, breadcrumb) == (old_path, self.depth, self.breadcrumb):
+            return
+        Category.objects.filter(pk=self.pk).update(path=path, depth=depth, breadcrumb=breadcrumb)
+        self.path, self.depth, self.breadcrumb = path, depth, breadcrumb
+        if not old_path:
+            return
+
+        # Rewrite descendants top-down so each one sees its parent's new values
+        nodes = {self.pk: self}
+        descendants = list(
+            Category.objects.filter(Category.subtree_q(old_path)).exclude(pk=self.pk).order_by('depth')
+        )
+        for node in descendants:
+            node.path, node.depth, node.breadcrumb = node._tree_fields(nodes[node.parent_id])
+            nodes[node.pk] = node
+        Category.objects.bulk_update(descendants, ['path', 'depth', 'breadcrumb'])
 
 class Product(models.Model):
     name = models.CharField(max_length=200)
@@ -38,6 +104,8 @@ class Product(models.Model):
     category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='products')
     image = models.ImageField(upload_to='products/', blank=True, null=True)
     image_url = models.URLField(max_length=500, blank=True, null=True, help_text="Alternative to uploading: provide an image URL")
+    # Derivative file names by size and format, see images.py
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     
     # Stock and Pricing
     stock = models.PositiveIntegerField(default=1)
@@ -52,6 +120,21 @@ class Product(models.Model):
     seller = models.ForeignKey('auth.User', on_delete=models.CASCADE, related_name='products', null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Keyset pagination keys for the catalog (see catalog.SORT_ORDERS)
+            models.Index(fields=['created_at', 'id'], name='product_created_keyset_idx'),
+            models.Index(fields=['price', 'id'], name='product_price_keyset_idx'),
+            # Hot filters (see query_plans.py). SQLite compiles boolean filters
+            # to bare columns (WHERE "available"), which only a partial index
+            # with the same condition can serve, in id order.
+            models.Index(fields=['id'], condition=Q(available=True), name='product_available_idx'),
+            models.Index(fields=['id'], condition=Q(available=True, is_seasonal=True), name='product_seasonal_idx'),
+            models.Index(fields=['category', 'id'], condition=Q(available=True), name='product_category_live_idx'),
+            # Covers the per-seller listing counts
+            models.Index(fields=['seller', 'is_seasonal'], name='product_seller_seasonal_idx'),
+        ]
+
     def __str__(self):
         return self.name
     
@@ -67,14 +150,26 @@ class Product(models.Model):
         """Returns True if product is in stock"""
         return self.stock > 0
     
-    def get_image_url(self):
-        """Returns the image URL - either from uploaded file or from URL field"""
+    def get_image_url(self, size=None, fmt='jpeg'):
+        """
+        Returns the image URL - either from uploaded file or from URL field.
+        `size` ('thumb' or 'medium') picks a derivative of the upload when
+        one has been generated for it, in `fmt` ('jpeg' or 'webp'). Linked
+        images and the placeholder are served through the image proxy.
+        """
+        from .image_proxy import placeholder_url, proxy_url
+
         if self.image:
+            variants = self.image_variants or {}
+            if size and variants.get('source') == self.image.name:
+                name = variants.get(size, {}).get(fmt)
+                if name:
+                    return self.image.storage.url(name)
             return self.image.url
         elif self.image_url:
-            return self.image_url
+            return proxy_url(self.image_url, size, fmt)
         else:
-            return 'https://via.placeholder.com/400x400?text=No+Image'
+            return placeholder_url(size, fmt)
 
 
 class UserProfile(models.Model):
@@ -85,10 +180,50 @@ class UserProfile(models.Model):
     level = models.IntegerField(default=1)
     total_points = models.IntegerField(default=0)
 
+    # Counters kept by the points ledger (see points.py)
+    product_count = models.PositiveIntegerField(default=0)
+    seasonal_count = models.PositiveIntegerField(default=0)
+    order_count = models.PositiveIntegerField(default=0)
+    account_age_days = models.PositiveIntegerField(default=0)  # days already credited
+
+    class Meta:
+        indexes = [
+            # Leaderboard top-K and neighbours (see leaderboard.py)
+            models.Index(fields=['-total_points', 'id'], name='profile_points_rank_idx'),
+        ]
+
     def __str__(self):
         return f"{self.user.username} - {'Business' if self.is_business else 'Customer'}"
 
 
+class PointsEntry(models.Model):
+    """Append-only ledger of points awarded (or taken back) per user"""
+    LISTING = 'listing'
+    SEASONAL = 'seasonal'
+    ORDER = 'order'
+    ACCOUNT_AGE = 'account_age'
+    BACKFILL = 'backfill'
+    KIND_CHOICES = [
+        (LISTING, 'Product listed'),
+        (SEASONAL, 'Seasonal listing'),
+        (ORDER, 'Order placed'),
+        (ACCOUNT_AGE, 'Account age'),
+        (BACKFILL, 'Backfill adjustment'),
+    ]
+
+    user = models.ForeignKey('auth.User', on_delete=models.CASCADE, related_name='points_entries')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    points = models.IntegerField()
+    object_id = models.BigIntegerField(null=True, blank=True)  # product or order
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name_plural = 'points entries'
+
+    def __str__(self):
+        return f"{self.user_id} {self.kind} {self.points:+d}"
+
+
 class Cart(models.Model):
     """Shopping cart for users"""
     user = models.OneToOneField('auth.User', on_delete=models.CASCADE, related_name='cart', null=True, blank=True)
@@ -98,46 +233,51 @@ class Cart(models.Model):
     coupon_code = models.CharField(max_length=50, blank=True, null=True)
     discount_percent = models.PositiveIntegerField(default=0)
 
+    class Meta:
+        indexes = [
+            # Anonymous cart lookup by session (see views.get_cart)
+            models.Index(fields=['session_key', 'user'], name='cart_session_user_idx'),
+        ]
+
     def __str__(self):
         if self.user:
             return f"Cart for {self.user.username}"
         return f"Anonymous Cart ({self.session_key})"
     
+    def get_totals(self):
+        """Price the cart in a single pass; use this instead of the properties below."""
+        return compute_totals(self)
+
+    # Single-figure shortcuts; each one prices the whole cart again
     @property
     def subtotal(self):
         """Calculate subtotal before discounts"""
-        total = sum(item.line_total for item in self.items.all())
-        return total if total else Decimal('0')
+        return self.get_totals().subtotal
     
     @property
     def discount_amount(self):
         """Calculate discount amount"""
-        if self.discount_percent > 0:
-            return self.subtotal * Decimal(self.discount_percent) / Decimal('100')
-        return Decimal('0')
+        return self.get_totals().discount_amount
     
     @property
     def tax_amount(self):
         """Calculate 10% GST"""
-        return (self.subtotal - self.discount_amount) * Decimal('0.10')
+        return self.get_totals().tax_amount
     
     @property
     def shipping_cost(self):
         """Free shipping over ₹1000"""
-        subtotal = self.subtotal
-        if subtotal >= Decimal('1000') or subtotal == Decimal('0'):
-            return Decimal('0')
-        return Decimal('99')  # Flat shipping rate
+        return self.get_totals().shipping_cost
     
     @property
     def total(self):
         """Calculate final total"""
-        return self.subtotal - self.discount_amount + self.tax_amount + self.shipping_cost
+        return self.get_totals().total
     
     @property
     def item_count(self):
         """Total number of items in cart"""
-        return sum(item.quantity for item in self.items.all())
+        return self.get_totals().item_count
     
     def apply_coupon(self, code):
         """Apply a coupon code"""
@@ -155,6 +295,33 @@ class Cart(models.Model):
             return True, f"Coupon applied! You got {valid_coupons[code]}% off."
         return False, "Invalid coupon code."
     
+    def merge_into(self, user):
+        """Hand this anonymous cart over to `user`, merging with any cart they already have."""
+        with transaction.atomic():
+            target = Cart.objects.select_for_update().filter(user=user).first()
+            if target is None:
+                self.user = user
+                self.session_key = None
+                self.save(update_fields=['user', 'session_key', 'updated_at'])
+                return self
+
+            existing = dict(target.items.values_list('product_id', 'id'))
+            moved = []
+            for item in self.items.all():
+                if item.product_id in existing:
+                    CartItem.objects.filter(id=existing[item.product_id]).update(
+                        quantity=models.F('quantity') + item.quantity
+                    )
+                else:
+                    moved.append(item.id)
+            self.items.filter(id__in=moved).update(cart=target)
+            if not target.coupon_code and self.coupon_code:
+                target.coupon_code = self.coupon_code
+                target.discount_percent = self.discount_percent
+                target.save(update_fields=['coupon_code', 'discount_percent', 'updated_at'])
+            self.delete()
+            return target
+
     def clear(self):
         """Clear all items from cart"""
         self.items.all().delete()
@@ -224,14 +391,18 @@ class Order(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # A user's orders, newest first
+            models.Index(fields=['user', 'created_at'], name='order_user_created_idx'),
+        ]
+
     def __str__(self):
         return f"Order #{self.order_number}"
     
     def save(self, *args, **kwargs):
         if not self.order_number:
-            import random
-            import string
-            self.order_number = 'FM' + ''.join(random.choices(string.digits, k=8))
+            self.order_number = next_order_number()
         super().save(*args, **kwargs)
 
 
@@ -246,3 +417,37 @@ class OrderItem(models.Model):
 
     def __str__(self):
         return f"{self.quantity}x {self.product_name}"
+
+
+class CoPurchase(models.Model):
+    """How many orders contained both products (stored in both directions)"""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+', db_index=False)
+    other = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'other'], name='copurchase_pair_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['product', '-count'], name='copurchase_top_idx'),
+        ]
+
+
+class RelatedProduct(models.Model):
+    """Precomputed top-K related products (see related.py)"""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+', db_index=False)
+    related = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='related_for')
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'rank'], name='related_product_rank_unique'),
+        ]
+
+
+class RankNode(models.Model):
+    """A node of the leaderboard's Fenwick tree over points (see leaderboard.py)"""
+    idx = models.PositiveIntegerField(primary_key=True)
+    count = models.IntegerField(default=0)
@@ -0,0 +1,113 @@
+"""
+Order number generation.
+
+Order numbers used to be 'FM' + 8 random digits, which starts colliding
+(and failing checkout on the unique constraint) after a few thousand
+orders. They are now Snowflake-style: 'FM' followed by 14 Crockford
+base32 characters (no I, L, O or U) packing
+
+    41 bits  milliseconds since EPOCH (good until 2095)
+    22 bits  worker id, the process id by default
+     7 bits  per-millisecond sequence
+
+Numbers are therefore unique across live processes on a host without any
+database round-trip, strictly increasing within a process and, being
+fixed width, sort in creation order. Multi-host deployments give each
+process a distinct worker id with ORDER_NUMBER_WORKER_ID.
+
+The generator is pluggable: ORDER_NUMBER_GENERATOR names a class whose
+instances have a next() method returning a new order number.
+"""
+import datetime
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+PREFIX = 'FM'
+ALPHABET = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+WIDTH = 14
+EPOCH = datetime.datetime(2026, 1, 1, tzinfo=datetime.timezone.utc)
+EPOCH_MS = int(EPOCH.timestamp() * 1000)
+
+TIME_BITS = 41
+WORKER_BITS = 22
+SEQUENCE_BITS = 7
+MAX_WORKER = (1 << WORKER_BITS) - 1
+MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+
+DEFAULT_GENERATOR = 'FestivMartApp.order_numbers.SnowflakeGenerator'
+
+
+def encode(value):
+    chars = []
+    for _ in range(WIDTH):
+        value, digit = divmod(value, 32)
+        chars.append(ALPHABET[digit])
+    return ''.join(reversed(chars))
+
+
+def decode(order_number):
+    """Split an order number back into (datetime, worker id, sequence)."""
+    value = 0
+    for char in order_number[len(PREFIX):]:
+        value = value * 32 + ALPHABET.index(char)
+    sequence = value & MAX_SEQUENCE
+    worker = (value >> SEQUENCE_BITS) & MAX_WORKER
+    millis = value >> (SEQUENCE_BITS + WORKER_BITS)
+    return EPOCH + datetime.timedelta(milliseconds=millis), worker, sequence
+
+
+class SnowflakeGenerator:
+    def __init__(self, worker_id=None, clock=time.time):
+        self.fixed_worker = worker_id
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def _reset(self):
+        # Also runs in a forked child, which must not reuse its parent's id
+        self._pid = os.getpid()
+        worker = self.fixed_worker
+        if worker is None:
+            worker = getattr(settings, 'ORDER_NUMBER_WORKER_ID', None)
+        self.worker_id = (self._pid if worker is None else int(worker)) & MAX_WORKER
+        self._last_ms = -1
+        self._sequence = 0
+
+    def next(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                self._reset()
+            now = int(self.clock() * 1000) - EPOCH_MS
+            if now > self._last_ms:
+                self._last_ms, self._sequence = now, 0
+            elif self._sequence < MAX_SEQUENCE:
+                # Same millisecond, or the clock stepped back: keep counting
+                self._sequence += 1
+            else:
+                # Sequence exhausted: borrow the next millisecond
+                self._last_ms, self._sequence = self._last_ms + 1, 0
+            value = (self._last_ms << (WORKER_BITS + SEQUENCE_BITS)) | \
+                (self.worker_id << SEQUENCE_BITS) | self._sequence
+        return PREFIX + encode(value)
+
+
+_generator = None
+_generator_lock = threading.Lock()
+
+
+def get_generator():
+    global _generator
+    if _generator is None:
+        with _generator_lock:
+            if _generator is None:
+                path = getattr(settings, 'ORDER_NUMBER_GENERATOR', DEFAULT_GENERATOR)
+                _generator = import_string(path)()
+    return _generator
+
+
+def next_order_number():
+    return get_generator().next()
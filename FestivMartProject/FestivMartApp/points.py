@@ -0,0 +1,258 @@
+"""
+Points ledger.
+
+Every event that earns points appends a PointsEntry and, in the same
+transaction, bumps the denormalized counters on the user's UserProfile:
+
+    listing      +50 per product listed (taken back if it is deleted)
+    seasonal     +20 while a listed product is marked seasonal
+    order        +10 per order placed
+    account_age  +5 per day since joining, credited by tick_account_age()
+
+Listing and seasonal points go to business profiles only, as the score
+page always counted them; a profile that changes type is reconciled by
+rebuild_points().
+
+total_points and level are updated in the same statement as the
+counters, and badges are re-derived when the product count changes, so
+the dashboard and score page read one profile row instead of counting
+the user's products on every request. rebuild_points() (the
+rebuild_points command) recomputes every profile from the source tables.
+Every change of total_points also moves the profile in the leaderboard.
+
+tick_account_age() runs daily, so the ledger and the leaderboard are up
+to a day behind on account age; score_data() adds the days not credited
+yet, so the score page is not.
+"""
+from collections import Counter
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+
+from . import leaderboard
+from .models import Order, PointsEntry, Product, UserProfile
+
+LISTING_POINTS = 50
+SEASONAL_POINTS = 20
+ORDER_POINTS = 10
+DAY_POINTS = 5
+LEVEL_POINTS = 500
+
+# Badge key -> display; earned() below decides who has them
+BADGES = {
+    'early_adopter': {'name': 'Early Adopter', 'icon': '🌟', 'color': '#FF6B35'},
+    'first_listing': {'name': 'First Listing', 'icon': '📦', 'color': '#7C3AED'},
+    'pro_seller': {'name': 'Pro Seller', 'icon': '🚀', 'color': '#FBBF24'},
+}
+
+BATCH_SIZE = 1000
+
+
+def level_for(points):
+    return points // LEVEL_POINTS + 1
+
+
+def earned(account_age_days, product_count):
+    badges = []
+    if account_age_days > 7:
+        badges.append('early_adopter')
+    if product_count > 0:
+        badges.append('first_listing')
+    if product_count >= 5:
+        badges.append('pro_seller')
+    return badges
+
+
+def account_age(user, now=None):
+    return ((now or timezone.now()) - user.date_joined).days
+
+
+def score_data(profile, user):
+    """Figures shown on the dashboard and score page."""
+    days = account_age(user)
+    if profile is None:
+        points = days * DAY_POINTS
+    else:
+        points = profile.total_points + max(0, days - profile.account_age_days) * DAY_POINTS
+    level = level_for(points)
+    return {
+        'points': points,
+        'level': level,
+        'next_level_points': level * LEVEL_POINTS - points,
+        'progress_percentage': (points % LEVEL_POINTS) / LEVEL_POINTS * 100,
+        # For the CIBIL style gauge (0-900 scale)
+        'gauge_score': min(740 + points // 10, 900),
+        'badges': [BADGES[key] for key in (profile.badges if profile else []) if key in BADGES],
+    }
+
+
+def _refresh_badges(user_id):
+    profile = UserProfile.objects.select_related('user').get(user_id=user_id)
+    badges = earned(account_age(profile.user), profile.product_count)
+    if profile.badges != badges:
+        UserProfile.objects.filter(pk=profile.pk).update(badges=badges)
+
+
+def record(user_id, kind, points, object_id=None, **counters):
+    """
+    Append a ledger entry and apply it to the user's profile atomically.
+
+    `counters` are deltas for the profile counter fields, e.g.
+    record(user.pk, PointsEntry.LISTING, 50, product.pk, product_count=1).
+    """
+    changes = {
+        'total_points': F('total_points') + points,
+        'level': (F('total_points') + points) / LEVEL_POINTS + 1,
+        **{field: F(field) + delta for field, delta in counters.items()},
+    }
+    with transaction.atomic(savepoint=False):
+        PointsEntry.objects.create(user_id=user_id, kind=kind, points=points, object_id=object_id)
+        profile = UserProfile.objects.select_for_update().filter(user_id=user_id)
+        before = profile.values_list('total_points', flat=True).first()
+        if before is None:
+            before = UserProfile.objects.get_or_create(user_id=user_id)[0].total_points
+        profile.update(**changes)
+        leaderboard.move(before, before + points)
+        if 'product_count' in counters:
+            _refresh_badges(user_id)
+
+
+def is_business(user_id):
+    return UserProfile.objects.filter(user_id=user_id, is_business=True).exists()
+
+
+def _seasonal(product, sign):
+    record(product.seller_id, PointsEntry.SEASONAL, sign * SEASONAL_POINTS, product.pk, seasonal_count=sign)
+
+
+def product_listed(product):
+    if not is_business(product.seller_id):
+        return
+    record(product.seller_id, PointsEntry.LISTING, LISTING_POINTS, product.pk, product_count=1)
+    if product.is_seasonal:
+        _seasonal(product, 1)
+
+
+def product_removed(product, was_seasonal):
+    if not is_business(product.seller_id):
+        return
+    if was_seasonal:
+        _seasonal(product, -1)
+    record(product.seller_id, PointsEntry.LISTING, -LISTING_POINTS, product.pk, product_count=-1)
+
+
+def seasonal_changed(product, seasonal):
+    if is_business(product.seller_id):
+        _seasonal(product, 1 if seasonal else -1)
+
+
+def products_imported(seller_id, listed, seasonal):
+    """Credit a business seller's bulk import (product_import) with one entry per kind."""
+    record(seller_id, PointsEntry.LISTING, listed * LISTING_POINTS, product_count=listed)
+    if seasonal:
+        record(seller_id, PointsEntry.SEASONAL, seasonal * SEASONAL_POINTS, seasonal_count=seasonal)
+
+
+def order_placed(order):
+    record(order.user_id, PointsEntry.ORDER, ORDER_POINTS, order.pk, order_count=1)
+
+
+def tick_account_age(now=None):
+    """Credit account-age points for the days elapsed since the last tick."""
+    now = now or timezone.now()
+    credited = 0
+    profiles = UserProfile.objects.select_related('user').order_by('pk')
+    last_pk = 0
+    while True:
+        batch = list(profiles.filter(pk__gt=last_pk)[:BATCH_SIZE])
+        if not batch:
+            return credited
+        last_pk = batch[-1].pk
+        entries, moves = [], Counter()
+        with transaction.atomic():
+            current = dict(
+                UserProfile.objects.select_for_update().filter(pk__in=[p.pk for p in batch])
+                .values_list('pk', 'total_points')
+            )
+            for profile in batch:
+                days = account_age(profile.user, now)
+                if days <= profile.account_age_days:
+                    continue
+                points = (days - profile.account_age_days) * DAY_POINTS
+                # F() and the guard keep concurrent ledger writes and ticks safe
+                ticked = UserProfile.objects.filter(pk=profile.pk, account_age_days__lt=days).update(
+                    account_age_days=days,
+                    total_points=F('total_points') + points,
+                    level=(F('total_points') + points) / LEVEL_POINTS + 1,
+                    badges=earned(days, profile.product_count),
+                )
+                if ticked:
+                    entries.append(PointsEntry(user_id=profile.user_id, kind=PointsEntry.ACCOUNT_AGE, points=points))
+                    moves[current[profile.pk]] -= 1
+                    moves[current[profile.pk] + points] += 1
+            PointsEntry.objects.bulk_create(entries)
+            leaderboard.apply(moves)
+        credited += len(entries)
+
+
+def listing_counts():
+    """Products and seasonal products per business seller."""
+    return (
+        Product.objects.filter(seller__isnull=False, seller__profile__is_business=True).values('seller_id')
+        .annotate(products=Count('id'), seasonal=Count('id', filter=Q(is_seasonal=True)))
+    )
+
+
+def rebuild_points(now=None):
+    """
+    Recompute every profile's counters from products, orders and account
+    age, in bulk, and append a backfill entry wherever the ledger total
+    disagrees, so the ledger keeps summing to total_points.
+    """
+    now = now or timezone.now()
+    UserProfile.objects.bulk_create(
+        [UserProfile(user_id=pk) for pk in User.objects.filter(profile__isnull=True).values_list('pk', flat=True)],
+        batch_size=BATCH_SIZE,
+    )
+    listings = {row['seller_id']: row for row in listing_counts()}
+    orders = dict(Order.objects.values('user_id').annotate(n=Count('id')).values_list('user_id', 'n'))
+    ledger = dict(
+        PointsEntry.objects.values('user_id').annotate(total=Sum('points')).values_list('user_id', 'total')
+    )
+
+    updated = 0
+    profiles = UserProfile.objects.select_related('user').order_by('pk')
+    last_pk = 0
+    while True:
+        batch = list(profiles.filter(pk__gt=last_pk)[:BATCH_SIZE])
+        if not batch:
+            leaderboard.rebuild()
+            return updated
+        last_pk = batch[-1].pk
+        entries = []
+        for profile in batch:
+            listing = listings.get(profile.user_id, {'products': 0, 'seasonal': 0})
+            profile.product_count = listing['products']
+            profile.seasonal_count = listing['seasonal']
+            profile.order_count = orders.get(profile.user_id, 0)
+            profile.account_age_days = account_age(profile.user, now)
+            profile.total_points = (
+                profile.product_count * LISTING_POINTS
+                + profile.seasonal_count * SEASONAL_POINTS
+                + profile.order_count * ORDER_POINTS
+                + profile.account_age_days * DAY_POINTS
+            )
+            profile.level = level_for(profile.total_points)
+            profile.badges = earned(profile.account_age_days, profile.product_count)
+            drift = profile.total_points - ledger.get(profile.user_id, 0)
+            if drift:
+                entries.append(PointsEntry(user_id=profile.user_id, kind=PointsEntry.BACKFILL, points=drift))
+        with transaction.atomic():
+            PointsEntry.objects.bulk_create(entries)
+            UserProfile.objects.bulk_update(batch, [
+                'product_count', 'seasonal_count', 'order_count', 'account_age_days',
+                'total_points', 'level', 'badges',
+            ])
+        updated += len(batch)
@@ -0,0 +1,174 @@
+"""
+Cached product detail payloads for the quick-view modal.
+
+The serialized JSON for each product is cached together with a strong
+ETag (hash of the bytes) and the version tokens it was built from:
+
+* the product's own token, replaced when the product is saved, deleted
+  or has its stock reserved at checkout;
+* its category's token, replaced when any product in that category
+  changes, since the payload lists siblings as related products;
+* the category tree token, replaced on any Category change, since the
+  payload carries the category breadcrumb;
+* the related-index token, replaced when the related products index is
+  rebuilt. Incremental refreshes and changes to a product listed as
+  related replace the product tokens of the lists they touch.
+
+A cached entry is served only while all its tokens still match, so a
+conditional request is answered from two cache reads and no queries.
+
+The tokens live in the shared default cache. The entries live in the
+ENTRY_CACHE alias, a bounded cache of each worker process where one is
+configured: an entry another process has invalidated fails the token
+check like any other.
+"""
+import hashlib
+import json
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.utils import timezone
+
+from . import related as related_index
+from .categories import VERSION_KEY as TREE_VERSION_KEY
+from .models import Product, RelatedProduct
+from .replicas import primary_reads
+
+RELATED_LIMIT = 4
+ENTRY_TIMEOUT = 24 * 3600
+RELATED_VERSION_KEY = 'festivmart:product_detail:related:version'
+ENTRY_CACHE = 'product_detail'
+
+
+def _entries():
+    return caches[ENTRY_CACHE] if ENTRY_CACHE in settings.CACHES else cache
+
+
+def entry_key(product_id):
+    return f'festivmart:product_detail:{product_id}'
+
+
+def product_version_key(product_id):
+    return f'festivmart:product_detail:{product_id}:version'
+
+
+def category_version_key(category_id):
+    return f'festivmart:product_detail:category:{category_id}:version'
+
+
+class DetailEntry:
+    """A serialized payload and the validators sent with it."""
+
+    def __init__(self, body, etag, last_modified, category_id, versions):
+        self.body = body
+        self.etag = etag
+        self.last_modified = last_modified
+        self.category_id = category_id
+        self.versions = versions
+
+
+def serialize_detail(product, related):
+    related_data = []
+    for p in related:
+        related_data.append({
+            'id': p.id,
+            'name': p.name,
+            'price': float(p.price),
+            'discounted_price': float(p.discounted_price),
+            'image': p.get_image_url('thumb'),
+            'image_webp': p.get_image_url('thumb', 'webp'),
+            'discount_percent': p.discount_percent
+        })
+
+    return {
+        'id': product.id,
+        'name': product.name,
+        'description': product.description,
+        'price': float(product.price),
+        'discounted_price': float(product.discounted_price),
+        'discount_percent': product.discount_percent,
+        'image': product.get_image_url('medium'),
+        'image_webp': product.get_image_url('medium', 'webp'),
+        'image_original': product.get_image_url(),
+        'stock': product.stock,
+        'category': str(product.category),
+
+        # Mock/Calculated data features
+        'rating': 4.5,
+        'reviews_count': 42 + product.id,
+        'total_buys': 120 + product.id * 5,
+        'return_policy': '7 Days Return & Exchange',
+        'is_in_stock': product.is_in_stock,
+
+        'related_products': related_data
+    }
+
+
+def _tokens(keys):
+    found = cache.get_many(keys)
+    missing = [key for key in keys if key not in found]
+    if missing:
+        # First reader after an invalidation or cache flush picks the tokens
+        for key in missing:
+            cache.add(key, uuid.uuid4().hex, timeout=None)
+        found.update(cache.get_many(missing))
+    return [found.get(key) for key in keys]
+
+
+@primary_reads()
+def build_entry(product_id):
+    """Query and serialize one product; None if it does not exist."""
+    # Tokens are read before the rows they cover: a change committed in
+    # between replaces the token, so the entry is discarded on next read
+    product_version, tree_version, related_version = _tokens(
+        [product_version_key(product_id), TREE_VERSION_KEY, RELATED_VERSION_KEY]
+    )
+    product = Product.objects.select_related('category').filter(pk=product_id).first()
+    if product is None:
+        return None
+    [category_version] = _tokens([category_version_key(product.category_id)])
+    related = related_index.related_products(product.pk, RELATED_LIMIT)
+    if not related:
+        # Not indexed yet (new product, index never built): same category
+        related = (
+            Product.objects.filter(category_id=product.category_id, available=True)
+            .exclude(id=product.id)[:RELATED_LIMIT]
+        )
+    body = json.dumps(serialize_detail(product, related)).encode()
+    etag = '"%s"' % hashlib.sha1(body).hexdigest()
+    versions = (product_version, category_version, tree_version, related_version)
+    entry = DetailEntry(body, etag, timezone.now(), product.category_id, versions)
+    _entries().set(entry_key(product_id), entry, ENTRY_TIMEOUT)
+    return entry
+
+
+def get_entry(product_id):
+    """The current entry for a product, from cache when still valid."""
+    entry = _entries().get(entry_key(product_id))
+    if entry is not None:
+        keys = [
+            product_version_key(product_id), category_version_key(entry.category_id),
+            TREE_VERSION_KEY, RELATED_VERSION_KEY,
+        ]
+        found = cache.get_many(keys)
+        if tuple(found.get(key) for key in keys) == entry.versions:
+            return entry
+    return build_entry(product_id)
+
+
+def invalidate_products(product_ids):
+    cache.delete_many([product_version_key(pk) for pk in product_ids])
+
+
+def invalidate_categories(category_ids):
+    cache.delete_many([category_version_key(pk) for pk in category_ids])
+
+
+def invalidate_listing(product_id):
+    """Drop the entries of products that list this one as related."""
+    invalidate_products(RelatedProduct.objects.filter(related_id=product_id).values_list('product_id', flat=True))
+
+
+def invalidate_all():
+    cache.delete(RELATED_VERSION_KEY)
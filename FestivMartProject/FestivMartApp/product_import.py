@@ -0,0 +1,285 @@
+"""
+Bulk product import for sellers (CSV or JSON Lines).
+
+add_product lists one product per form submission. import_products()
+takes a stream of rows instead, from the import_products command or the
+seller upload endpoint, and writes them in batches:
+
+* categories, seasons and occasions are resolved through lookup maps
+  loaded once per import, so a row costs no queries;
+* each row is validated on its own, and a bad row is reported with its
+  line number without stopping the import;
+* valid rows are inserted with one bulk_create per batch, plus one for
+  the occasions through-table, each batch in its own transaction;
+* the input is read line by line and only the current batch and the
+  first MAX_ERRORS errors are kept, so memory does not grow with the
+  file size.
+
+bulk_create skips the Product signals, so each batch credits the points
+ledger itself, and the import then drops the merchandising snapshot and
+the category-level detail caches. The FTS triggers index the new rows,
+and the nightly related-products rebuild brings them into their category
+neighbours' lists.
+
+Columns (CSV header or JSON keys): name, price and category are
+required; description, stock, discount_percent, is_seasonal, available,
+season, occasions and image_url are optional. category is a name, a
+breadcrumb ("Home & Living > Lighting") or an id; occasions are names
+separated by "|" in CSV, or a JSON list.
+"""
+import codecs
+import csv
+import json
+import time
+from decimal import Decimal, InvalidOperation
+
+from django.core.exceptions import ValidationError
+from django.core.validators import URLValidator
+from django.db import transaction
+
+from . import merchandising, points, product_detail
+from .models import Category, Occasion, Product, Season
+
+BATCH_SIZE = 500
+MAX_ERRORS = 1000
+FORMATS = ('csv', 'jsonl')
+REQUIRED = ('name', 'price', 'category')
+TRUE = {'1', 'true', 'yes', 'y', 'on'}
+FALSE = {'0', 'false', 'no', 'n', 'off', ''}
+
+_name_length = Product._meta.get_field('name').max_length
+_url_length = Product._meta.get_field('image_url').max_length
+_validate_url = URLValidator()
+
+
+class InvalidRow(ValueError):
+    pass
+
+
+class ImportResult:
+    """Counts, throughput and the first MAX_ERRORS (line, message) errors."""
+
+    def __init__(self):
+        self.rows = 0
+        self.created = 0
+        self.failed = 0
+        self.errors = []
+        self.started = time.perf_counter()
+        self.seconds = 0.0
+
+    def error(self, line, message):
+        self.failed += 1
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append((line, message))
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    def as_dict(self, max_errors=MAX_ERRORS):
+        return {
+            'rows': self.rows,
+            'created': self.created,
+            'failed': self.failed,
+            'seconds': round(self.seconds, 3),
+            'rows_per_second': round(self.rows_per_second, 1),
+            'errors': [{'line': line, 'error': message} for line, message in self.errors[:max_errors]],
+        }
+
+
+def detect_format(filename, default='csv'):
+    for fmt in FORMATS:
+        if filename.lower().endswith(f'.{fmt}') or (fmt == 'jsonl' and filename.lower().endswith('.ndjson')):
+            return fmt
+    return default
+
+
+def _decoded(lines):
+    decoder = codecs.getincrementaldecoder('utf-8-sig')(errors='replace')
+    for line in lines:
+        yield decoder.decode(line) if isinstance(line, bytes) else line
+
+
+def read_rows(lines, fmt):
+    """Yield (line number, row dict or InvalidRow) from an iterable of lines."""
+    lines = _decoded(lines)
+    if fmt == 'csv':
+        reader = csv.DictReader(lines)
+        for row in reader:
+            if None in row:
+                yield reader.line_num, InvalidRow('More values than header columns')
+            else:
+                yield reader.line_num, row
+    elif fmt == 'jsonl':
+        for number, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as exc:
+                yield number, InvalidRow(f'Invalid JSON: {exc}')
+                continue
+            yield number, row if isinstance(row, dict) else InvalidRow('Expected a JSON object')
+    else:
+        raise ValueError(f'Unknown format {fmt!r}; expected one of {", ".join(FORMATS)}')
+
+
+class Lookups:
+    """Case-insensitive maps of the taxonomy, loaded once per import."""
+
+    def __init__(self):
+        names, breadcrumbs, ids = {}, {}, {}
+        for pk, name, breadcrumb in Category.objects.values_list('id', 'name', 'breadcrumb'):
+            ids[str(pk)] = pk
+            breadcrumbs[breadcrumb.casefold()] = pk
+            # A bare name only resolves when it is unambiguous
+            names[name.casefold()] = None if name.casefold() in names else pk
+        self.categories = {**names, **breadcrumbs, **ids}
+        self.seasons = {name.casefold(): pk for pk, name in Season.objects.values_list('id', 'name')}
+        self.occasions = {name.casefold(): pk for pk, name in Occasion.objects.values_list('id', 'name')}
+
+    def category(self, value):
+        pk = self.categories.get(_text(value).casefold())
+        if pk is None:
+            raise InvalidRow(f'Unknown or ambiguous category {value!r}')
+        return pk
+
+    def season(self, value):
+        if not _text(value):
+            return None
+        pk = self.seasons.get(_text(value).casefold())
+        if pk is None:
+            raise InvalidRow(f'Unknown season {value!r}')
+        return pk
+
+    def occasion_ids(self, value):
+        names = value if isinstance(value, list) else _text(value).split('|')
+        ids = set()
+        for name in filter(None, (_text(n) for n in names)):
+            pk = self.occasions.get(name.casefold())
+            if pk is None:
+                raise InvalidRow(f'Unknown occasion {name!r}')
+            ids.add(pk)
+        return ids
+
+
+def _text(value):
+    return '' if value is None else str(value).strip()
+
+
+def _integer(row, field, default, low, high=None):
+    value = _text(row.get(field))
+    if not value:
+        return default
+    try:
+        number = int(value)
+    except ValueError:
+        raise InvalidRow(f'{field} must be a whole number')
+    if number < low or (high is not None and number > high):
+        raise InvalidRow(f'{field} must be between {low} and {high}' if high is not None
+                         else f'{field} must be at least {low}')
+    return number
+
+
+def _boolean(row, field, default):
+    value = row.get(field)
+    if isinstance(value, bool):
+        return value
+    value = _text(value).lower()
+    if not value:
+        return default
+    if value in TRUE:
+        return True
+    if value in FALSE:
+        return False
+    raise InvalidRow(f'{field} must be true or false')
+
+
+def clean(row, lookups, seller_id):
+    """Validate one row into an unsaved Product and its occasion ids."""
+    missing = [field for field in REQUIRED if not _text(row.get(field))]
+    if missing:
+        raise InvalidRow(f'Missing {", ".join(missing)}')
+    name = _text(row['name'])
+    if len(name) > _name_length:
+        raise InvalidRow(f'name is longer than {_name_length} characters')
+    try:
+        price = Decimal(_text(row['price']))
+    except InvalidOperation:
+        raise InvalidRow('price must be a number')
+    if not price.is_finite() or price < 0 or price >= Decimal('1e8') or price != price.quantize(Decimal('0.01')):
+        raise InvalidRow('price must be between 0 and 99999999.99 with at most 2 decimals')
+    image_url = _text(row.get('image_url')) or None
+    if image_url:
+        try:
+            _validate_url(image_url)
+        except ValidationError:
+            raise InvalidRow('image_url is not a valid URL')
+        if len(image_url) > _url_length:
+            raise InvalidRow(f'image_url is longer than {_url_length} characters')
+    product = Product(
+        name=name,
+        description=_text(row.get('description')),
+        price=price,
+        category_id=lookups.category(row['category']),
+        stock=_integer(row, 'stock', 1, 0),
+        discount_percent=_integer(row, 'discount_percent', 0, 0, 100),
+        is_seasonal=_boolean(row, 'is_seasonal', False),
+        available=_boolean(row, 'available', True),
+        season_id=lookups.season(row.get('season')),
+        image_url=image_url,
+        seller_id=seller_id,
+    )
+    return product, lookups.occasion_ids(row.get('occasions'))
+
+
+def _write(batch, seller_id, result, credit):
+    products = [product for product, occasion_ids in batch]
+    Through = Product.occasions.through
+    with transaction.atomic():
+        Product.objects.bulk_create(products)
+        Through.objects.bulk_create([
+            Through(product_id=product.pk, occasion_id=occasion_id)
+            for product, occasion_ids in batch for occasion_id in occasion_ids
+        ])
+        if credit:
+            points.products_imported(seller_id, len(products), sum(p.is_seasonal for p in products))
+    result.created += len(products)
+
+
+def import_products(lines, seller=None, fmt='csv', batch_size=BATCH_SIZE, dry_run=False):
+    """
+    Import rows from `lines` (an iterable of str or bytes lines, e.g. an
+    open file or an upload) as products of `seller`. Returns an ImportResult.
+    """
+    result = ImportResult()
+    lookups = Lookups()
+    seller_id = seller.pk if seller else None
+    # Listing points go to business sellers only; the upload view has the profile loaded already
+    credit = seller is not None and getattr(getattr(seller, 'profile', None), 'is_business', False)
+    batch, categories = [], set()
+    for line, row in read_rows(lines, fmt):
+        result.rows += 1
+        try:
+            if isinstance(row, InvalidRow):
+                raise row
+            product, occasion_ids = clean(row, lookups, seller_id)
+        except InvalidRow as exc:
+            result.error(line, str(exc))
+            continue
+        categories.add(product.category_id)
+        if not dry_run:
+            batch.append((product, occasion_ids))
+        if len(batch) >= batch_size:
+            _write(batch, seller_id, result, credit)
+            batch = []
+    if batch:
+        _write(batch, seller_id, result, credit)
+
+    if result.created:
+        def invalidate():
+            merchandising.invalidate_snapshot()
+            product_detail.invalidate_categories(categories)
+        transaction.on_commit(invalidate)
+    result.seconds = time.perf_counter() - result.started
+    return result
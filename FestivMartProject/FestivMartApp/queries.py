@@ -0,0 +1,25 @@
+"""
+Querysets the views run that have no module of their own, kept here so
+query_plans can check their plans without importing the views.
+"""
+from django.contrib.auth.models import User
+
+from .models import Cart, Product
+
+
+def featured_products():
+    return Product.objects.filter(available=True)[:8]
+
+
+def seller_products(user_id):
+    return Product.objects.filter(seller_id=user_id)
+
+
+def session_cart(session_key):
+    """The cart of an anonymous session, as a queryset."""
+    return Cart.objects.filter(session_key=session_key, user=None)
+
+
+def users_by_email(email):
+    # Login looks users up by email (auth_user_email_idx)
+    return User.objects.filter(email=email)
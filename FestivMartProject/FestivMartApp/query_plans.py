@@ -0,0 +1,74 @@
+"""
+The hot query shapes and their SQLite plans.
+
+hot_queries() builds the querysets the busiest paths run (landing, catalog
+pages, the seasonal snapshot and its fallbacks, category siblings, seller
+listings, the anonymous cart, login by email), from the same helpers the
+views and jobs call, so a change to a query changes its plan test too.
+full_scans() reads a queryset's EXPLAIN QUERY PLAN for tables read from
+end to end. The plan tests assert none of them degrades to a full scan;
+benchmarks/bench_indexes.py times them with and without their indexes.
+"""
+import datetime
+import re
+
+from django.db import connections
+
+from . import catalog, merchandising, points, queries, related
+
+# Indexes added for these shapes (migration 0017)
+INDEXES = (
+    'product_available_idx',
+    'product_seasonal_idx',
+    'product_category_live_idx',
+    'product_seller_seasonal_idx',
+    'cart_session_user_idx',
+    'order_user_created_idx',
+    'auth_user_email_idx',
+)
+
+# "SCAN t" and "SCAN t USING [COVERING] INDEX i" both read all of t,
+# unless i is a partial index, which holds only the rows asked for, or
+# the index walk yields the ORDER BY of a sliced query, which stops once
+# it has the rows asked for (first catalog pages)
+_SCAN = re.compile(r'\bSCAN (\w+)(?: USING (?:COVERING )?INDEX (\w+))?')
+
+
+def hot_queries(user_id=1, category_id=1, session_key='session', email='shopper@example.com', day=None):
+    """{name: queryset} of the hot shapes, for these parameters."""
+    day = day or datetime.date.today()
+    cursor = catalog.encode_cursor('newest', datetime.datetime(2026, 10, 17, 12), 1000)
+    price_cursor = catalog.encode_cursor('price-low', '499.00', 1000)
+    return {
+        'landing products': queries.featured_products(),
+        'catalog first page': catalog.CatalogQuery().page_queryset(),
+        'catalog keyset page': catalog.CatalogQuery().page_queryset(cursor),
+        'catalog price page': catalog.CatalogQuery(sort='price-low').page_queryset(price_cursor),
+        'active seasons': merchandising.active_seasons(day),
+        'upcoming occasions': merchandising.upcoming_occasions(day),
+        'season products': merchandising.season_products([1, 2]),
+        'occasion products': merchandising.occasion_products([1, 2]),
+        'seasonal fallback': merchandising.fallback_products(seasonal=True),
+        'latest fallback': merchandising.fallback_products(seasonal=False),
+        'category siblings': related.category_siblings(category_id),
+        'seller products': queries.seller_products(user_id),
+        'seller listing counts': points.listing_counts(),
+        'anonymous cart': queries.session_cart(session_key)[:1],
+        'login by email': queries.users_by_email(email),
+    }
+
+
+def partial_indexes(using='default'):
+    with connections[using].cursor() as cursor:
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND sql LIKE '% WHERE %'")
+        return {name for name, in cursor.fetchall()}
+
+
+def full_scans(queryset):
+    """Tables the plan of `queryset` scans in full, with the plan."""
+    plan = queryset.explain()
+    allowed = partial_indexes(queryset.db)
+    query = queryset.query
+    walks_in_order = query.order_by and query.high_mark is not None and 'TEMP B-TREE' not in plan
+    return [table for table, index in _SCAN.findall(plan)
+            if index not in allowed and not (index and walks_in_order)], plan
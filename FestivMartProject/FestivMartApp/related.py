@@ -0,0 +1,159 @@
+"""
+"Related products" index built from purchase history.
+
+Two tables back it:
+
+* CoPurchase counts, for every ordered pair of products, how many orders
+  contained both. It is what makes incremental refresh possible: a new
+  order only bumps the pairs it contains.
+* RelatedProduct keeps the top TOP_K products per product, ranked by
+
+      score = co-purchase count + CATEGORY_AFFINITY if same category
+
+  Same-category products are also candidates on their own (score
+  CATEGORY_AFFINITY, newest first), so products with little or no
+  history still get related items, and any co-purchase outranks plain
+  category affinity.
+
+The detail API reads a product's list with one join on the
+(product, rank) unique index. record_order() runs after each checkout
+commits and refreshes only the products in that order;
+rebuild_related_index() (the rebuild_related_products command) recomputes
+everything in SQL, e.g. nightly, which also brings new catalog products
+into their category neighbours' lists.
+"""
+from django.db import connection, transaction
+
+from .models import CoPurchase, OrderItem, Product, RelatedProduct
+
+TOP_K = 8
+CATEGORY_AFFINITY = 0.5
+# Co-purchase rows read per product on incremental refresh
+CANDIDATES = TOP_K * 4
+# Pairs per upsert statement, well under SQLite's bound-parameter limit
+PAIR_BATCH = 400
+
+
+def related_products(product_id, limit=TOP_K):
+    """Available related products, best first: one indexed join."""
+    return list(
+        Product.objects.filter(related_for__product_id=product_id, available=True)
+        .order_by('related_for__rank')[:limit]
+    )
+
+
+def category_siblings(category_id):
+    """The newest live products of a category, enough to fill a list without the product itself."""
+    return (
+        Product.objects.filter(category_id=category_id, available=True)
+        .order_by('-id').values_list('id', flat=True)[:TOP_K + 1]
+    )
+
+
+def rank_candidates(product_id, category_id):
+    """Score and rank the related candidates of one product."""
+    scores = {}
+    for other_id, count, other_category_id in (
+        CoPurchase.objects.filter(product_id=product_id, other__available=True)
+        .order_by('-count', '-other_id')
+        .values_list('other_id', 'count', 'other__category_id')[:CANDIDATES]
+    ):
+        scores[other_id] = count + (CATEGORY_AFFINITY if other_category_id == category_id else 0)
+    for sibling_id in category_siblings(category_id):
+        if sibling_id != product_id:
+            scores.setdefault(sibling_id, CATEGORY_AFFINITY)
+    ranked = sorted(scores.items(), key=lambda pair: (-pair[1], -pair[0]))
+    return ranked[:TOP_K]
+
+
+def refresh_products(product_ids):
+    """Recompute the stored lists of the given products."""
+    categories = dict(Product.objects.filter(pk__in=product_ids).values_list('id', 'category_id'))
+    rows = []
+    for product_id, category_id in categories.items():
+        rows.extend(
+            RelatedProduct(product_id=product_id, related_id=other_id, rank=rank, score=score)
+            for rank, (other_id, score) in enumerate(rank_candidates(product_id, category_id), 1)
+        )
+    with transaction.atomic():
+        RelatedProduct.objects.filter(product_id__in=product_ids).delete()
+        RelatedProduct.objects.bulk_create(rows)
+
+
+def record_order(order_id):
+    """Count the pairs in a newly placed order and refresh its products' lists."""
+    product_ids = sorted(set(
+        OrderItem.objects.filter(order_id=order_id, product__isnull=False)
+        .values_list('product_id', flat=True)
+    ))
+    if len(product_ids) < 2:
+        return []
+    pairs = [(a, b) for a in product_ids for b in product_ids if a != b]
+    table = connection.ops.quote_name(CoPurchase._meta.db_table)
+    count = connection.ops.quote_name('count')
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            for start in range(0, len(pairs), PAIR_BATCH):
+                batch = pairs[start:start + PAIR_BATCH]
+                placeholders = ', '.join(['(%s, %s, 1)'] * len(batch))
+                cursor.execute(
+                    f'INSERT INTO {table} (product_id, other_id, {count}) VALUES {placeholders} '
+                    f'ON CONFLICT (product_id, other_id) DO UPDATE SET {count} = {table}.{count} + 1',
+                    [pk for pair in batch for pk in pair],
+                )
+        refresh_products(product_ids)
+    return product_ids
+
+
+def rebuild_related_index():
+    """Recompute CoPurchase and RelatedProduct from all order history."""
+    q = connection.ops.quote_name
+    copurchase = q(CoPurchase._meta.db_table)
+    related = q(RelatedProduct._meta.db_table)
+    product = q(Product._meta.db_table)
+    order_item = q(OrderItem._meta.db_table)
+    count = q('count')
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {related}')
+        cursor.execute(f'DELETE FROM {copurchase}')
+        cursor.execute(
+            f'INSERT INTO {copurchase} (product_id, other_id, {count}) '
+            f'SELECT a.product_id, b.product_id, COUNT(*) '
+            f'FROM {order_item} a JOIN {order_item} b '
+            f'ON b.order_id = a.order_id AND b.product_id <> a.product_id '
+            f'GROUP BY a.product_id, b.product_id'
+        )
+        cursor.execute(
+            f'''
+            INSERT INTO {related} (product_id, related_id, {q('rank')}, score)
+            SELECT product_id, related_id, rn, score FROM (
+                SELECT product_id, related_id, score,
+                       ROW_NUMBER() OVER (PARTITION BY product_id ORDER BY score DESC, related_id DESC) AS rn
+                FROM (
+                    SELECT product_id, related_id, MAX(score) AS score FROM (
+                        SELECT c.product_id, c.other_id AS related_id,
+                               c.{count} + CASE WHEN o.category_id = p.category_id THEN %s ELSE 0 END AS score
+                        FROM {copurchase} c
+                        JOIN {product} p ON p.id = c.product_id
+                        JOIN {product} o ON o.id = c.other_id AND o.available
+                        UNION ALL
+                        SELECT p.id, s.id, %s
+                        FROM {product} p
+                        JOIN (
+                            SELECT id, category_id,
+                                   ROW_NUMBER() OVER (PARTITION BY category_id ORDER BY id DESC) AS r
+                            FROM {product} WHERE available
+                        ) s ON s.category_id = p.category_id AND s.r <= %s AND s.id <> p.id
+                    ) candidates
+                    GROUP BY product_id, related_id
+                ) scored
+            ) ranked
+            WHERE rn <= %s
+            ''',
+            [CATEGORY_AFFINITY, CATEGORY_AFFINITY, TOP_K + 1, TOP_K],
+        )
+        cursor.execute(f'SELECT COUNT(*) FROM {copurchase}')
+        pairs = cursor.fetchone()[0]
+        cursor.execute(f'SELECT COUNT(*) FROM {related}')
+        entries = cursor.fetchone()[0]
+    return pairs, entries
@@ -0,0 +1,162 @@
+"""
+Read replicas: local copies of the primary database that serve catalog reads.
+
+Each alias in settings.REPLICAS is a SQLite file that `manage.py
+refresh_replicas` overwrites with a copy of the primary through SQLite's
+online backup API (refresh()). The copy is one write transaction on the
+replica, and replicas run in WAL mode, so a reader keeps the snapshot it
+started with while a refresh runs and the next one sees the new copy.
+Each refresh leaves a "<NAME>-refreshed" stamp next to the replica, dated
+to when the copy began. A full copy takes time in proportion to the size
+of the database: about 8 s for 1.4 GB here. REPLICA_MAX_LAG must cover
+that time plus the refresh interval.
+
+ReplicaRouter sends reads of the catalog models (REPLICA_MODELS) to one
+replica at most REPLICA_MAX_LAG seconds old. The same replica serves the
+whole request, so its reads come from one snapshot. Reads go to the
+primary instead when
+
+* no replica is fresh enough (for example, refresh_replicas is not running);
+* the model is not a catalog model: carts, orders, points, users and
+  sessions always read their latest state;
+* the read is inside a transaction on the primary, as in every write view;
+* the request is pinned: ReplicaMiddleware pins unsafe methods, and
+  requests within REPLICA_MAX_LAG seconds of a write by the same client
+  (PIN_COOKIE), so a shopper sees their own changes;
+* the read is under primary_reads(): the cart, checkout and order
+  confirmation views, and whatever fills a cache invalidated by version
+  token. Those tokens are replaced when a change commits; an entry built
+  from a replica that has not caught up yet would be stored under the
+  new token and outlive the change.
+
+Every write goes to the primary, and migrations only run there.
+"""
+import contextlib
+import contextvars
+import os
+import random
+import sqlite3
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from .database import SAFE_METHODS
+
+PRIMARY = DEFAULT_DB_ALIAS
+# Catalog models, read from replicas; all others read from the primary
+REPLICA_MODELS = {'season', 'occasion', 'category', 'product', 'copurchase', 'relatedproduct'}
+PIN_COOKIE = 'festivmart_primary'
+
+# The route of the current request or primary_reads() block; None outside them
+_route = contextvars.ContextVar('festivmart_read_route', default=None)
+
+
+class _ReadRoute:
+    __slots__ = ('primary', 'replica')
+
+    def __init__(self, primary):
+        self.primary = primary
+        self.replica = None
+
+
+def replica_aliases():
+    return getattr(settings, 'REPLICAS', ())
+
+
+def stamp_path(alias):
+    return Path(f"{connections[alias].settings_dict['NAME']}-refreshed")
+
+
+def lag(alias):
+    """Seconds since the copy `alias` holds was taken; None if it was never refreshed."""
+    try:
+        return time.time() - stamp_path(alias).stat().st_mtime
+    except OSError:
+        return None
+
+
+def fresh_replicas():
+    """The replicas at most REPLICA_MAX_LAG seconds behind the primary."""
+    bound = getattr(settings, 'REPLICA_MAX_LAG', 0)
+    return [alias for alias in replica_aliases() if (age := lag(alias)) is not None and age <= bound]
+
+
+def refresh(alias):
+    """Copy the primary into replica `alias`; returns the seconds it took."""
+    started = time.time()
+    # Django connects with uri=True too, so in-memory test databases can be copied
+    source = sqlite3.connect(str(connections[PRIMARY].settings_dict['NAME']), uri=True)
+    target = sqlite3.connect(str(connections[alias].settings_dict['NAME']), uri=True)
+    try:
+        target.execute('PRAGMA journal_mode = WAL')
+        source.backup(target)
+        # Passive: waits for no reader; the rest is checkpointed next time
+        target.execute('PRAGMA wal_checkpoint(PASSIVE)')
+    finally:
+        source.close()
+        target.close()
+    stamp = stamp_path(alias)
+    stamp.touch()
+    os.utime(stamp, (started, started))
+    return time.time() - started
+
+
+def _choose():
+    fresh = fresh_replicas()
+    return random.choice(fresh) if fresh else PRIMARY
+
+
+@contextlib.contextmanager
+def primary_reads():
+    """Context manager (or decorator) sending the reads within it to the primary."""
+    token = _route.set(_ReadRoute(primary=True))
+    try:
+        yield
+    finally:
+        _route.reset(token)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if model is None or model._meta.app_label != 'FestivMartApp' or model._meta.model_name not in REPLICA_MODELS:
+            return PRIMARY
+        route = _route.get()
+        if (route is not None and route.primary) or connections[PRIMARY].in_atomic_block:
+            return PRIMARY
+        if route is None:
+            return _choose()
+        if route.replica is None:
+            route.replica = _choose()
+        return route.replica
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas are copies of the primary, so their rows relate freely
+        databases = {PRIMARY, *replica_aliases()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == PRIMARY
+
+
+class ReplicaMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        writes = request.method not in SAFE_METHODS
+        token = _route.set(_ReadRoute(primary=writes or PIN_COOKIE in request.COOKIES))
+        try:
+            response = self.get_response(request)
+        finally:
+            _route.reset(token)
+        if writes and response.status_code < 400 and replica_aliases():
+            max_age = getattr(settings, 'REPLICA_MAX_LAG', 0)
+            response.set_cookie(PIN_COOKIE, '1', max_age=max_age, httponly=True, samesite='Lax')
+        return response
@@ -0,0 +1,226 @@
+"""
+Product full-text search backed by an SQLite FTS5 index.
+
+The FestivMartApp_product_fts table is an external-content FTS5 index over
+product name and description, kept in sync by triggers (see migration
+0011, which runs INDEX_SQL). Queries are ranked with bm25, name matches
+weigh more than description matches, and the last term is prefix-matched
+so "diy" finds "Diyas". Other database backends fall back to icontains
+filtering.
+
+Ranking scores every match, so its cost grows with the match set: about
+30 ms for 9k matches and over a second for 400k on a million products.
+Up to RANK_LIMIT matches are ranked exactly. Broader queries rank only
+the newest RANK_LIMIT matches and say so: their SearchPage is truncated,
+with no total, and the shopper is expected to narrow the query.
+"""
+import re
+from dataclasses import dataclass, replace
+
+from django.db import connection, connections
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .categories import get_category_tree
+from .models import Product
+
+FTS_TABLE = 'FestivMartApp_product_fts'
+PRODUCT_TABLE = Product._meta.db_table
+CATEGORY_TABLE = Product._meta.get_field('category').related_model._meta.db_table
+
+# bm25 column weights: name, description
+NAME_WEIGHT = 10.0
+DESCRIPTION_WEIGHT = 1.0
+
+MAX_TERMS = 8
+MAX_RESULTS = 100
+RANK_LIMIT = 500
+
+# The statements migration 0011 ran, which ensure_search_index() replays;
+# a change to them needs a migration of its own
+INDEX_SQL = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        name, description,
+        content='{PRODUCT_TABLE}', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3 4'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai
+    AFTER INSERT ON {PRODUCT_TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, name, description)
+        VALUES (new.id, new.name, new.description);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad
+    AFTER DELETE ON {PRODUCT_TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au
+    AFTER UPDATE OF name, description ON {PRODUCT_TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+        INSERT INTO {FTS_TABLE}(rowid, name, description)
+        VALUES (new.id, new.name, new.description);
+    END
+    """,
+]
+REBUILD_SQL = f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"
+TRIGGER_NAMES = (f'{FTS_TABLE}_ai', f'{FTS_TABLE}_ad', f'{FTS_TABLE}_au')
+DROP_SQL = [f'DROP TRIGGER IF EXISTS {name}' for name in reversed(TRIGGER_NAMES)] + [
+    f'DROP TABLE IF EXISTS {FTS_TABLE}',
+]
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+@dataclass(frozen=True)
+class SearchPage:
+    """One page of ranked ids; `total` is None when the match set was truncated."""
+    ids: list
+    total: int | None
+    truncated: bool = False
+
+
+def fts_available(using='default'):
+    return connections[using].vendor == 'sqlite'
+
+
+def build_match_query(text):
+    """
+    Turn free text into a safe FTS5 MATCH expression.
+
+    Every word is quoted so user input can never inject FTS5 operators,
+    and terms are ANDed. Only the last word is a prefix term ("diya"*),
+    matching as-you-type behaviour without paying for prefix merges on
+    words the shopper has already finished typing.
+    """
+    terms = _TOKEN_RE.findall(text or '')[:MAX_TERMS]
+    if not terms:
+        return None
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += '*'
+    return ' '.join(quoted)
+
+
+def search_product_ids(text, categories=None, seasonal=None, limit=20, offset=0, rank_limit=RANK_LIMIT):
+    """
+    A SearchPage of ranked ids of available products matching `text`.
+
+    `categories` restricts results to the subtrees of the given category
+    ids; `seasonal` (True/False) filters on Product.is_seasonal. Past
+    `rank_limit` matches the page is truncated (see the module docstring).
+    """
+    match = build_match_query(text)
+    if match is None:
+        return SearchPage([], 0)
+    limit = max(1, min(int(limit), MAX_RESULTS))
+    offset = max(0, int(offset))
+
+    if not fts_available():
+        qs = Product.objects.filter(available=True)
+        for term in _TOKEN_RE.findall(text)[:MAX_TERMS]:
+            qs = qs.filter(Q(name__icontains=term) | Q(description__icontains=term))
+        if categories:
+            qs = qs.filter(get_category_tree().subtree_q(categories))
+        if seasonal is not None:
+            qs = qs.filter(is_seasonal=seasonal)
+        return SearchPage(list(qs.order_by('-id').values_list('id', flat=True)[offset:offset + limit]), qs.count())
+
+    where = [f'{FTS_TABLE} MATCH %s', 'p.available = 1']
+    params = [match]
+    joins = [f'JOIN {PRODUCT_TABLE} p ON p.id = {FTS_TABLE}.rowid']
+    if seasonal is not None:
+        where.append('p.is_seasonal = %s')
+        params.append(bool(seasonal))
+    if categories:
+        tree = get_category_tree()
+        paths = [tree.get(int(c)).path for c in categories if tree.get(int(c))]
+        if not paths:
+            return SearchPage([], 0)
+        joins.append(f'JOIN {CATEGORY_TABLE} c ON c.id = p.category_id')
+        # A range rather than LIKE, so the path index applies
+        where.append('(' + ' OR '.join(['(c.path >= %s AND c.path < %s)'] * len(paths)) + ')')
+        for path in paths:
+            params.extend([path, path + '\uffff'])
+
+    # Score up to rank_limit + 1 matches, newest first (FTS5 walks its
+    # doclists in rowid order and stops there): if they all fit, that is
+    # the whole match set and the ranking is exact
+    sql = (
+        f'SELECT id, count(*) OVER () FROM ('
+        f'SELECT {FTS_TABLE}.rowid AS id, '
+        f'bm25({FTS_TABLE}, {NAME_WEIGHT}, {DESCRIPTION_WEIGHT}) AS score '
+        f'FROM {FTS_TABLE} ' + ' '.join(joins) +
+        ' WHERE ' + ' AND '.join(where) +
+        f' ORDER BY {FTS_TABLE}.rowid DESC LIMIT %s'
+        ') ORDER BY score, id LIMIT %s OFFSET %s'
+    )
+    params.extend([rank_limit + 1, limit, offset])
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+    matched = rows[0][1] if rows else None
+    if matched is not None and matched > rank_limit:
+        return SearchPage([pk for pk, _ in rows[:max(0, rank_limit - offset)]], None, truncated=True)
+    if matched is None and offset:
+        # Past the last result: the first page knows the total
+        return replace(search_product_ids(text, categories, seasonal, limit=1, rank_limit=rank_limit), ids=[])
+    return SearchPage([pk for pk, _ in rows], matched or 0)
+
+
+def load_products(ids):
+    """Product instances (with category) for `ids`, in order."""
+    products = Product.objects.select_related('category').in_bulk(ids)
+    return [products[pk] for pk in ids if pk in products]
+
+
+def search_products(text, **kwargs):
+    """Ranked Product instances (with category) matching `text`."""
+    return load_products(search_product_ids(text, **kwargs).ids)
+
+
+def filter_queryset(queryset, text):
+    """Restrict `queryset` to products matching `text` (unranked, for the admin)."""
+    match = build_match_query(text)
+    if match is None:
+        return queryset
+    if not fts_available(queryset.db):
+        for term in _TOKEN_RE.findall(text)[:MAX_TERMS]:
+            queryset = queryset.filter(Q(name__icontains=term) | Q(description__icontains=term))
+        return queryset
+    return queryset.filter(
+        pk__in=RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [match])
+    )
+
+
+def ensure_search_index(using='default', rebuild=False):
+    """
+    (Re)install the FTS table and triggers if they are missing.
+
+    SQLite schema changes on the product table rebuild it from a copy,
+    which drops its triggers; this restores them and reindexes.
+    Returns True if the index was rebuilt.
+    """
+    conn = connections[using]
+    if conn.vendor != 'sqlite':
+        return False
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = %s",
+            [PRODUCT_TABLE],
+        )
+        installed = {row[0] for row in cursor.fetchall()}
+    if installed.issuperset(TRIGGER_NAMES) and not rebuild:
+        return False
+
+    with conn.cursor() as cursor:
+        for sql in INDEX_SQL:
+            cursor.execute(sql)
+        cursor.execute(REBUILD_SQL)
+    return True
@@ -0,0 +1,120 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import festival_calendar, images, leaderboard, merchandising, points, product_detail
+from .categories import invalidate_category_tree
+from .models import Category, Occasion, Product, RelatedProduct, Season, UserProfile
+from .search import ensure_search_index
+
+
+@receiver([post_save, post_delete], sender=Category)
+def category_changed(sender, **kwargs):
+    invalidate_category_tree()
+
+
+@receiver([post_save, post_delete], sender=Season)
+@receiver([post_save, post_delete], sender=Occasion)
+def calendar_changed(sender, **kwargs):
+    transaction.on_commit(merchandising.invalidate_snapshot)
+    transaction.on_commit(festival_calendar.invalidate_calendar)
+
+
+@receiver(pre_save, sender=Product)
+def product_saving(sender, instance, **kwargs):
+    # A product moving category drops out of its old siblings' related lists;
+    # seller and seasonal flag drive the points ledger; a new image needs
+    # derivatives
+    instance._previous = None
+    if instance.pk:
+        instance._previous = (
+            Product.objects.filter(pk=instance.pk)
+            .values('category_id', 'seller_id', 'is_seasonal', 'image', 'image_variants').first()
+        )
+
+
+@receiver(post_save, sender=Product)
+def product_points(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous = instance._previous if not created else None
+    if previous is None:
+        if instance.seller_id:
+            points.product_listed(instance)
+        return
+    if previous['seller_id'] != instance.seller_id:
+        if previous['seller_id']:
+            points.product_removed(Product(pk=instance.pk, seller_id=previous['seller_id']),
+                                   previous['is_seasonal'])
+        if instance.seller_id:
+            points.product_listed(instance)
+    elif instance.seller_id and previous['is_seasonal'] != instance.is_seasonal:
+        points.seasonal_changed(instance, instance.is_seasonal)
+
+
+@receiver(post_save, sender=Product)
+def product_image_uploaded(sender, instance, created, raw=False, **kwargs):
+    if raw or not instance.image:
+        return
+    previous = instance._previous if not created else None
+    if previous is None or previous['image'] != instance.image.name:
+        product_id = instance.pk
+        # The save may have overwritten the old derivatives' names already
+        superseded = list(images.variant_names(previous and previous['image_variants']))
+        transaction.on_commit(lambda: images.prune(superseded), robust=True)
+        transaction.on_commit(lambda: images.schedule([product_id]), robust=True)
+
+
+@receiver(post_delete, sender=Product)
+def product_deleted_points(sender, instance, **kwargs):
+    if instance.seller_id:
+        points.product_removed(instance, instance.is_seasonal)
+
+
+@receiver(pre_delete, sender=Product)
+def product_deleting(sender, instance, **kwargs):
+    # The related-products rows naming it are gone by post_delete
+    instance._listed_by = list(
+        RelatedProduct.objects.filter(related_id=instance.pk).values_list('product_id', flat=True)
+    )
+
+
+@receiver([post_save, post_delete], sender=Product)
+def product_changed(sender, instance, **kwargs):
+    previous = getattr(instance, '_previous', None) or {}
+    category_ids = {instance.category_id, previous.get('category_id')} - {None}
+    product_id = instance.pk
+    listed_by = getattr(instance, '_listed_by', None)
+
+    def invalidate():
+        merchandising.invalidate_snapshot()
+        product_detail.invalidate_products([product_id])
+        product_detail.invalidate_categories(category_ids)
+        if listed_by is None:
+            product_detail.invalidate_listing(product_id)
+        else:
+            product_detail.invalidate_products(listed_by)
+    # After commit, so a concurrent reader cannot cache the old row under a new token
+    transaction.on_commit(invalidate)
+
+
+@receiver(m2m_changed, sender=Product.occasions.through)
+def product_occasions_changed(sender, action, **kwargs):
+    if action.startswith('post_'):
+        transaction.on_commit(merchandising.invalidate_snapshot)
+
+
+@receiver(post_save, sender=UserProfile)
+def profile_created(sender, instance, created, **kwargs):
+    if created:
+        leaderboard.apply({instance.total_points: 1})
+
+
+@receiver(post_delete, sender=UserProfile)
+def profile_deleted(sender, instance, **kwargs):
+    leaderboard.apply({instance.total_points: -1})
+
+
+def restore_search_index(sender, using='default', **kwargs):
+    """post_migrate: table rebuilds on SQLite drop the FTS triggers."""
+    ensure_search_index(using)
@@ -0,0 +1,26 @@
+"""
+Template access to the sized product images (see images.py).
+
+    {% load product_images %}
+    style="background-image: url('{{ product|image_url:'thumb' }}');
+           background-image: {{ product|image_set:'thumb' }};"
+
+The second declaration lets browsers that understand image-set() pick the
+WebP derivative; others keep the JPEG from the first.
+"""
+from django import template
+
+register = template.Library()
+
+
+@register.filter
+def image_url(product, size=None):
+    return product.get_image_url(size)
+
+
+@register.filter
+def image_set(product, size):
+    jpeg, webp = product.get_image_url(size), product.get_image_url(size, 'webp')
+    if jpeg == webp:
+        return f'url("{jpeg}")'
+    return f'image-set(url("{webp}") type("image/webp"), url("{jpeg}") type("image/jpeg"))'
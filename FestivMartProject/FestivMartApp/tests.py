@@ -1,3 +1,1956 @@
-from django.test import TestCase
+import contextlib
+import datetime
+import functools
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from collections import Counter
+from decimal import Decimal
+from types import SimpleNamespace
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache, caches
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import OperationalError, connection, connections, router, transaction
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import get_resolver, reverse
+from django.utils import timezone
+from PIL import Image
+
+from .management.commands import generate_image_derivatives
+
+from . import (
+    database, image_proxy, images, instrumentation, leaderboard, metrics, order_numbers, points, product_detail,
+    query_plans, related, replicas, views,
+)
+from .catalog import CatalogQuery
+from .checkout import InsufficientStock, place_order
+from .product_import import import_products
+from . import merchandising
+from .categories import get_category_tree
+from .models import (
+    Cart, CartItem, Category, Occasion, Order, OrderItem, PointsEntry, Product, RankNode, RelatedProduct,
+    Season, UserProfile,
+)
+from .search import build_match_query, search_product_ids, search_products
+
+
+@override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'product_detail': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'detail'},
+})
+class FestivMartTestCase(TestCase):
+    def setUp(self):
+        # Test transactions roll back without firing invalidation signals
+        for alias in caches:
+            caches[alias].clear()
+
+
+class CatalogPaginationTests(FestivMartTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.parent = Category.objects.create(name='Festival & Religious Items')
+        cls.child = Category.objects.create(name='Diyas & Lamps', parent=cls.parent)
+        cls.other = Category.objects.create(name='Electronics & Gadgets')
+        for i in range(30):
+            Product.objects.create(
+                name=f'Product {i}', description='', price=Decimal(i % 5 + 1),
+                category=cls.child if i % 2 else cls.other, stock=i % 3,
+                is_seasonal=i % 4 == 0,
+            )
+
+    def walk(self, query):
+        seen, cursor = [], None
+        while True:
+            page = query.page(cursor)
+            seen.extend(page.products)
+            if not page.has_next:
+                return seen
+            cursor = page.next_cursor
+
+    def test_pages_cover_catalog_once_in_order(self):
+        for sort in ('newest', 'price-low', 'price-high'):
+            rows = self.walk(CatalogQuery(sort=sort, page_size=7))
+            self.assertEqual(len(rows), 30)
+            self.assertEqual(len({p.id for p in rows}), 30)
+            expected = list(CatalogQuery(sort=sort).queryset())
+            self.assertEqual(rows, expected)
+
+    def test_filters_combine(self):
+        query = CatalogQuery(categories=[self.parent.id], min_price=Decimal('2'),
+                             in_stock=True, page_size=4)
+        rows = self.walk(query)
+        self.assertTrue(rows)
+        for product in rows:
+            self.assertEqual(product.category_id, self.child.id)
+            self.assertGreaterEqual(product.price, 2)
+            self.assertGreater(product.stock, 0)
+
+    def test_api_rejects_bad_cursor(self):
+        response = self.client.get(reverse('catalog_api'), {'cursor': 'garbage'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_api_follows_cursor(self):
+        url = reverse('catalog_api')
+        first = self.client.get(url, {'page_size': 20}).json()
+        second = self.client.get(url, {'page_size': 20, 'cursor': first['next_cursor']}).json()
+        self.assertEqual(len(first['products']) + len(second['products']), 30)
+        self.assertFalse(second['has_next'])
+
+    def test_shop_labels_the_page_not_the_catalog(self):
+        response = self.client.get(reverse('shop'), {'page_size': 20})
+        self.assertContains(response, 'Showing <strong>20</strong> products on this page, more on the next')
+
+
+class CategoryTreeTests(FestivMartTestCase):
+    def setUp(self):
+        super().setUp()
+        self.festival = Category.objects.create(name='Festival & Religious Items')
+        self.puja = Category.objects.create(name='Puja Items', parent=self.festival)
+        self.diyas = Category.objects.create(name='Diyas', parent=self.puja)
+        self.home = Category.objects.create(name='Home & Living')
+
+    def test_paths_and_breadcrumbs(self):
+        diyas = Category.objects.get(pk=self.diyas.pk)
+        self.assertEqual(diyas.path, f'/{self.festival.pk}/{self.puja.pk}/{self.diyas.pk}/')
+        self.assertEqual(diyas.depth, 2)
+        with self.assertNumQueries(0):
+            self.assertEqual(str(diyas), 'Festival & Religious Items > Puja Items > Diyas')
+        self.assertEqual(diyas.ancestor_ids, [self.festival.pk, self.puja.pk])
+
+    def test_move_and_rename_rewrite_subtree(self):
+        self.puja.parent = self.home
+        self.puja.name = 'Pooja Items'
+        self.puja.save()
+        diyas = Category.objects.get(pk=self.diyas.pk)
+        self.assertEqual(diyas.path, f'/{self.home.pk}/{self.puja.pk}/{self.diyas.pk}/')
+        self.assertEqual(diyas.breadcrumb, 'Home & Living > Pooja Items > Diyas')
+        self.assertEqual(
+            [n.name for n in get_category_tree().breadcrumbs(self.diyas.pk)],
+            ['Home & Living', 'Pooja Items', 'Diyas'],
+        )
+
+    def test_cannot_move_under_descendant(self):
+        self.festival.parent = self.diyas
+        with self.assertRaises(ValueError):
+            self.festival.save()
+
+    def test_subtree_filter_is_single_query(self):
+        Product.objects.create(name='Brass Diya', description='', price=10, category=self.diyas)
+        Product.objects.create(name='Lamp', description='', price=10, category=self.home)
+        tree = get_category_tree()
+        with self.assertNumQueries(1):
+            names = list(Product.objects.filter(tree.subtree_q([self.festival.pk])).values_list('name', flat=True))
+        self.assertEqual(names, ['Brass Diya'])
+
+    def test_subtree_filter_uses_the_path_index(self):
+        tree = get_category_tree()
+        plan = Category.objects.filter(tree.subtree_q([self.festival.pk], prefix='')).explain()
+        self.assertIn('USING INDEX', plan)
+        self.assertIn('(path>? AND path<?)', plan)
+        scans, plan = query_plans.full_scans(Product.objects.filter(tree.subtree_q([self.festival.pk])))
+        self.assertEqual(scans, [], plan)
+
+
+class ProductSearchTests(FestivMartTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.festival = Category.objects.create(name='Festival & Religious Items')
+        cls.diyas = Category.objects.create(name='Diyas & Lamps', parent=cls.festival)
+        cls.home = Category.objects.create(name='Home & Living')
+        cls.brass = Product.objects.create(
+            name='Brass Diya Set', description='Handmade lamps for Diwali',
+            price=10, category=cls.diyas, is_seasonal=True)
+        cls.clay = Product.objects.create(
+            name='Clay Lamp', description='Terracotta diya, pack of 12',
+            price=5, category=cls.diyas)
+        cls.lamp = Product.objects.create(
+            name='Desk Lamp', description='LED reading lamp', price=20, category=cls.home)
+
+    def test_match_query_quotes_terms(self):
+        self.assertEqual(build_match_query('diya OR "lamp'), '"diya" "OR" "lamp"*')
+        self.assertIsNone(build_match_query('  *** '))
+
+    def test_ranked_prefix_search(self):
+        # Name matches outrank description matches
+        self.assertEqual(search_products('diy'), [self.brass, self.clay])
+
+    def test_filters(self):
+        self.assertEqual(search_products('lamp', categories=[self.home.pk]), [self.lamp])
+        self.assertEqual(search_products('lamp', seasonal=True), [self.brass])
+
+    def test_index_follows_writes(self):
+        self.lamp.name = 'Desk Diya'
+        self.lamp.save()
+        self.assertIn(self.lamp, search_products('diya'))
+        Product.objects.filter(pk=self.brass.pk).delete()
+        self.assertNotIn(self.brass.pk, [p.pk for p in search_products('diya')])
+
+    def test_search_api(self):
+        response = self.client.get(reverse('search_api'), {'q': 'clay'})
+        self.assertEqual([r['id'] for r in response.json()['results']], [self.clay.pk])
+        self.assertEqual((response.json()['total'], response.json()['truncated']), (1, False))
+
+    def test_ranks_the_whole_match_set(self):
+        # The best match is the oldest, behind hundreds of newer ones
+        best = Product.objects.create(name='Lantern lantern', description='', price=5, category=self.home)
+        Product.objects.bulk_create(
+            Product(name=f'Item {i}', description='Paper lantern', price=5, category=self.home) for i in range(400)
+        )
+        page = search_product_ids('lantern', limit=5)
+        self.assertEqual((page.ids[0], page.total, page.truncated), (best.pk, 401, False))
+        last = search_product_ids('lantern', limit=5, offset=400)
+        self.assertEqual((len(last.ids), last.total), (1, 401))
+        past = search_product_ids('lantern', limit=5, offset=500)
+        self.assertEqual((past.ids, past.total), ([], 401))
+
+    def test_broad_queries_are_marked_truncated(self):
+        page = search_product_ids('lamp', rank_limit=2)
+        self.assertEqual((len(page.ids), page.total, page.truncated), (2, None, True))
+        self.assertEqual(search_product_ids('lamp', offset=2, rank_limit=2).ids, [])
+        self.assertFalse(search_product_ids('lamp', rank_limit=3).truncated)
+
+
+class MerchandisingSnapshotTests(FestivMartTestCase):
+    def setUp(self):
+        super().setUp()
+        today = timezone.localdate()
+        self.category = Category.objects.create(name='Festival Gifts')
+        self.diwali = Season.objects.create(
+            name='Diwali', start_date=today - datetime.timedelta(days=2),
+            end_date=today + datetime.timedelta(days=5))
+        self.holi = Occasion.objects.create(name='Holi', date=today + datetime.timedelta(days=10))
+        self.lamp = Product.objects.create(
+            name='Diya', description='', price=5, category=self.category,
+            is_seasonal=True, season=self.diwali)
+        self.colours = Product.objects.create(
+            name='Gulal', description='', price=3, category=self.category, is_seasonal=True)
+        self.colours.occasions.add(self.holi)
+        self.plain = Product.objects.create(name='Mug', description='', price=3, category=self.category)
+
+    def test_snapshot_groups_products(self):
+        snapshot = merchandising.get_snapshot()
+        self.assertEqual(snapshot['mode'], merchandising.MATCHED)
+        self.assertEqual(snapshot['product_ids'], [self.lamp.pk, self.colours.pk])
+        self.assertEqual(snapshot['by_season'], {self.diwali.pk: [self.lamp.pk]})
+        self.assertEqual(snapshot['by_occasion'], {self.holi.pk: [self.colours.pk]})
+
+    def test_page_is_one_query_when_warm(self):
+        merchandising.get_snapshot()
+        get_category_tree()
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('seasonal'))
+        self.assertEqual([p.pk for p in response.context['products']], [self.lamp.pk, self.colours.pk])
+
+    def test_product_changes_rebuild_snapshot(self):
+        merchandising.get_snapshot()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.plain.is_seasonal = True
+            self.plain.season = self.diwali
+            self.plain.save()
+            self.colours.occasions.remove(self.holi)
+        self.assertEqual(merchandising.get_snapshot()['product_ids'], [self.lamp.pk, self.plain.pk])
+
+    def test_calendar_change_rebuilds(self):
+        merchandising.get_snapshot()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.diwali.end_date = timezone.localdate() - datetime.timedelta(days=1)
+            self.diwali.save()
+        self.assertEqual(merchandising.get_snapshot()['product_ids'], [self.colours.pk])
+
+    def test_snapshot_is_keyed_by_local_date(self):
+        tomorrow = timezone.localdate() + datetime.timedelta(days=30)
+        snapshot = merchandising.get_snapshot(tomorrow)
+        self.assertEqual(snapshot['date'], tomorrow)
+        self.assertEqual(snapshot['mode'], merchandising.ALL_SEASONAL)
+
+    def test_changes_drop_every_date(self):
+        later = timezone.localdate() + datetime.timedelta(days=3)
+        self.assertEqual(merchandising.get_snapshot(later)['by_season'], {self.diwali.pk: [self.lamp.pk]})
+        with self.captureOnCommitCallbacks(execute=True):
+            self.lamp.available = False
+            self.lamp.save()
+        self.assertEqual(merchandising.get_snapshot(later)['by_season'], {self.diwali.pk: []})
+
+    def test_invalidation_writes_a_fresh_token(self):
+        merchandising.get_snapshot()
+        old = cache.get(merchandising.VERSION_KEY)
+        merchandising.invalidate_snapshot()
+        # Replaced, not deleted: no reader can pick the old token again
+        self.assertNotIn(cache.get(merchandising.VERSION_KEY), (None, old))
+
+
+class MerchandisingFileCacheTests(MerchandisingSnapshotTests):
+    """The same tests on the file cache that settings.py configures."""
+
+    def setUp(self):
+        self.location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.location)
+        cache_settings = override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': self.location,
+        }})
+        cache_settings.enable()
+        self.addCleanup(cache_settings.disable)
+        super().setUp()
+
+    def test_snapshot_is_shared_through_files(self):
+        snapshot = merchandising.get_snapshot()
+        # Another process reads the same directory
+        other = FileBasedCache(self.location, {})
+        key = merchandising.cache_key(other.get(merchandising.VERSION_KEY), timezone.localdate())
+        self.assertEqual(other.get(key), snapshot)
+
+
+class CartTotalsTests(FestivMartTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Sweets & Desserts')
+        cls.products = [
+            Product.objects.create(name=f'Sweet box {i}', description='', price=Decimal('150.00'),
+                                   discount_percent=10 if i % 2 else 0, category=cls.category, stock=100)
+            for i in range(6)
+        ]
+        cls.user = User.objects.create_user('shopper', 'shopper@example.com', 'pw')
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+        self.cart = Cart.objects.create(user=self.user)
+
+    def fill(self, count):
+        for product in self.products[:count]:
+            CartItem.objects.create(cart=self.cart, product=product, quantity=2)
+
+    def post(self, name, payload):
+        return self.client.post(reverse(name), json.dumps(payload), content_type='application/json')
+
+    def test_single_pass_figures(self):
+        self.fill(3)
+        self.cart.apply_coupon('save10')
+        with self.assertNumQueries(1):
+            totals = self.cart.get_totals()
+        # 2 x 150 + 2 x 135 + 2 x 150
+        self.assertEqual(totals.subtotal, Decimal('870.00'))
+        self.assertEqual(totals.discount_amount, Decimal('87.00'))
+        self.assertEqual(totals.tax_amount, Decimal('78.30'))
+        self.assertEqual(totals.shipping_cost, Decimal('99'))
+        self.assertEqual(totals.total, Decimal('960.30'))
+        self.assertEqual(totals.item_count, 6)
+
+    def test_empty_cart(self):
+        totals = self.cart.get_totals()
+        self.assertTrue(totals.is_empty)
+        self.assertEqual((totals.total, totals.shipping_cost), (0, 0))
+
+    def test_endpoint_query_counts_do_not_grow_with_cart(self):
+        # session + user + cart lookups, the write, then one pricing query;
+        # writes also open and release the view's transaction
+        for size in (1, 6):
+            CartItem.objects.filter(cart=self.cart).delete()
+            self.fill(size)
+            item = CartItem.objects.filter(cart=self.cart).first()
+            with self.subTest(size=size):
+                with self.assertNumQueries(4):
+                    self.client.get(reverse('cart_data'))
+                with self.assertNumQueries(4):
+                    self.client.get(reverse('cart'))
+                with self.assertNumQueries(4):
+                    self.client.get(reverse('checkout'))
+                with self.assertNumQueries(8):
+                    self.post('cart_add', {'product_id': item.product_id, 'quantity': 1})
+                with self.assertNumQueries(7):
+                    self.post('cart_update', {'item_id': item.id, 'quantity': 3})
+                with self.assertNumQueries(7):
+                    self.post('cart_apply_coupon', {'code': 'FESTIV20'})
+                with self.assertNumQueries(7):
+                    self.post('cart_remove', {'item_id': item.id})
+
+    def test_api_payload(self):
+        self.fill(2)
+        data = self.client.get(reverse('cart_data')).json()
+        self.assertEqual(data['cart_count'], 4)
+        self.assertEqual(data['subtotal'], 570.0)
+        self.assertEqual(len(data['items']), 2)
+
+
+class AnonymousCartTests(FestivMartTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Puja Items')
+        cls.diya = Product.objects.create(name='Diya', description='', price=50, category=category)
+        cls.thali = Product.objects.create(name='Thali', description='', price=300, category=category)
+        cls.user = User.objects.create_user('asha', 'asha@example.com', 'festive-pass-1')
+
+    def add(self, product, quantity=1):
+        return self.client.post(reverse('cart_add'), json.dumps({'product_id': product.pk, 'quantity': quantity}),
+                                content_type='application/json')
+
+    def login(self):
+        return self.client.post(reverse('login'), {'email': 'asha@example.com', 'password': 'festive-pass-1'})
+
+    def test_reads_are_virtual(self):
+        with self.assertNumQueries(0):
+            data = self.client.get(reverse('cart_data')).json()
+        self.assertEqual(data['cart_count'], 0)
+        self.client.get(reverse('cart'))
+        self.assertFalse(Cart.objects.exists())
+        self.assertNotIn('sessionid', self.client.cookies)
+
+    def test_first_add_materializes_cart(self):
+        self.add(self.diya, 2)
+        cart = Cart.objects.get()
+        self.assertIsNone(cart.user)
+        self.assertEqual(self.client.get(reverse('cart_data')).json()['cart_count'], 2)
+
+    def test_login_adopts_anonymous_cart(self):
+        self.add(self.diya, 2)
+        self.login()
+        cart = Cart.objects.get()
+        self.assertEqual(cart.user, self.user)
+        self.assertIsNone(cart.session_key)
+
+    def test_login_merges_into_existing_cart(self):
+        existing = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=existing, product=self.diya, quantity=1)
+        self.add(self.diya, 2)
+        self.add(self.thali)
+        self.client.post(reverse('cart_apply_coupon'), json.dumps({'code': 'DIWALI25'}),
+                         content_type='application/json')
+        self.login()
+        self.assertEqual(Cart.objects.count(), 1)
+        quantities = dict(existing.items.values_list('product__name', 'quantity'))
+        self.assertEqual(quantities, {'Diya': 3, 'Thali': 1})
+        existing.refresh_from_db()
+        self.assertEqual(existing.coupon_code, 'DIWALI25')
+
+
+class CartBatchTests(FestivMartTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Festival Gifts')
+        cls.products = [
+            Product.objects.create(name=f'Hamper item {i}', description='', price=100, category=category)
+            for i in range(10)
+        ]
+        cls.hidden = Product.objects.create(name='Retired', description='', price=1, category=category,
+                                            available=False)
+        cls.user = User.objects.create_user('ravi', 'ravi@example.com', 'pw')
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+
+    def batch(self, operations):
+        return self.client.post(reverse('cart_batch'), json.dumps({'operations': operations}),
+                                content_type='application/json')
+
+    def quantities(self):
+        return dict(CartItem.objects.filter(cart__user=self.user).values_list('product_id', 'quantity'))
+
+    def test_whole_hamper_in_one_request(self):
+        ops = [{'op': 'add', 'product_id': p.pk, 'quantity': 2} for p in self.products]
+        response = self.batch(ops)
+        self.assertEqual(response.json()['cart_count'], 20)
+        self.assertEqual(response.json()['subtotal'], 2000.0)
+
+        first, second, third = self.products[:3]
+        response = self.batch([
+            {'op': 'add', 'product_id': first.pk, 'quantity': 3},
+            {'op': 'set', 'product_id': second.pk, 'quantity': 7},
+            {'op': 'remove', 'product_id': third.pk},
+            {'op': 'set', 'product_id': self.products[3].pk, 'quantity': 0},
+        ])
+        self.assertEqual(response.json()['changed'], 4)
+        quantities = self.quantities()
+        self.assertEqual((quantities[first.pk], quantities[second.pk]), (5, 7))
+        self.assertNotIn(third.pk, quantities)
+        self.assertNotIn(self.products[3].pk, quantities)
+
+    def test_query_count_is_constant(self):
+        self.batch([{'op': 'add', 'product_id': self.products[0].pk}])
+        ops = [{'op': 'add', 'product_id': p.pk} for p in self.products]
+        # SAVEPOINT, session, user, cart, SAVEPOINT, read, product check,
+        # upsert, RELEASE, totals, RELEASE (the view's own transaction)
+        with self.assertNumQueries(11):
+            self.batch(ops)
+
+    def test_invalid_batch_writes_nothing(self):
+        response = self.batch([
+            {'op': 'add', 'product_id': self.products[0].pk},
+            {'op': 'add', 'product_id': self.hidden.pk},
+            {'op': 'explode', 'product_id': 1},
+        ])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.json()['errors']), {'2'})
+        response = self.batch([
+            {'op': 'add', 'product_id': self.products[0].pk},
+            {'op': 'add', 'product_id': self.hidden.pk},
+        ])
+        self.assertEqual(response.json()['errors'], {'1': 'Product not found.'})
+        self.assertEqual(self.quantities(), {})
+
+
+class CheckoutTests(FestivMartTestCase):
+    ADDRESS = {
+        'full_name': 'Ravi Kumar', 'email': 'ravi@example.com', 'phone': '9876543210',
+        'address': '12 MG Road', 'city': 'Pune', 'postal_code': '411001',
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Festival Gifts')
+        cls.diya = Product.objects.create(name='Clay Diya', description='', price=50, category=category, stock=5)
+        cls.lamp = Product.objects.create(name='Brass Lamp', description='', price=900, category=category, stock=1)
+        cls.user = User.objects.create_user('ravi', 'ravi@example.com', 'pw')
+
+    def setUp(self):
+        super().setUp()
+        self.cart = Cart.objects.create(user=self.user)
+
+    def stock(self):
+        return dict(Product.objects.filter(pk__in=[self.diya.pk, self.lamp.pk]).values_list('id', 'stock'))
+
+    def test_order_reserves_stock_and_empties_cart(self):
+        CartItem.objects.create(cart=self.cart, product=self.diya, quantity=3)
+        CartItem.objects.create(cart=self.cart, product=self.lamp, quantity=1)
+        self.cart.apply_coupon('DIWALI25')
+        UserProfile.objects.create(user=self.user)
+
+        # SAVEPOINT, totals, stock UPDATE, order, order items, clear items,
+        # points entry, profile points, profile counters, leaderboard,
+        # clear coupon, RELEASE
+        with self.assertNumQueries(12):
+            order = place_order(self.cart, self.user, **self.ADDRESS)
+
+        self.assertEqual(self.stock(), {self.diya.pk: 2, self.lamp.pk: 0})
+        self.assertEqual(order.items.count(), 2)
+        self.assertEqual(order.total, Decimal('866.25'))
+        self.assertEqual(order.coupon_code, 'DIWALI25')
+        self.assertFalse(self.cart.items.exists())
+
+    def test_insufficient_stock_writes_nothing(self):
+        CartItem.objects.create(cart=self.cart, product=self.diya, quantity=3)
+        CartItem.objects.create(cart=self.cart, product=self.lamp, quantity=2)
+
+        with self.assertRaises(InsufficientStock) as ctx:
+            place_order(self.cart, self.user, **self.ADDRESS)
+
+        self.assertEqual(ctx.exception.shortages, {self.lamp.pk: 1})
+        self.assertEqual(self.stock(), {self.diya.pk: 5, self.lamp.pk: 1})
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(self.cart.items.count(), 2)
+
+    def test_view_reports_shortage(self):
+        CartItem.objects.create(cart=self.cart, product=self.lamp, quantity=2)
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('checkout'), self.ADDRESS)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Not enough stock for: Brass Lamp')
+
+        CartItem.objects.filter(cart=self.cart).update(quantity=1)
+        response = self.client.post(reverse('checkout'), self.ADDRESS)
+        order = Order.objects.get(user=self.user)
+        self.assertRedirects(response, reverse('order_success', args=[order.order_number]))
+
+
+class OrderNumberTests(TestCase):
+    def test_format_and_order(self):
+        generator = order_numbers.SnowflakeGenerator(worker_id=7)
+        numbers = [generator.next() for _ in range(1000)]
+        self.assertEqual(len(set(numbers)), 1000)
+        self.assertEqual(numbers, sorted(numbers))
+        for number in numbers[:5]:
+            self.assertRegex(number, r'^FM[0-9A-HJKMNP-TV-Z]{14}$')
+        created, worker, sequence = order_numbers.decode(numbers[0])
+        self.assertEqual(worker, 7)
+        self.assertLess(abs(created - timezone.now()), datetime.timedelta(seconds=5))
+
+    def test_monotonic_when_clock_stalls_or_steps_back(self):
+        times = iter([1800000000.0] * 200 + [1799999999.0] * 5)
+        generator = order_numbers.SnowflakeGenerator(worker_id=1, clock=lambda: next(times))
+        numbers = [generator.next() for _ in range(205)]
+        self.assertEqual(numbers, sorted(set(numbers)))
+        # 128 per millisecond, then the next millisecond is borrowed
+        self.assertEqual(order_numbers.decode(numbers[127])[2], 127)
+        self.assertEqual(order_numbers.decode(numbers[128])[2], 0)
+
+    def test_workers_do_not_collide(self):
+        clock = lambda: 1800000000.0
+        a = order_numbers.SnowflakeGenerator(worker_id=1, clock=clock)
+        b = order_numbers.SnowflakeGenerator(worker_id=2, clock=clock)
+        first = {a.next() for _ in range(500)}
+        second = {b.next() for _ in range(500)}
+        self.assertFalse(first & second)
+
+    def test_orders_get_numbers(self):
+        user = User.objects.create_user('ravi', 'ravi@example.com', 'pw')
+        order = Order.objects.create(
+            user=user, full_name='Ravi', email='ravi@example.com', phone='1', address='x', city='Pune',
+            postal_code='411001', subtotal=1, tax_amount=0, shipping_cost=0, total=1,
+        )
+        self.assertTrue(order.order_number.startswith('FM'))
+        self.assertLessEqual(len(order.order_number), Order._meta.get_field('order_number').max_length)
+
+
+class ProductDetailCacheTests(FestivMartTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.parent = Category.objects.create(name='Festival & Religious Items')
+        cls.category = Category.objects.create(name='Diyas & Lamps', parent=cls.parent)
+        cls.diya = Product.objects.create(name='Clay Diya', description='Hand made', price=50,
+                                          category=cls.category, stock=5)
+        cls.lamp = Product.objects.create(name='Brass Lamp', description='', price=900, category=cls.category)
+
+    def get(self, **headers):
+        return self.client.get(reverse('product_detail_api', args=[self.diya.pk]), headers=headers)
+
+    def test_payload_and_conditional_get(self):
+        response = self.get()
+        data = response.json()
+        self.assertEqual(data['category'], 'Festival & Religious Items > Diyas & Lamps')
+        self.assertEqual([p['name'] for p in data['related_products']], ['Brass Lamp'])
+        etag = response['ETag']
+        self.assertTrue(etag.startswith('"'))
+        self.assertIn('Last-Modified', response)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get(**{'If-None-Match': etag}).status_code, 304)
+            self.assertEqual(self.get(**{'If-None-Match': f'W/{etag}'}).status_code, 304)
+            self.assertEqual(self.get(**{'If-Modified-Since': response['Last-Modified']}).status_code, 304)
+            self.assertEqual(self.get().content, response.content)
+        self.assertEqual(self.get(**{'If-None-Match': '"stale"'}).status_code, 200)
+
+    def test_missing_product(self):
+        response = self.client.get(reverse('product_detail_api', args=[0]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_payloads_stay_in_the_process_tokens_are_shared(self):
+        etag = self.get()['ETag']
+        key = product_detail.entry_key(self.diya.pk)
+        self.assertIsNotNone(caches['product_detail'].get(key))
+        self.assertIsNone(cache.get(key))
+        # Another process changes the product and replaces its token in the shared cache
+        Product.objects.filter(pk=self.diya.pk).update(price=70)
+        product_detail.invalidate_products([self.diya.pk])
+        response = self.get(**{'If-None-Match': etag})
+        self.assertEqual((response.status_code, response.json()['price']), (200, 70.0))
+
+    def test_invalidated_by_product_sibling_and_category_changes(self):
+        etags = [self.get()['ETag']]
+
+        def changed():
+            response = self.get(**{'If-None-Match': etags[-1]})
+            self.assertEqual(response.status_code, 200)
+            etags.append(response['ETag'])
+            return response.json()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.diya.price = 60
+            self.diya.save()
+        self.assertEqual(changed()['price'], 60.0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.lamp.name = 'Brass Aarti Lamp'
+            self.lamp.save()
+        self.assertEqual(changed()['related_products'][0]['name'], 'Brass Aarti Lamp')
+
+        self.parent.name = 'Puja Essentials'
+        self.parent.save()
+        self.assertEqual(changed()['category'], 'Puja Essentials > Diyas & Lamps')
+
+        user = User.objects.create_user('ravi', 'ravi@example.com', 'pw')
+        cart = Cart.objects.create(user=user)
+        CartItem.objects.create(cart=cart, product=self.diya, quantity=2)
+        with self.captureOnCommitCallbacks(execute=True):
+            place_order(cart, user, full_name='Ravi', email='ravi@example.com', phone='1',
+                        address='x', city='Pune', postal_code='411001')
+        self.assertEqual(changed()['stock'], 3)
+
+
+class RelatedProductsTests(FestivMartTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.lamps = Category.objects.create(name='Diyas & Lamps')
+        cls.sweets = Category.objects.create(name='Sweets')
+        cls.diya, cls.lamp, cls.candle = [
+            Product.objects.create(name=name, description='', price=100, category=cls.lamps)
+            for name in ('Clay Diya', 'Brass Lamp', 'Candle')
+        ]
+        cls.ladoo, cls.barfi = [
+            Product.objects.create(name=name, description='', price=100, category=cls.sweets)
+            for name in ('Ladoo', 'Barfi')
+        ]
+        cls.user = User.objects.create_user('ravi', 'ravi@example.com', 'pw')
+
+    def order(self, *products):
+        order = Order.objects.create(
+            user=self.user, full_name='Ravi', email='ravi@example.com', phone='1', address='x', city='Pune',
+            postal_code='411001', subtotal=1, tax_amount=0, shipping_cost=0, total=1,
+        )
+        OrderItem.objects.bulk_create(
+            OrderItem(order=order, product=p, product_name=p.name, quantity=1, unit_price=1, line_total=1)
+            for p in products
+        )
+        return order
+
+    def index(self):
+        return {
+            (row.product_id, row.rank): (row.related_id, row.score)
+            for row in RelatedProduct.objects.all()
+        }
+
+    def test_copurchases_outrank_category_and_incremental_matches_rebuild(self):
+        orders = [
+            self.order(self.diya, self.ladoo),
+            self.order(self.diya, self.ladoo, self.lamp),
+            self.order(self.diya, self.lamp),
+            self.order(self.diya, self.barfi),
+        ]
+        for order in orders:
+            related.record_order(order.pk)
+        # Only products that were ordered are refreshed incrementally
+        related.refresh_products([self.candle.pk])
+        incremental = self.index()
+
+        related.rebuild_related_index()
+        self.assertEqual(self.index(), incremental)
+
+        ranked = [p.name for p in related.related_products(self.diya.pk)]
+        # Lamp: 2 orders + same category; Ladoo: 2 orders; Barfi: 1; Candle: category only
+        self.assertEqual(ranked, ['Brass Lamp', 'Ladoo', 'Barfi', 'Candle'])
+        self.assertEqual([p.name for p in related.related_products(self.candle.pk)], ['Brass Lamp', 'Clay Diya'])
+
+    def test_unavailable_products_are_skipped(self):
+        related.record_order(self.order(self.diya, self.ladoo).pk)
+        Product.objects.filter(pk=self.ladoo.pk).update(available=False)
+        self.assertNotIn(self.ladoo, related.related_products(self.diya.pk))
+
+    def test_detail_api_reads_index(self):
+        user = self.user
+        cart = Cart.objects.create(user=user)
+        CartItem.objects.create(cart=cart, product=self.diya, quantity=1)
+        CartItem.objects.create(cart=cart, product=self.barfi, quantity=1)
+        with self.captureOnCommitCallbacks(execute=True):
+            place_order(cart, user, full_name='Ravi', email='ravi@example.com', phone='1',
+                        address='x', city='Pune', postal_code='411001')
+
+        # product, related products
+        with self.assertNumQueries(2):
+            data = self.client.get(reverse('product_detail_api', args=[self.diya.pk])).json()
+        self.assertEqual(data['related_products'][0]['name'], 'Barfi')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.barfi.name = 'Kaju Barfi'
+            self.barfi.save()
+        data = self.client.get(reverse('product_detail_api', args=[self.diya.pk])).json()
+        self.assertEqual(data['related_products'][0]['name'], 'Kaju Barfi')
+
+
+class FestivalCalendarTests(FestivMartTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.year = timezone.localdate().year
+        Season.objects.create(name='Winter', start_date=datetime.date(cls.year, 12, 1),
+                              end_date=datetime.date(cls.year + 1, 2, 28))
+        Occasion.objects.create(name='Diwali', date=datetime.date(cls.year, 11, 1))
+        Occasion.objects.create(name='Holi', date=datetime.date(cls.year + 1, 3, 14))
+
+    def get(self, params=None, **headers):
+        return self.client.get(reverse('year_dates_api'), params or {}, headers=headers)
+
+    def test_whole_calendar_is_cached_and_conditional(self):
+        response = self.get()
+        data = response.json()
+        self.assertEqual(data['year'], self.year)
+        self.assertEqual([o['name'] for o in data['occasions']], ['Diwali', 'Holi'])
+        self.assertEqual(data['seasons'][0]['start_date'], f'{self.year}-12-01')
+        self.assertIn('max-age', response['Cache-Control'])
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get().content, response.content)
+            self.assertEqual(self.get(**{'If-None-Match': response['ETag']}).status_code, 304)
+
+    def test_multi_year_range(self):
+        data = self.get({'from': self.year, 'to': self.year + 2}).json()
+        self.assertEqual((data['from'], data['to']), (self.year, self.year + 2))
+        years = data['years']
+        self.assertEqual([y['year'] for y in years], [self.year, self.year + 1, self.year + 2])
+        # The winter season spans the new year
+        self.assertEqual([len(y['seasons']) for y in years], [1, 1, 0])
+        self.assertEqual([o['name'] for o in years[1]['occasions']], ['Holi'])
+
+        for params in ({'from': 'x'}, {'from': self.year, 'to': self.year - 1}, {'from': 2000, 'to': 2020}):
+            self.assertEqual(self.get(params).status_code, 400)
+
+    def test_rebuilt_on_save(self):
+        etag = self.get()['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            Occasion.objects.create(name='Navratri', date=datetime.date(self.year, 10, 3))
+        response = self.get(**{'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([o['name'] for o in response.json()['occasions']], ['Navratri', 'Diwali', 'Holi'])
+
+
+class PointsLedgerTests(FestivMartTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Festival Gifts')
+        cls.seller = User.objects.create_user('meera', 'meera@example.com', 'pw')
+        cls.seller.date_joined = timezone.now() - datetime.timedelta(days=10)
+        cls.seller.save()
+        UserProfile.objects.create(user=cls.seller, is_business=True)
+
+    def profile(self):
+        return UserProfile.objects.get(user=self.seller)
+
+    def ledger_total(self):
+        return sum(PointsEntry.objects.filter(user=self.seller).values_list('points', flat=True))
+
+    def list_products(self, count, **fields):
+        return [
+            Product.objects.create(name=f'Item {i}', description='', price=10, category=self.category,
+                                   seller=self.seller, **fields)
+            for i in range(count)
+        ]
+
+    def test_events_update_profile(self):
+        products = self.list_products(4)
+        seasonal, = self.list_products(1, is_seasonal=True)
+        profile = self.profile()
+        self.assertEqual((profile.product_count, profile.seasonal_count, profile.total_points), (5, 1, 270))
+        self.assertEqual(profile.badges, ['early_adopter', 'first_listing', 'pro_seller'])
+
+        seasonal.is_seasonal = False
+        seasonal.save()
+        products[0].delete()
+        profile = self.profile()
+        self.assertEqual((profile.product_count, profile.seasonal_count, profile.total_points), (4, 0, 200))
+        self.assertEqual(profile.badges, ['early_adopter', 'first_listing'])
+        self.assertEqual(self.ledger_total(), 200)
+
+        self.assertEqual(points.tick_account_age(), 1)
+        self.assertEqual(points.tick_account_age(), 0)
+        profile = self.profile()
+        self.assertEqual((profile.account_age_days, profile.total_points, profile.level), (10, 250, 1))
+        self.assertEqual(profile.badges, ['early_adopter', 'first_listing'])
+        self.assertEqual(self.ledger_total(), 250)
+
+    def test_rebuild_matches_ledger(self):
+        self.list_products(3, is_seasonal=True)
+        points.tick_account_age()
+        incremental = self.profile()
+        UserProfile.objects.filter(user=self.seller).update(total_points=0, product_count=0, badges=[])
+        buyer = User.objects.create_user('ravi', 'ravi@example.com', 'pw')
+        Order.objects.create(
+            user=buyer, full_name='Ravi', email='ravi@example.com', phone='1', address='x', city='Pune',
+            postal_code='411001', subtotal=1, tax_amount=0, shipping_cost=0, total=1,
+        )
+
+        self.assertEqual(points.rebuild_points(), 2)
+        rebuilt = self.profile()
+        for field in ('product_count', 'seasonal_count', 'account_age_days', 'total_points', 'level', 'badges'):
+            self.assertEqual(getattr(rebuilt, field), getattr(incremental, field))
+        self.assertEqual(self.ledger_total(), rebuilt.total_points)
+        self.assertEqual(UserProfile.objects.get(user=buyer).order_count, 1)
+
+    def test_views_render_from_profile(self):
+        self.list_products(2)
+        self.client.force_login(self.seller)
+        # session, user, profile
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('score'))
+        self.assertEqual(response.context['stats']['total_products'], 2)
+        # Listings, plus the 10 days of account age not ticked yet
+        self.assertEqual(response.context['score_data']['points'], 150)
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('dashboard'))
+        self.assertEqual(response.context['score_data']['points'], 150)
+        points.tick_account_age()
+        self.assertEqual(self.client.get(reverse('score')).context['score_data']['points'], 150)
+
+    def test_only_business_profiles_earn_listing_points(self):
+        shopper = User.objects.create_user('ravi', 'ravi@example.com', 'pw')
+        UserProfile.objects.create(user=shopper)
+        product = Product.objects.create(name='Diya', description='', price=10, category=self.category,
+                                         seller=shopper, is_seasonal=True)
+        product.delete()
+        self.assertEqual(UserProfile.objects.get(user=shopper).total_points, 0)
+        self.assertFalse(PointsEntry.objects.filter(user=shopper).exists())
+        self.assertEqual(points.rebuild_points(), 2)
+        self.assertEqual(UserProfile.objects.get(user=shopper).total_points, 0)
+
+
+class LeaderboardTests(FestivMartTestCase):
+    SCORES = [120, 500, 120, 0, 75, 500, 980, 120, 30]
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.profiles = []
+        for i, score in enumerate(cls.SCORES):
+            user = User.objects.create_user(f'seller{i}', f'seller{i}@example.com', 'pw')
+            cls.profiles.append(UserProfile.objects.create(user=user, total_points=score))
+
+    def naive_rank(self, score):
+        return 1 + UserProfile.objects.filter(total_points__gt=score).count()
+
+    def test_ranks_match_count(self):
+        places, total = leaderboard.ranks(set(self.SCORES) | {10_000, 1})
+        self.assertEqual(total, len(self.SCORES))
+        for score, place in places.items():
+            self.assertEqual(place, self.naive_rank(score))
+        self.assertEqual(places[980], 1)
+        self.assertEqual(places[500], 2)
+        self.assertEqual(places[120], 4)
+        self.assertEqual(places[0], 9)
+
+    def test_top_shares_rank_on_ties(self):
+        self.assertEqual(
+            [(entry['rank'], entry['points']) for entry in leaderboard.top(5)],
+            [(1, 980), (2, 500), (2, 500), (4, 120), (4, 120)],
+        )
+
+    def test_standing_lists_neighbours(self):
+        me = self.profiles[2]  # 120, second of three ties by id
+        standing = leaderboard.standing(me, 3, 2)
+        self.assertEqual(standing['me']['rank'], 4)
+        self.assertEqual(standing['total'], 9)
+        self.assertEqual(
+            [(e['points'], e['rank']) for e in standing['above']], [(500, 2), (120, 4)]
+        )
+        self.assertEqual(
+            [(e['points'], e['rank']) for e in standing['below']], [(120, 4), (75, 7)]
+        )
+
+    def test_ledger_moves_profile(self):
+        last = self.profiles[3]
+        points.record(last.user_id, PointsEntry.ORDER, 1000)
+        self.assertEqual(leaderboard.rank(1000), 1)
+        self.assertEqual(leaderboard.rank(0), self.naive_rank(0))
+        last.refresh_from_db()
+        self.assertEqual(leaderboard.standing(last, 1, 0)['me']['rank'], 1)
+
+        last.delete()
+        self.assertEqual(leaderboard.total(), len(self.SCORES) - 1)
+
+    def test_negative_totals_rank_below_zero(self):
+        points.record(self.profiles[3].user_id, PointsEntry.BACKFILL, -50)
+        places, total = leaderboard.ranks({0, -50, -10})
+        self.assertEqual((places[0], places[-10], places[-50], total), (9, 9, 9, len(self.SCORES)))
+        points.record(self.profiles[4].user_id, PointsEntry.BACKFILL, -95)
+        self.assertEqual(leaderboard.ranks({-20, -50})[0], {-20: 8, -50: 9})
+
+    def test_names_only_business_profiles(self):
+        UserProfile.objects.filter(pk=self.profiles[6].pk).update(is_business=True, business_name='Diya House')
+        UserProfile.objects.filter(pk=self.profiles[1].pk).update(business_name='Not a business')
+        names = [entry['name'] for entry in self.client.get(reverse('leaderboard_api'), {'top': 3}).json()['top']]
+        self.assertEqual(names, ['Diya House', leaderboard.SHOPPER_NAME, leaderboard.SHOPPER_NAME])
+        self.assertNotIn(b'seller', self.client.get(reverse('leaderboard_api'), {'top': 100}).content)
+
+    def test_rebuild_matches_incremental(self):
+        points.record(self.profiles[0].user_id, PointsEntry.BACKFILL, -200)
+        points.record(self.profiles[1].user_id, PointsEntry.ORDER, 10)
+        incremental = dict(RankNode.objects.filter(count__gt=0).values_list('idx', 'count'))
+        RankNode.objects.all().delete()
+        self.assertEqual(leaderboard.rebuild(), len(self.SCORES))
+        self.assertEqual(dict(RankNode.objects.values_list('idx', 'count')), incremental)
+
+    def test_api(self):
+        # anonymous: top K and the total
+        with self.assertNumQueries(2):
+            data = self.client.get(reverse('leaderboard_api'), {'top': 2}).json()
+        self.assertIsNone(data['me'])
+        self.assertEqual(len(data['top']), 2)
+
+        self.client.force_login(self.profiles[4].user)
+        # session, user, profile, 4 neighbour scans, tree nodes, top K
+        with self.assertNumQueries(9):
+            data = self.client.get(reverse('leaderboard_api'), {'top': 3, 'around': 1}).json()
+        self.assertEqual(data['me']['rank'], 7)
+        self.assertEqual([e['points'] for e in data['above'] + data['below']], [120, 30])
+        self.assertEqual(self.client.get(reverse('leaderboard_api'), {'top': 'x'}).status_code, 400)
+
+
+class ImageDerivativeTests(FestivMartTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Home Decor')
+
+    def setUp(self):
+        super().setUp()
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        media_settings = override_settings(MEDIA_ROOT=media, IMAGE_WORKERS=0)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+
+    def upload(self, size=(1200, 900), mode='RGB', name='lamp.png'):
+        buffer = io.BytesIO()
+        Image.new(mode, size, 'orange').save(buffer, 'PNG')
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+    def create(self, **fields):
+        return Product.objects.create(name='Lamp', description='', price=10, category=self.category, **fields)
+
+    def open_derived(self, product, size, fmt):
+        return Image.open(product.image.storage.open(product.image_variants[size][fmt]))
+
+    def test_upload_generates_sizes_and_formats(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            product = self.create(image=self.upload())
+        product.refresh_from_db()
+        self.assertEqual(product.image_variants['source'], product.image.name)
+        for size, expected in (('thumb', (320, 240)), ('medium', (800, 600))):
+            with self.open_derived(product, size, 'jpeg') as jpeg, self.open_derived(product, size, 'webp') as webp:
+                self.assertEqual((jpeg.format, jpeg.size), ('JPEG', expected))
+                self.assertEqual((webp.format, webp.size), ('WEBP', expected))
+
+        name = product.image_variants['thumb']['webp']
+        with product.image.storage.open(name) as f:
+            self.assertEqual(name, images.content_name(f.read(), 'webp'))
+        self.assertEqual(product.get_image_url('thumb', 'webp'), f'/media/{name}')
+        self.assertEqual(product.get_image_url(), product.image.url)
+
+        data = self.client.get(reverse('catalog_api')).json()
+        self.assertEqual(data['products'][0]['image'], product.get_image_url('thumb'))
+        self.assertContains(self.client.get(reverse('shop')), product.get_image_url('thumb', 'webp'))
+
+    def test_new_upload_falls_back_until_regenerated(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            product = self.create(image=self.upload())
+        product.refresh_from_db()
+        old_thumb = product.get_image_url('thumb')
+
+        product.image = self.upload(size=(600, 1200), name='tall.png')
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            product.save()
+        self.assertEqual(product.get_image_url('thumb'), product.image.url)
+        for callback in callbacks:
+            callback()
+        product.refresh_from_db()
+        self.assertNotEqual(product.get_image_url('thumb'), old_thumb)
+        with self.open_derived(product, 'thumb', 'jpeg') as thumb:
+            self.assertEqual(thumb.size, (160, 320))
+
+    def test_replaced_derivatives_are_deleted_once_unused(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            first, second = self.create(image=self.upload()), self.create(image=self.upload())
+        first.refresh_from_db()
+        old = set(images.variant_names(first.image_variants))
+        storage = first.image.storage
+        self.assertEqual(len(old), 4)
+
+        for product, name in ((first, 'tall.png'), (second, 'tall2.png')):
+            product.image = self.upload(size=(600, 1200), name=name)
+            with self.captureOnCommitCallbacks(execute=True):
+                product.save()
+            # Identical pixels: kept while the other product still shows them
+            self.assertEqual(all(storage.exists(name) for name in old), product is first)
+        second.refresh_from_db()
+        self.assertTrue(all(storage.exists(name) for name in images.variant_names(second.image_variants)))
+
+    def test_small_and_transparent_images(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            product = self.create(image=self.upload(size=(100, 50), mode='RGBA'))
+        product.refresh_from_db()
+        with self.open_derived(product, 'medium', 'jpeg') as medium:
+            self.assertEqual((medium.mode, medium.size), ('RGB', (100, 50)))
+
+    def test_backfill_command(self):
+        # Without captureOnCommitCallbacks the upload hooks never run
+        products = [self.create(image=self.upload(name=f'item{i}.png')) for i in range(3)]
+        self.create(image_url='https://example.com/lamp.jpg')
+        self.assertEqual(images.pending().count(), 3)
+
+        call_command('generate_image_derivatives', workers=2, stdout=io.StringIO())
+        self.assertEqual(images.pending().count(), 0)
+        for product in products:
+            product.refresh_from_db()
+            self.assertTrue(product.get_image_url('medium').startswith('/media/products/derived/'))
+        # Identical pixels share derivative files
+        self.assertEqual(len({p.image_variants['thumb']['jpeg'] for p in products}), 1)
+
+    def test_loop_picks_up_uploads_and_skips_failures(self):
+        with override_settings(IMAGE_WORKERS=None), self.captureOnCommitCallbacks(execute=True):
+            product = self.create(image=self.upload())
+        # Left to the command: no pool in the web process
+        self.assertEqual(list(images.pending()), [product])
+        self.create(image=SimpleUploadedFile('broken.png', b'not an image'))
+
+        class Stop(Exception):
+            pass
+
+        sleeps = []
+
+        def sleep(seconds):
+            sleeps.append(seconds)
+            if len(sleeps) == 2:
+                raise Stop
+
+        clock = SimpleNamespace(sleep=sleep, perf_counter=time.perf_counter)
+        self.addCleanup(setattr, generate_image_derivatives, 'time', generate_image_derivatives.time)
+        generate_image_derivatives.time = clock
+        out = io.StringIO()
+        with self.assertRaises(Stop), self.assertLogs('FestivMartApp.images', 'WARNING') as logs:
+            call_command('generate_image_derivatives', loop=True, workers=1, stdout=out)
+        # The broken upload failed once and was not tried again
+        self.assertEqual(len(logs.output), 1)
+        self.assertEqual(out.getvalue().count('images processed in'), 1)
+        self.assertEqual([p.pk for p in images.pending()], [product.pk + 1])
+
+
+class ImageServer(ThreadingHTTPServer):
+    """Stand-in for a seller's image host: serves PNGs and counts requests."""
+
+    def __init__(self, delay=0):
+        super().__init__(('127.0.0.1', 0), ImageHandler)
+        self.delay = delay
+        self.hits = []
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    def url(self, path):
+        return f'http://127.0.0.1:{self.server_address[1]}{path}'
+
+
+class ImageHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.server.hits.append(self.path)
+        time.sleep(self.server.delay)
+        if self.path.startswith('/missing'):
+            self.send_error(404)
+            return
+        buffer = io.BytesIO()
+        Image.new('RGB', (1000, 500), 'purple').save(buffer, 'PNG')
+        self.send_response(200)
+        self.send_header('Content-Type', 'image/png')
+        self.send_header('Content-Length', str(buffer.tell()))
+        self.end_headers()
+        self.wfile.write(buffer.getvalue())
+
+    def log_message(self, *args):
+        pass
+
+
+class ImageProxyTests(FestivMartTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Home Decor')
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        proxy_settings = override_settings(IMAGE_PROXY_CACHE_DIR=directory, IMAGE_PROXY_ALLOW_PRIVATE=True)
+        proxy_settings.enable()
+        self.addCleanup(proxy_settings.disable)
+        image_proxy.lru.total = None
+        self.server = ImageServer()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+    def fetch(self, url):
+        response = self.client.get(url)
+        body = b''.join(response.streaming_content)
+        return response, Image.open(io.BytesIO(body)) if response.status_code == 200 else None
+
+    def test_fetches_once_and_serves_every_size(self):
+        product = Product.objects.create(name='Lamp', description='', price=10, category=self.category,
+                                         image_url=self.server.url('/lamp.png'))
+        response, image = self.fetch(product.get_image_url('thumb'))
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(image.size, (320, 160))
+
+        response, image = self.fetch(product.get_image_url('medium', 'webp'))
+        self.assertEqual((image.format, image.size), ('WEBP', (800, 400)))
+        self.fetch(product.get_image_url('thumb'))
+        self.assertEqual(self.server.hits, ['/lamp.png'])
+
+    def test_rejects_unsigned_urls(self):
+        url = image_proxy.proxy_url(self.server.url('/lamp.png'), 'thumb')
+        self.assertEqual(self.client.get(url.replace('/thumb.', '/huge.')).status_code, 404)
+        token = url.split('/')[2]
+        forged = url.replace(token, token[:-2] + ('aa' if not token.endswith('aa') else 'bb'))
+        self.assertEqual(self.client.get(forged).status_code, 404)
+        self.assertEqual(self.server.hits, [])
+
+    def test_private_hosts_refused_by_default(self):
+        with override_settings(IMAGE_PROXY_ALLOW_PRIVATE=False):
+            self.assertIsNone(image_proxy.get(self.server.url('/lamp.png'), 'thumb', 'jpg'))
+        self.assertEqual(self.server.hits, [])
+
+    def test_connects_to_the_vetted_address(self):
+        # The name does not resolve anywhere else: the fetch must use the address vetted_address() returned
+        resolved = []
+
+        def resolve(host, port):
+            resolved.append(host)
+            return ['127.0.0.1']
+        original, image_proxy._resolve = image_proxy._resolve, resolve
+        self.addCleanup(setattr, image_proxy, '_resolve', original)
+        url = self.server.url('/lamp.png').replace('127.0.0.1', 'images.festivmart.test')
+        self.assertIsNotNone(image_proxy.get(url, 'thumb', 'jpg'))
+        self.assertEqual((resolved, self.server.hits), (['images.festivmart.test'], ['/lamp.png']))
+
+        with override_settings(IMAGE_PROXY_ALLOW_PRIVATE=False):
+            self.assertIsNone(image_proxy.get(url.replace('lamp', 'other'), 'thumb', 'jpg'))
+        self.assertEqual(self.server.hits, ['/lamp.png'])
+
+    def test_evicted_before_open_is_fetched_again(self):
+        url = self.server.url('/lamp.png')
+        path = image_proxy.get(url, 'thumb', 'jpg')
+        found = []
+
+        def evicting_get(*args):
+            # Evicted by another worker between get() and open(), the first time
+            path = image_proxy.get(*args)
+            if not found:
+                os.remove(path)
+            found.append(path)
+            return path
+        with views._open_image(evicting_get, url, 'thumb', 'jpg') as image:
+            self.assertEqual(Image.open(image).size, (320, 160))
+        self.assertEqual(found, [path, path])
+        self.assertEqual(self.server.hits, ['/lamp.png', '/lamp.png'])
+
+    def test_concurrent_misses_fetch_once(self):
+        self.server.delay = 0.3
+        url = self.server.url('/slow.png')
+        paths = []
+        threads = [threading.Thread(target=lambda: paths.append(image_proxy.get(url, 'thumb', 'jpg')))
+                   for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(set(paths)), 1)
+        self.assertIsNotNone(paths[0])
+        self.assertEqual(self.server.hits, ['/slow.png'])
+
+    def test_evicts_least_recently_used(self):
+        def files():
+            return {e.name: os.path.getsize(e.path) for e in os.scandir(image_proxy.cache_dir())}
+
+        a, b, c = (self.server.url(f'/{name}.png') for name in 'abc')
+        image_proxy.get(a, 'thumb', 'jpg')
+        entry = sum(files().values())
+        bound = int(entry * 2.5)
+        with override_settings(IMAGE_PROXY_CACHE_BYTES=bound):
+            time.sleep(0.01)
+            b_thumb = os.path.basename(image_proxy.get(b, 'thumb', 'jpg'))
+            time.sleep(0.01)
+            a_thumb = os.path.basename(image_proxy.get(a, 'thumb', 'jpg'))  # hit: now the newest file
+            time.sleep(0.01)
+            image_proxy.get(c, 'thumb', 'jpg')
+            # a's other sizes were least recently used, then b's files
+            self.assertLessEqual(sum(files().values()), bound)
+            self.assertNotIn(a_thumb.replace('thumb', 'medium'), files())
+            self.assertIn(a_thumb, files())
+            self.assertIn(b_thumb, files())
+            image_proxy.get(a, 'thumb', 'jpg')
+        self.assertEqual(self.server.hits, ['/a.png', '/b.png', '/c.png'])
+
+    def test_failures_and_missing_images_use_placeholder(self):
+        product = Product.objects.create(name='Lamp', description='', price=10, category=self.category)
+        response, image = self.fetch(product.get_image_url('thumb'))
+        self.assertEqual(image.size, (320, 320))
+        self.assertTrue(product.get_image_url().startswith('/img/placeholder/'))
+
+        broken = image_proxy.proxy_url(self.server.url('/missing.png'), 'thumb')
+        response, image = self.fetch(broken)
+        self.assertEqual(response['Cache-Control'], 'public, max-age=300')
+        self.assertEqual(image.size, (320, 320))
+        self.fetch(broken)
+        self.assertEqual(self.server.hits, ['/missing.png'])
+
+
+class ProductImportTests(FestivMartTestCase):
+    CSV = (
+        'name,price,category,description,stock,discount_percent,is_seasonal,season,occasions\n'
+        'Brass Diya,120.50,Home & Living > Lighting,Hand polished,10,5,yes,Diwali,Diwali Night|Dhanteras\n'
+        'Marigold Garland,80,home & living > lighting,"Fresh,\nstrung daily",3,,true,,\n'
+        ',50,Gifts,No name,,,,,\n'
+        'Torans,abc,Gifts,,,,,,\n'
+        'Rangoli Kit,99.999,Gifts,,,,,,\n'
+        'Gift Hamper,1500,Gifts,,,150,,,\n'
+        'Lantern,300,Garden,,,,,,\n'
+        'Sweets Box,450,Gifts,,,,no,,Holi\n'
+        'Wall Hanging,250,Gifts,,2,10,false,,\n'
+    )
+
+    @classmethod
+    def setUpTestData(cls):
+        home = Category.objects.create(name='Home & Living')
+        cls.lighting = Category.objects.create(name='Lighting', parent=home)
+        Category.objects.create(name='Lighting')
+        cls.gifts = Category.objects.create(name='Gifts')
+        cls.season = Season.objects.create(name='Diwali', start_date=datetime.date(2026, 10, 1),
+                                           end_date=datetime.date(2026, 11, 15))
+        cls.night = Occasion.objects.create(name='Diwali Night', date=datetime.date(2026, 11, 8))
+        cls.dhanteras = Occasion.objects.create(name='Dhanteras', date=datetime.date(2026, 11, 6))
+        cls.seller = User.objects.create_user('meera', 'meera@example.com', 'pw')
+        UserProfile.objects.create(user=cls.seller, is_business=True)
+
+    def lines(self, text):
+        return io.BytesIO(text.encode()).readlines()
+
+    def test_csv_rows_validated_and_batched(self):
+        result = import_products(self.lines(self.CSV), seller=self.seller, batch_size=2)
+        self.assertEqual((result.rows, result.created, result.failed), (9, 3, 6))
+        # Physical line numbers: the quoted description spans lines 3-4
+        self.assertEqual([line for line, message in result.errors], [5, 6, 7, 8, 9, 10])
+        self.assertIn('Missing name', result.errors[0][1])
+        self.assertIn("Unknown occasion 'Holi'", result.errors[5][1])
+
+        diya = Product.objects.get(name='Brass Diya')
+        self.assertEqual((diya.price, diya.stock, diya.discount_percent, diya.season), (Decimal('120.50'), 10, 5, self.season))
+        self.assertEqual(set(diya.occasions.all()), {self.night, self.dhanteras})
+        self.assertEqual(Product.objects.get(name='Marigold Garland').description, 'Fresh,\nstrung daily')
+        self.assertEqual([p.name for p in search_products('garland')], ['Marigold Garland'])
+
+        profile = UserProfile.objects.get(user=self.seller)
+        self.assertEqual((profile.product_count, profile.seasonal_count), (3, 2))
+        self.assertEqual(profile.total_points, 3 * points.LISTING_POINTS + 2 * points.SEASONAL_POINTS)
+
+    def test_queries_per_batch_not_per_row(self):
+        def run(count, batch_size=50):
+            rows = ''.join(f'Item {i},10,Gifts,,,,,,Diwali Night\n' for i in range(count))
+            with CaptureQueriesContext(connection) as queries:
+                import_products(self.lines(self.CSV.splitlines(True)[0] + rows), batch_size=batch_size)
+            return len(queries)
+        self.assertEqual(run(5), run(50))
+        self.assertEqual(run(50, batch_size=10), 5 * run(10, batch_size=10) - 4 * run(0))
+        self.assertEqual(Product.occasions.through.objects.filter(occasion=self.night).count(), 115)
+
+    def test_jsonl_and_dry_run(self):
+        jsonl = (
+            '{"name": "Clay Lamp", "price": 40, "category": "Gifts", "occasions": ["Dhanteras"]}\n'
+            '\n'
+            '{"name": "Broken", \n'
+            '["not", "an", "object"]\n'
+        )
+        result = import_products(self.lines(jsonl), fmt='jsonl', dry_run=True)
+        self.assertEqual((result.rows, result.created, result.failed), (3, 0, 2))
+        self.assertFalse(Product.objects.exists())
+        result = import_products(self.lines(jsonl), fmt='jsonl')
+        self.assertEqual(result.created, 1)
+        self.assertEqual(list(Product.objects.get().occasions.all()), [self.dhanteras])
+
+    def test_upload_endpoint_and_command(self):
+        url = reverse('import_products_api')
+        self.client.force_login(self.seller)
+        upload = SimpleUploadedFile('catalog.csv', self.CSV.encode(), content_type='text/csv')
+        data = self.client.post(url, {'file': upload}).json()
+        self.assertEqual((data['created'], data['failed'], data['success']), (3, 6, False))
+        self.assertEqual(data['errors'][0]['line'], 5)
+
+        body = '{"name": "Clay Lamp", "price": 40, "category": "Gifts"}\n'
+        data = self.client.post(url, body, content_type='application/x-ndjson').json()
+        self.assertEqual((data['created'], data['success']), (1, True))
+        self.assertTrue(Product.objects.filter(name='Clay Lamp', seller=self.seller).exists())
+
+        shopper = User.objects.create_user('ravi', 'ravi@example.com', 'pw')
+        self.client.force_login(shopper)
+        self.assertEqual(self.client.post(url, body, content_type='application/x-ndjson').status_code, 403)
+
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as f:
+            f.write(self.CSV)
+        self.addCleanup(os.remove, f.name)
+        out, err = io.StringIO(), io.StringIO()
+        call_command('import_products', f.name, seller='meera', stdout=out, stderr=err)
+        self.assertIn('3 products created, 6 rows rejected', out.getvalue())
+        self.assertIn('line 5: Missing name', err.getvalue())
+
+
+class InstrumentationTests(FestivMartTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Lighting')
+        for i in range(3):
+            Product.objects.create(name=f'Lamp {i}', description='', price=100, category=category)
+
+    def test_off_by_default(self):
+        with self.assertNoLogs('FestivMartApp.instrumentation'):
+            response = self.client.get(reverse('shop'))
+        self.assertFalse(response.has_header('Server-Timing'))
+
+    @override_settings(INSTRUMENTATION_SAMPLE_RATE=1.0)
+    def test_server_timing_and_log_line(self):
+        with CaptureQueriesContext(connection) as ctx, self.assertLogs('FestivMartApp.instrumentation') as logs:
+            response = self.client.get(reverse('shop'))
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['view'], 'shop')
+        self.assertEqual(record['status'], 200)
+        self.assertEqual(record['queries'], len(ctx.captured_queries))
+        self.assertGreater(record['template_ms'], 0)
+        self.assertLessEqual(record['template_ms'], record['view_ms'])
+        self.assertLessEqual(record['view_ms'], record['total_ms'])
+        timing = response['Server-Timing']
+        self.assertRegex(timing, r'^total;dur=[\d.]+, view;dur=[\d.]+, db;dur=[\d.]+;desc="\d+ queries, \d+ duplicates", tpl;dur=[\d.]+$')
+        self.assertIn(f'desc="{record["queries"]} queries', timing)
+
+    @override_settings(INSTRUMENTATION_SAMPLE_RATE=1.0, INSTRUMENTATION_SERVER_TIMING=False)
+    def test_logs_without_header(self):
+        with self.assertLogs('FestivMartApp.instrumentation'):
+            response = self.client.get(reverse('shop'))
+        self.assertFalse(response.has_header('Server-Timing'))
+
+    def test_duplicate_detection(self):
+        profile = instrumentation.RequestProfile()
+        pks = list(Product.objects.values_list('pk', flat=True))
+        with connection.execute_wrapper(profile):
+            for pk in pks + pks[:1]:
+                Product.objects.get(pk=pk)
+            Category.objects.count()
+        similar, repeated, top = profile.duplicates()
+        self.assertEqual(len(profile.queries), 5)
+        self.assertEqual((similar, repeated), (3, 1))
+        self.assertEqual(top[0]['count'], 4)
+        self.assertIn('FestivMartApp_product', top[0]['sql'])
+
+
+class MetricsTests(FestivMartTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Festival Gifts')
+        cls.lamp = Product.objects.create(name='Brass Lamp', description='', price=900, category=category, stock=1)
+        cls.user = User.objects.create_user('ravi', 'ravi@example.com', 'pw')
+
+    # Counters are process-wide, so tests compare before and after
+    def value(self, name, **labels):
+        wanted = set(labels.items())
+        return sum(
+            value[-1] if isinstance(value, list) else value
+            for (metric, series), value in metrics.collect().items()
+            if metric == name and wanted <= {(k, str(v)) for k, v in series}
+        )
+
+    def counted(self, name, **labels):
+        before = self.value(name, **labels)
+        return lambda: self.value(name, **labels) - before
+
+    def test_shop_funnel_counters(self):
+        adds = self.counted('festivmart_cart_adds_total')
+        applied = self.counted('festivmart_coupon_applications_total', result='applied')
+        rejected = self.counted('festivmart_coupon_applications_total', result='rejected')
+        success = self.counted('festivmart_checkouts_total', result='success')
+        short = self.counted('festivmart_checkouts_total', result='insufficient_stock')
+        stock_outs = self.counted('festivmart_stock_out_rejections_total')
+
+        self.client.force_login(self.user)
+        post = functools.partial(self.client.post, content_type='application/json')
+        # Counted when the view's transaction commits
+        with self.captureOnCommitCallbacks(execute=True):
+            post(reverse('cart_add'), json.dumps({'product_id': self.lamp.pk, 'quantity': 2}))
+            post(reverse('cart_batch'), json.dumps({'operations': [{'op': 'add', 'product_id': self.lamp.pk}]}))
+            post(reverse('cart_apply_coupon'), json.dumps({'code': 'SAVE10'}))
+            post(reverse('cart_apply_coupon'), json.dumps({'code': 'NOPE'}))
+            self.client.post(reverse('checkout'), CheckoutTests.ADDRESS)
+            CartItem.objects.filter(cart__user=self.user).update(quantity=1)
+            self.client.post(reverse('checkout'), CheckoutTests.ADDRESS)
+
+        self.assertEqual((adds(), applied(), rejected()), (2, 1, 1))
+        self.assertEqual((success(), short(), stock_outs()), (1, 1, 1))
+
+    def test_request_latency_db_time_and_cache_reads(self):
+        requests = self.counted('festivmart_http_request_duration_seconds', view='product_detail_api')
+        queries = self.counted('festivmart_db_queries_total', view='product_detail_api')
+        hits = self.counted('festivmart_cache_requests_total', result='hit')
+        url = reverse('product_detail_api', args=(self.lamp.pk,))
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(url)
+        self.assertEqual(queries(), len(ctx.captured_queries))
+        self.client.get(url)
+        self.assertGreater(hits(), 0)
+        # Counted on this thread's cache instance, not by patching the backend class
+        self.assertFalse(hasattr(type(caches['default']).get, 'instrumented'))
+
+        with override_settings(METRICS_TOKEN='s3cret'):
+            response = self.client.get(reverse('metrics'), headers={'Authorization': 'Bearer s3cret'})
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        text = response.content.decode()
+        self.assertIn('# TYPE festivmart_http_request_duration_seconds histogram', text)
+        self.assertRegex(text, r'festivmart_http_request_duration_seconds_bucket\{view="product_detail_api",le="\+Inf"\} \d+')
+        self.assertRegex(text, r'festivmart_cache_hit_ratio 0\.\d+|festivmart_cache_hit_ratio 1\.0')
+        self.assertGreater(requests(), 0)
+
+    def test_threads_record_without_losing_counts(self):
+        before = self.value('festivmart_cart_adds_total', api='test')
+
+        def work():
+            for _ in range(1000):
+                metrics.inc('festivmart_cart_adds_total', api='test')
+
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.value('festivmart_cart_adds_total', api='test') - before, 4000)
+
+    def test_processes_share_a_directory(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        # What another worker process flushed
+        with open(os.path.join(directory, '1-1.json'), 'w') as f:
+            json.dump([['festivmart_checkouts_total', [['result', 'success']], 5]], f)
+        here = self.value('festivmart_checkouts_total', result='success')
+        with override_settings(METRICS_DIR=directory):
+            self.assertEqual(self.value('festivmart_checkouts_total', result='success'), here + 5)
+            metrics.inc('festivmart_checkouts_total', result='success')
+            self.assertEqual(self.value('festivmart_checkouts_total', result='success'), here + 6)
+            self.assertEqual(len(os.listdir(directory)), 2)
+            self.assertIn(f'festivmart_checkouts_total{{result="success"}} {here + 6}', metrics.render())
+
+    def test_token(self):
+        # Off until a token is configured
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 404)
+        with override_settings(METRICS_TOKEN='s3cret'):
+            self.assertEqual(self.client.get(reverse('metrics')).status_code, 401)
+            response = self.client.get(reverse('metrics'), headers={'Authorization': 'Bearer s3cret'})
+            self.assertEqual(response.status_code, 200)
+
+
+class QueryPlanTests(FestivMartTestCase):
+    def test_hot_queries_use_indexes(self):
+        for name, queryset in query_plans.hot_queries().items():
+            with self.subTest(query=name):
+                scans, plan = query_plans.full_scans(queryset)
+                self.assertEqual(scans, [], f'{name} scans {", ".join(scans)}:\n{plan}')
+                self.assertNotIn('TEMP B-TREE', plan, f'{name} sorts:\n{plan}')
+
+    def test_detects_full_scan(self):
+        scans, plan = query_plans.full_scans(Product.objects.filter(description='Brass'))
+        self.assertEqual(scans, ['FestivMartApp_product'])
+
+
+class SQLiteModeTests(FestivMartTestCase):
+    def pragmas(self):
+        path = os.path.join(tempfile.mkdtemp(), 'wal.sqlite3')
+        self.addCleanup(shutil.rmtree, os.path.dirname(path))
+        wrapper = DatabaseWrapper({**connection.settings_dict, 'NAME': path}, alias='wal-check')
+        try:
+            with wrapper.cursor() as cursor:
+                return tuple(cursor.execute(f'PRAGMA {name}').fetchone()[0]
+                             for name in ('journal_mode', 'synchronous', 'busy_timeout'))
+        finally:
+            wrapper.close()
+
+    def test_pragmas_on_new_connections(self):
+        # Off in development: SQLite's defaults and the driver's 5 s timeout
+        self.assertEqual(self.pragmas(), ('delete', 2, 5000))
+        with override_settings(SQLITE_PRODUCTION_MODE=True):
+            self.assertEqual(self.pragmas(), ('wal', 1, 5000))  # synchronous=NORMAL
+
+    def test_no_retry_inside_a_transaction(self):
+        calls = []
+
+        def locked():
+            calls.append(1)
+            raise OperationalError('database is locked')
+
+        # TestCase runs every test in a transaction a retry could not undo
+        with self.assertRaises(OperationalError):
+            database.run_with_retry(locked)
+        self.assertEqual(len(calls), 1)
+
+    @unittest.skipUnless(database.fcntl, "flock needs POSIX")
+    def test_write_gate_excludes_other_processes(self):
+        path = os.path.join(tempfile.mkdtemp(), 'db.sqlite3-writers')
+        self.addCleanup(shutil.rmtree, os.path.dirname(path))
+
+        def try_flock():
+            # Another open file, as another process would have
+            with open(path, 'a') as handle:
+                try:
+                    database.fcntl.flock(handle, database.fcntl.LOCK_EX | database.fcntl.LOCK_NB)
+                except BlockingIOError:
+                    return False
+                return True
+
+        with database._file_gate(path, 1):
+            self.assertFalse(try_flock())
+        self.assertTrue(try_flock())
+
+    @unittest.skipUnless(database.fcntl, "flock needs POSIX")
+    def test_write_gate_gives_up_as_a_lock(self):
+        path = os.path.join(tempfile.mkdtemp(), 'db.sqlite3-writers')
+        self.addCleanup(shutil.rmtree, os.path.dirname(path))
+        with open(path, 'a') as handle:
+            # Another process holds the gate
+            database.fcntl.flock(handle, database.fcntl.LOCK_EX)
+            with self.assertRaises(OperationalError) as raised:
+                with database._file_gate(path, 0.05):
+                    self.fail('passed a held gate')
+        self.assertTrue(database.is_locked(raised.exception))
+        # The thread lock was released on the way out
+        with database._file_gate(path, 0.05):
+            pass
+
+
+@override_settings(SQLITE_PRODUCTION_MODE=True, SQLITE_RETRY_BACKOFF=0)
+class SQLiteRetryTests(TransactionTestCase):
+    def test_retries_locked_writes(self):
+        category = Category.objects.create(name='Lighting')
+        attempts = []
+
+        def write():
+            Product.objects.create(name=f'Lamp {len(attempts)}', description='', price=10, category=category)
+            attempts.append(1)
+            if len(attempts) < 3:
+                raise OperationalError('database is locked')
+            return 'done'
+
+        self.assertEqual(database.run_with_retry(write), 'done')
+        # The failed attempts were rolled back
+        self.assertEqual(list(Product.objects.values_list('name', flat=True)), ['Lamp 2'])
+
+    def test_retried_writes_count_once(self):
+        attempts = []
+        key = ('festivmart_cart_adds_total', (('api', 'retry'),))
+        before = metrics.collect().get(key, 0)
+
+        def write():
+            metrics.inc_on_commit('festivmart_cart_adds_total', api='retry')
+            attempts.append(1)
+            if len(attempts) < 3:
+                raise OperationalError('database is locked')
+
+        database.run_with_retry(write)
+        self.assertEqual(metrics.collect().get(key, 0) - before, 1)
+
+    def test_development_mode_does_not_retry(self):
+        attempts = []
+
+        def fail():
+            attempts.append(1)
+            raise OperationalError('database is locked')
+
+        with override_settings(SQLITE_PRODUCTION_MODE=False), self.assertRaises(OperationalError):
+            database.run_with_retry(fail)
+        self.assertEqual(len(attempts), 1)
+
+    def test_gives_up_and_passes_other_errors_on(self):
+        attempts = []
+
+        def fail(message):
+            attempts.append(message)
+            raise OperationalError(message)
+
+        with override_settings(SQLITE_WRITE_RETRIES=2), self.assertRaises(OperationalError):
+            database.run_with_retry(lambda: fail('database is locked'))
+        with self.assertRaises(OperationalError):
+            database.run_with_retry(lambda: fail('no such table: x'))
+        self.assertEqual(attempts, ['database is locked'] * 3 + ['no such table: x'])
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class ReplicaTests(TransactionTestCase):
+    alias = 'replica_test'
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # A replica in a file of its own; a mirror of default to the test runner, so nothing flushes it
+        directory = tempfile.mkdtemp()
+        cls.addClassCleanup(shutil.rmtree, directory)
+        connections.settings[cls.alias] = {
+            **connections.settings['replica1'], 'NAME': os.path.join(directory, 'replica.sqlite3'),
+        }
+        cls.addClassCleanup(connections.settings.pop, cls.alias)
+        cls.addClassCleanup(connections.__delitem__, cls.alias)
+        cls.addClassCleanup(lambda: connections[cls.alias].close())
+        cls.databases = cls.databases | {cls.alias}
+
+    def setUp(self):
+        cache.clear()
+        replicas.stamp_path(self.alias).unlink(missing_ok=True)
+        replica_settings = override_settings(REPLICAS=[self.alias], REPLICA_MAX_LAG=60)
+        replica_settings.enable()
+        self.addCleanup(replica_settings.disable)
+        self.category = Category.objects.create(name='Lighting')
+        self.lamp = Product.objects.create(name='Lamp', description='', price=10, category=self.category, stock=5)
+
+    def replica_queries(self, fn):
+        queries = []
+
+        def record(execute, sql, params, many, context):
+            queries.append(sql)
+            return execute(sql, params, many, context)
+
+        with connections[self.alias].execute_wrapper(record):
+            fn()
+        return queries
+
+    def test_catalog_reads_go_to_a_fresh_replica(self):
+        # Never refreshed
+        self.assertEqual(router.db_for_read(Product), 'default')
+        replicas.refresh(self.alias)
+        self.assertEqual(router.db_for_read(Product), self.alias)
+        self.assertEqual(router.db_for_read(Cart), 'default')
+        self.assertEqual(router.db_for_write(Product), 'default')
+        with transaction.atomic(), replicas.primary_reads():
+            self.assertEqual(router.db_for_read(Product), 'default')
+        with replicas.primary_reads():
+            self.assertEqual(router.db_for_read(Product), 'default')
+        with override_settings(REPLICA_MAX_LAG=0):
+            self.assertEqual(router.db_for_read(Product), 'default')
+        with self.assertRaisesMessage(OperationalError, 'readonly'):
+            Product.objects.using(self.alias).update(stock=0)
+
+    def test_refresh_keeps_open_readers_on_their_snapshot(self):
+        replicas.refresh(self.alias)
+        reader = connections[self.alias]
+        Product.objects.create(name='Lantern', description='', price=12, category=self.category)
+        with transaction.atomic(using=self.alias):
+            self.assertEqual(list(Product.objects.values_list('name', flat=True)), ['Lamp'])
+            replicas.refresh(self.alias)
+            self.assertEqual(list(Product.objects.values_list('name', flat=True)), ['Lamp'])
+        self.assertFalse(reader.in_atomic_block)
+        self.assertEqual(sorted(Product.objects.values_list('name', flat=True)), ['Lamp', 'Lantern'])
+
+    def test_writes_pin_the_client_to_the_primary(self):
+        replicas.refresh(self.alias)
+        self.assertTrue(self.replica_queries(lambda: self.client.get(reverse('catalog_api'))))
+
+        response = self.client.post(reverse('cart_add'), json.dumps({'product_id': self.lamp.pk, 'quantity': 1}),
+                                    content_type='application/json')
+        self.assertEqual(response.cookies[replicas.PIN_COOKIE]['max-age'], 60)
+        self.assertEqual(self.replica_queries(lambda: self.client.get(reverse('catalog_api'))), [])
+        self.client.cookies.pop(replicas.PIN_COOKIE)
+        # The cart reads the primary even without the cookie
+        self.assertEqual(self.replica_queries(lambda: self.client.get(reverse('cart'))), [])
+        self.assertTrue(self.replica_queries(lambda: self.client.get(reverse('catalog_api'))))
+
+
+class QueryBudgetTests(FestivMartTestCase):
+    """
+    Every route of FestivMartApp.urls, anonymous and logged in, against a
+    medium fixture from seed_data's generator: each request must stay
+    within its query budget and wall-time budget. Queries are counted on a
+    warm cache (after one identical request), so a budget is what a
+    shopper pays in the steady state. A route over budget fails with its
+    queries grouped by shape, repeated shapes (an N+1) first.
+    """
+    # Generous: meant to catch order-of-magnitude slowdowns, not noise
+    DEFAULT_MS = 250
+
+    # (url name, variant) -> max queries; routes not listed must not query at all
+    BUDGETS = {
+        ('home', 'anonymous'): 9,
+        ('home', 'shopper'): 11,
+        ('seasonal', 'anonymous'): 1,
+        ('seasonal', 'shopper'): 3,
+        ('dashboard', 'shopper'): 3,
+        ('dashboard', 'seller'): 3,
+        ('shop', 'anonymous'): 1,
+        ('shop', 'shopper'): 3,
+        ('cart', 'shopper'): 4,
+        ('checkout', 'shopper'): 4,
+        ('logout', 'shopper'): 4,
+        ('score', 'shopper'): 3,
+        ('score', 'seller'): 3,
+        ('add_product', 'seller'): 3,
+        ('catalog_api', 'anonymous'): 1,
+        ('import_products_api', 'seller'): 14,
+        ('search_api', 'anonymous'): 2,
+        ('leaderboard_api', 'anonymous'): 2,
+        ('leaderboard_api', 'shopper'): 9,
+        # Writes run in one transaction (SAVEPOINT and RELEASE here); a first
+        # write from an anonymous visitor also creates its session and cart
+        ('cart_add', 'anonymous'): 17,
+        ('cart_add', 'shopper'): 9,
+        ('cart_update', 'shopper'): 8,
+        ('cart_remove', 'shopper'): 8,
+        ('cart_batch', 'anonymous'): 19,
+        ('cart_batch', 'shopper'): 10,
+        ('cart_apply_coupon', 'anonymous'): 15,
+        ('cart_apply_coupon', 'shopper'): 7,
+        ('cart_data', 'shopper'): 4,
+        ('order_success', 'shopper'): 4,
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        import seed_data
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            seed_data.create_initial_data()
+            seed_data.generate(products=600, users=60, orders=300, carts=12, seed=11)
+        profiles = UserProfile.objects.filter(user__email__endswith='@example.com').select_related('user')
+        cls.shopper = profiles.filter(is_business=False, user__orders__isnull=False).first().user
+        cls.seller = profiles.filter(is_business=True).first().user
+        cls.product = Product.objects.filter(available=True, stock__gt=10).order_by('-pk').first()
+        cls.order = cls.shopper.orders.first()
+
+    def setUp(self):
+        super().setUp()
+        cart, _ = Cart.objects.get_or_create(user=self.shopper)
+        for product in Product.objects.filter(available=True, stock__gt=10)[:3]:
+            CartItem.objects.get_or_create(cart=cart, product=product, defaults={'quantity': 1})
+
+    def routes(self):
+        """(url name, variant, method, path, body, expected status); variants log in as they say."""
+        product = self.product.pk
+        detail = reverse('product_detail_api', args=(product,))
+        item = lambda: CartItem.objects.filter(cart__user=self.shopper).values_list('pk', flat=True).first()  # noqa: E731
+        import_line = json.dumps({'name': 'Budget Lamp', 'price': 99, 'category': Category.objects.filter(
+            subcategories__isnull=True).first().breadcrumb}) + '\n'
+        return [
+            ('home', 'anonymous', 'get', reverse('home'), None, 200),
+            ('home', 'shopper', 'get', reverse('home'), None, 200),
+            ('seasonal', 'anonymous', 'get', reverse('seasonal'), None, 200),
+            ('seasonal', 'shopper', 'get', reverse('seasonal'), None, 200),
+            ('dashboard', 'anonymous', 'get', reverse('dashboard'), None, 302),
+            ('dashboard', 'shopper', 'get', reverse('dashboard'), None, 200),
+            ('dashboard', 'seller', 'get', reverse('dashboard'), None, 200),
+            ('shop', 'anonymous', 'get', reverse('shop'), None, 200),
+            ('shop', 'shopper', 'get', reverse('shop') + '?seasonal=1&sort=price-low', None, 200),
+            ('cart', 'anonymous', 'get', reverse('cart'), None, 200),
+            ('cart', 'shopper', 'get', reverse('cart'), None, 200),
+            ('checkout', 'anonymous', 'get', reverse('checkout'), None, 302),
+            ('checkout', 'shopper', 'get', reverse('checkout'), None, 200),
+            ('login', 'anonymous', 'get', reverse('login'), None, 200),
+            ('logout', 'shopper', 'get', reverse('logout'), None, 302),
+            ('signup', 'anonymous', 'get', reverse('signup'), None, 200),
+            ('score', 'shopper', 'get', reverse('score'), None, 200),
+            ('score', 'seller', 'get', reverse('score'), None, 200),
+            ('add_product', 'seller', 'get', reverse('add_product'), None, 200),
+            ('catalog_api', 'anonymous', 'get', reverse('catalog_api') + '?sort=price-high', None, 200),
+            ('import_products_api', 'seller', 'post', reverse('import_products_api'), import_line, 200),
+            ('search_api', 'anonymous', 'get', reverse('search_api') + '?q=lamp', None, 200),
+            ('year_dates_api', 'anonymous', 'get', reverse('year_dates_api'), None, 200),
+            ('product_detail_api', 'anonymous', 'get', detail, None, 200),
+            ('leaderboard_api', 'anonymous', 'get', reverse('leaderboard_api'), None, 200),
+            ('leaderboard_api', 'shopper', 'get', reverse('leaderboard_api'), None, 200),
+            ('image_placeholder', 'anonymous', 'get', reverse('image_placeholder', args=('thumb', 'webp')), None, 200),
+            ('image_proxy', 'anonymous', 'get', image_proxy.proxy_url('http://images.invalid/a.jpg', 'thumb'), None, 200),
+            ('cart_add', 'anonymous', 'post', reverse('cart_add'), {'product_id': product}, 200),
+            ('cart_add', 'shopper', 'post', reverse('cart_add'), {'product_id': product}, 200),
+            ('cart_update', 'shopper', 'post', reverse('cart_update'), lambda: {'item_id': item(), 'quantity': 2}, 200),
+            ('cart_remove', 'shopper', 'post', reverse('cart_remove'), lambda: {'item_id': item()}, 200),
+            ('cart_batch', 'anonymous', 'post', reverse('cart_batch'),
+             {'operations': [{'op': 'add', 'product_id': product}, {'op': 'set', 'product_id': product, 'quantity': 3}]}, 200),
+            ('cart_batch', 'shopper', 'post', reverse('cart_batch'),
+             {'operations': [{'op': 'add', 'product_id': product}, {'op': 'set', 'product_id': product, 'quantity': 3}]}, 200),
+            ('cart_apply_coupon', 'anonymous', 'post', reverse('cart_apply_coupon'), {'code': 'SAVE10'}, 200),
+            ('cart_apply_coupon', 'shopper', 'post', reverse('cart_apply_coupon'), {'code': 'SAVE10'}, 200),
+            ('cart_data', 'anonymous', 'get', reverse('cart_data'), None, 200),
+            ('cart_data', 'shopper', 'get', reverse('cart_data'), None, 200),
+            ('order_success', 'shopper', 'get', reverse('order_success', args=(self.order.order_number,)), None, 200),
+            ('metrics', 'anonymous', 'get', reverse('metrics'), None, 404),
+        ]
+
+    def request(self, method, path, body):
+        body = body() if callable(body) else body
+        if method == 'get':
+            return self.client.get(path)
+        if isinstance(body, str):
+            return self.client.post(path, body, content_type='application/x-ndjson')
+        return self.client.post(path, json.dumps(body), content_type='application/json')
+
+    @staticmethod
+    def explain(queries, budget):
+        shapes = Counter(q['sql'] for q in queries)
+        lines = [f'{len(queries)} queries, budget {budget} (+{len(queries) - budget}):']
+        for sql, count in sorted(shapes.items(), key=lambda s: -s[1]):
+            lines.append(f"  {'!' if count > 1 else ' '} x{count}  {sql[:400]}")
+        return '\n'.join(lines)
+
+    def test_routes_stay_within_budget(self):
+        # The image proxy answers a known-dead URL with the placeholder, without fetching
+        cache_key = image_proxy._failure_key(image_proxy._key('http://images.invalid/a.jpg'))
+        users = {'shopper': self.shopper, 'seller': self.seller}
+        routes = self.routes()
+        covered = {name for name, *_ in routes}
+        self.assertEqual(covered, {p.name for p in get_resolver('FestivMartApp.urls').url_patterns})
+        for name, variant, method, path, body, status in routes:
+            with self.subTest(route=name, variant=variant):
+                cache.clear()
+                cache.set(cache_key, True)
+                self.client.logout()
+                if variant in users:
+                    self.client.force_login(users[variant])
+                if method == 'get':
+                    self.request(method, path, body)
+                    if name == 'logout':
+                        self.client.force_login(users[variant])
+                budget, max_ms = self.BUDGETS.get((name, variant), 0), self.DEFAULT_MS
+                start = time.perf_counter()
+                with CaptureQueriesContext(connection) as ctx:
+                    response = self.request(method, path, body)
+                elapsed = (time.perf_counter() - start) * 1000
+                self.assertEqual(response.status_code, status)
+                queries = ctx.captured_queries
+                self.assertLessEqual(len(queries), budget, self.explain(queries, budget))
+                self.assertLessEqual(elapsed, max_ms, f'{elapsed:.0f} ms, budget {max_ms} ms')
+
+
+class SeedDataTests(FestivMartTestCase):
+    def generate(self, **sizes):
+        import seed_data
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            seed_data.create_initial_data()
+            seed_data.generate(seed=3, today=datetime.date(2026, 10, 17), batch_size=40, **sizes)
+        return seed_data
+
+    def test_generates_a_consistent_shop(self):
+        self.generate(products=300, users=60, orders=120, carts=20)
+        self.assertEqual(Product.objects.count(), 305)
+        self.assertEqual(User.objects.count(), 61)
+        self.assertEqual(UserProfile.objects.count(), 61)
+        self.assertEqual(Cart.objects.count(), 20)
+        self.assertEqual(Order.objects.count(), 120)
+        self.assertTrue(User.objects.get(username__endswith='60').check_password('password'))
+
+        for order in Order.objects.prefetch_related('items__product').order_by('pk')[:20]:
+            _, worker, _ = order_numbers.decode(order.order_number)
+            self.assertEqual(worker, order_numbers.MAX_WORKER)
+            subtotal = sum(item.line_total for item in order.items.all())
+            self.assertEqual(order.subtotal, subtotal)
+            for item in order.items.all():
+                self.assertEqual(item.unit_price, item.product.discounted_price.quantize(Decimal('0.01')))
+        seasonal = Product.objects.filter(is_seasonal=True, pk__gt=5)
+        self.assertTrue(seasonal.exists())
+        self.assertFalse(seasonal.filter(season__isnull=True).exists())
+        self.assertEqual(
+            UserProfile.objects.get(user=Order.objects.first().user).order_count,
+            Order.objects.filter(user=Order.objects.first().user).count(),
+        )
+
+    def test_chunks_depend_only_on_the_seed(self):
+        seed_data = self.generate()
+        plan = seed_data._plan_for(100, 20, 50, 10, 3, datetime.date(2026, 10, 17), 'password')
+        seed_data._init_worker(plan)
+        for task in [('users', 0, plan['users'][0], 20), ('products', 1, plan['products'][0], 50),
+                     ('orders', 0, plan['orders'][0], 50)]:
+            self.assertEqual(seed_data._generate(task), seed_data._generate(task))
+        task = ('products', 0, plan['products'][0], 50)
+        rows = seed_data._generate(task)
+        seed_data._init_worker(dict(plan, seed=4))
+        self.assertNotEqual(seed_data._generate(task), rows)
+
+    def test_order_numbers_are_unique_across_runs(self):
+        seed_data = self.generate(products=30, users=20, orders=128)
+        self.generate(orders=128)
+        numbers = list(Order.objects.values_list('order_number', flat=True))
+        self.assertEqual(len(set(numbers)), 256)
+
+        # 128 orders a millisecond at most
+        plan = seed_data._plan_for(0, 0, 256, 0, 3, datetime.date(2026, 10, 17), 'password')
+        seed_data._init_worker(dict(plan, order_window=(0, 2)))
+        rows = seed_data._generate(('orders', 0, plan['orders'][0], 256))[1]['orders']
+        self.assertEqual(len({row[2] for row in rows}), 256)
+        # No room on the epoch day itself
+        with self.assertRaises(ValueError):
+            seed_data._plan_for(0, 0, 1, 0, 3, datetime.date(2026, 1, 1), 'password')
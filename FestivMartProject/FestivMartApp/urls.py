@@ -13,17 +13,26 @@ urlpatterns = [
     path('signup/', views.signup_view, name='signup'),
     path('score/', views.score_view, name='score'),
     path('add-product/', views.add_product, name='add_product'),
+    path('api/products/', views.catalog_api, name='catalog_api'),
+    path('api/products/import/', views.import_products_api, name='import_products_api'),
+    path('api/search/', views.search_api, name='search_api'),
     path('api/dates/', views.year_dates_api, name='year_dates_api'),
     path('api/product/<int:product_id>/', views.product_detail_api, name='product_detail_api'),
+    path('api/leaderboard/', views.leaderboard_api, name='leaderboard_api'),
+    path('img/placeholder/<str:size>.<str:ext>', views.image_placeholder, name='image_placeholder'),
+    path('img/<str:token>/<str:size>.<str:ext>', views.image_proxy_view, name='image_proxy'),
     
     # Cart API endpoints
     path('api/cart/add/', views.cart_add, name='cart_add'),
     path('api/cart/update/', views.cart_update, name='cart_update'),
     path('api/cart/remove/', views.cart_remove, name='cart_remove'),
+    path('api/cart/batch/', views.cart_batch, name='cart_batch'),
     path('api/cart/coupon/', views.cart_apply_coupon, name='cart_apply_coupon'),
     path('api/cart/data/', views.cart_data, name='cart_data'),
     
     # Order
     path('order/success/<str:order_number>/', views.order_success, name='order_success'),
+
+    path('metrics/', views.metrics_view, name='metrics'),
 ]
 
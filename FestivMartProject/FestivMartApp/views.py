@@ -1,13 +1,27 @@
 from django.shortcuts import render, redirect, get_object_or_404
-from django.http import JsonResponse
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified, JsonResponse
 from .models import Product, Season, Occasion, Category, UserProfile, Cart, CartItem, Order, OrderItem
+from .catalog import CatalogQuery, InvalidCursor, serialize_product
+from .categories import get_category_tree
+from .search import load_products, search_product_ids
+from . import festival_calendar, image_proxy, leaderboard, merchandising, metrics, points, product_detail
+from .cart_ops import CartOperationError, apply_cart_operations, parse_operations
+from .checkout import EmptyCart, InsufficientStock, place_order
+from .database import retry_locked
+from .replicas import primary_reads
+from .product_import import FORMATS as IMPORT_FORMATS, detect_format, import_products
+from .queries import featured_products, seller_products, session_cart, users_by_email
+from django.conf import settings
 from django.utils import timezone
-from django.db.models import Q
+from django.utils.crypto import constant_time_compare
+from django.utils.http import http_date, parse_etags, parse_http_date_safe
+from django.db.models import F, Q
 from django.contrib.auth.models import User
 from django.contrib.auth import login, authenticate, logout
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.http import require_POST
 from django.views.decorators.csrf import csrf_exempt
+from urllib.parse import urlencode
 import datetime
 import json
 
@@ -15,49 +29,23 @@ import json
 
 def landing(request):
     """Render the main landing page (Regular mode)."""
-    # Fetch featured products or just all products for now
-    featured_products = Product.objects.filter(available=True)[:8]
     context = {
-        'products': featured_products,
+        'products': featured_products(),
         'mode': 'regular'
     }
     return render(request, 'FestivMartApp/landing.html', context)
 
 def seasonal_mart(request):
-    """Render the seasonal shopping page."""
-    today = timezone.now().date()
-    
-    # Active Seasons
-    active_seasons = Season.objects.filter(start_date__lte=today, end_date__gte=today)
-    
-    # Active/Upcoming Occasions (next 60 days)
-    upcoming_occasions = Occasion.objects.filter(date__gte=today, date__lte=today + datetime.timedelta(days=60))
-    
-    # Get categories for filtering
-    categories = Category.objects.all()
-
-    # Get seasonal products
-    products = Product.objects.filter(is_seasonal=True, available=True)
-    
-    # If we have active seasons or upcoming occasions, filter by them
-    if active_seasons.exists() or upcoming_occasions.exists():
-        products = products.filter(
-            Q(season__in=active_seasons) | Q(occasions__in=upcoming_occasions)
-        ).distinct()
-    
-    # If no products match, show all available seasonal products
-    if not products.exists():
-        products = Product.objects.filter(is_seasonal=True, available=True)[:12]
-    
-    # If still no products, show latest available products
-    if not products.exists():
-        products = Product.objects.filter(available=True).order_by('-id')[:12]
+    """Render the seasonal shopping page from today's merchandising snapshot."""
+    snapshot = merchandising.get_snapshot()
+    products = Product.objects.select_related('category').in_bulk(snapshot['product_ids'])
 
     context = {
-        'products': products,
-        'seasons': active_seasons,
-        'occasions': upcoming_occasions,
-        'categories': categories,
+        'products': [products[pk] for pk in snapshot['product_ids'] if pk in products],
+        'seasons': snapshot['seasons'],
+        'occasions': snapshot['occasions'],
+        # Top-level categories for the filter tabs
+        'categories': get_category_tree().roots,
         'mode': 'seasonal'
     }
     return render(request, 'FestivMartApp/seasonal-mart.html', context)
@@ -66,61 +54,70 @@ def seasonal_mart(request):
 def dashboard(request):
     """Render the user dashboard with shopping insights."""
     user = request.user
-    is_business = False
-    my_products = []
-    
-    if hasattr(user, 'profile') and user.profile.is_business:
-        is_business = True
-        my_products = Product.objects.filter(seller=user)
-        
-    # Calculate stats for the score cards
-    today = timezone.now()
-    member_since = user.date_joined
-    account_age_days = (today - member_since).days
-    
-    total_products = my_products.count() if is_business else 0
-    seasonal_products = my_products.filter(is_seasonal=True).count() if is_business else 0
-    
-    # Points logic (consistent with score_view)
-    points = (account_age_days * 5) + (total_products * 50) + (seasonal_products * 20)
-    level = (points // 500) + 1
-    next_level_points = (level * 500) - points
-    progress_percentage = (points % 500) / 500 * 100
-    
-    # For the CIBIL style gauge in score.html (0-900 scale)
-    # We can map our points to 900
-    gauge_score = min(740 + (points // 10), 900) # Start from 740 for demo feel or scale differently
-    
+    profile = UserProfile.objects.filter(user=user).first()
+    is_business = bool(profile and profile.is_business)
+    my_products = seller_products(user.pk) if is_business else []
+
     context = {
         'is_business': is_business,
         'my_products': my_products,
-        'stats': {
-            'member_since': member_since.strftime('%B %Y'),
-            'account_age_days': account_age_days,
-            'total_products': total_products,
-            'seasonal_products': seasonal_products,
-            'total_orders': 0,
-        },
-        'score_data': {
-            'points': points,
-            'gauge_score': gauge_score,
-            'level': level,
-            'next_level_points': next_level_points,
-            'progress_percentage': progress_percentage,
-        }
+        'stats': profile_stats(user, profile),
+        'score_data': points.score_data(profile, user),
     }
     return render(request, 'FestivMartApp/dashboard.html', context)
 
+
+def profile_stats(user, profile):
+    """Score card figures, read from the points ledger's profile counters."""
+    return {
+        'member_since': user.date_joined.strftime('%B %Y'),
+        'account_age_days': points.account_age(user),
+        'total_products': profile.product_count if profile else 0,
+        'seasonal_products': profile.seasonal_count if profile else 0,
+        'total_orders': profile.order_count if profile else 0,
+    }
+
 def shop(request):
-    """Render the full shop page."""
-    products = Product.objects.filter(available=True)
-    categories = Category.objects.all()
+    """Render one page of the shop catalog, filtered and sorted server-side."""
+    query = CatalogQuery.from_params(request.GET)
+    cursor = request.GET.get('cursor')
+    try:
+        page = query.page(cursor)
+    except InvalidCursor:
+        cursor = None
+        page = query.page()
+
+    params = query.to_params()
+    next_url = None
+    if page.has_next:
+        next_url = '?' + urlencode(params + [('cursor', page.next_cursor)])
+
     context = {
-        'products': products,
-        'categories': categories
+        'products': page.products,
+        'categories': get_category_tree().roots,
+        'query': query,
+        'selected_categories': query.categories,
+        'next_url': next_url,
+        'first_url': '?' + urlencode(params) if cursor else None,
     }
     return render(request, 'FestivMartApp/shop.html', context)
 
+
+def catalog_api(request):
+    """API for the paginated catalog; accepts the same filters as the shop page."""
+    query = CatalogQuery.from_params(request.GET)
+    try:
+        page = query.page(request.GET.get('cursor'))
+    except InvalidCursor:
+        return JsonResponse({'success': False, 'error': 'Invalid cursor'}, status=400)
+
+    return JsonResponse({
+        'success': True,
+        'products': [serialize_product(p) for p in page.products],
+        'next_cursor': page.next_cursor,
+        'has_next': page.has_next,
+    })
+
 @login_required
 def add_product(request):
     """View for sellers to add new products."""
@@ -165,12 +162,53 @@ def add_product(request):
         # Handle seasons/occasions if seasonal logic needed here
         return redirect('dashboard')
         
-    categories = Category.objects.all()
-    return render(request, 'FestivMartApp/add_product.html', {'categories': categories})
+    return render(request, 'FestivMartApp/add_product.html', {'categories': get_category_tree()})
+
+
+@login_required
+@require_POST
+def import_products_api(request):
+    """
+    API for sellers to bulk-import products: a multipart `file` upload, or
+    the CSV/JSONL itself as the request body (?format=jsonl). Streams the
+    rows, so the file size is bounded only by the upload handlers.
+    """
+    if not hasattr(request.user, 'profile') or not request.user.profile.is_business:
+        return JsonResponse({'success': False, 'error': 'Seller account required'}, status=403)
+
+    upload = request.FILES.get('file')
+    if upload is not None:
+        lines, default = upload, detect_format(upload.name)
+    else:
+        lines = request
+        default = 'jsonl' if 'json' in request.content_type else 'csv'
+    fmt = request.GET.get('format') or request.POST.get('format') or default
+    if fmt not in IMPORT_FORMATS:
+        return JsonResponse({'success': False, 'error': 'format must be csv or jsonl'}, status=400)
+
+    result = import_products(lines, seller=request.user, fmt=fmt)
+    return JsonResponse({'success': result.failed == 0, **result.as_dict(max_errors=100)})
+
+
+def get_cart(request):
+    """
+    Helper function to get the current user/session's cart for reading.
+
+    Never writes: visitors without a cart get an unsaved, empty Cart, so
+    crawlers and first-time visitors cost no session or cart rows.
+    """
+    if request.user.is_authenticated:
+        return Cart.objects.filter(user=request.user).first() or Cart(user=request.user)
+    session_key = request.session.session_key
+    if session_key:
+        cart = session_cart(session_key).first()
+        if cart:
+            return cart
+    return Cart(session_key=session_key)
 
 
 def get_or_create_cart(request):
-    """Helper function to get or create a cart for the current user/session."""
+    """Helper function to get or create a cart for the current user/session (for mutations)."""
     if request.user.is_authenticated:
         cart, created = Cart.objects.get_or_create(user=request.user)
     else:
@@ -182,25 +220,38 @@ def get_or_create_cart(request):
     return cart
 
 
+def login_and_merge_cart(request, user):
+    """Log the user in, carrying over the cart they built while anonymous."""
+    # login() rotates the session key, so look the anonymous cart up first
+    anonymous_cart = None if request.user.is_authenticated else get_cart(request)
+    login(request, user)
+    if anonymous_cart is not None and anonymous_cart.pk:
+        anonymous_cart.merge_into(user)
+
+
+@primary_reads()
 def cart(request):
     """Render the cart page with items from database."""
-    cart_obj = get_or_create_cart(request)
-    cart_items = cart_obj.items.select_related('product').all()
+    cart_obj = get_cart(request)
+    totals = cart_obj.get_totals()
     
     context = {
         'cart': cart_obj,
-        'cart_items': cart_items,
+        'cart_items': totals.items,
+        'totals': totals,
     }
     return render(request, 'FestivMartApp/cart.html', context)
 
 
 @login_required
+@primary_reads()
+@retry_locked
 def checkout(request):
     """Handle checkout and order creation."""
-    cart_obj = get_or_create_cart(request)
-    cart_items = cart_obj.items.select_related('product').all()
+    cart_obj = get_cart(request)
+    totals = cart_obj.get_totals()
     
-    if not cart_items.exists():
+    if totals.is_empty:
         return redirect('cart')
     
     if request.method == 'POST':
@@ -213,47 +264,38 @@ def checkout(request):
         postal_code = request.POST.get('postal_code')
         payment_method = request.POST.get('payment_method', 'cod')
         
-        # Create order
-        order = Order.objects.create(
-            user=request.user,
-            full_name=full_name,
-            email=email,
-            phone=phone,
-            address=address,
-            city=city,
-            postal_code=postal_code,
-            subtotal=cart_obj.subtotal,
-            discount_amount=cart_obj.discount_amount,
-            tax_amount=cart_obj.tax_amount,
-            shipping_cost=cart_obj.shipping_cost,
-            total=cart_obj.total,
-            coupon_code=cart_obj.coupon_code,
-            payment_method=payment_method,
-        )
-        
-        # Create order items
-        for item in cart_items:
-            OrderItem.objects.create(
-                order=order,
-                product=item.product,
-                product_name=item.product.name,
-                quantity=item.quantity,
-                unit_price=item.unit_price,
-                line_total=item.line_total,
+        try:
+            order = place_order(
+                cart_obj,
+                request.user,
+                full_name=full_name,
+                email=email,
+                phone=phone,
+                address=address,
+                city=city,
+                postal_code=postal_code,
+                payment_method=payment_method,
             )
-            # Reduce stock
-            item.product.stock -= item.quantity
-            item.product.save()
-        
-        # Clear the cart
-        cart_obj.clear()
-        
-        # Redirect to success page
-        return redirect('order_success', order_number=order.order_number)
+        except EmptyCart:
+            metrics.inc_on_commit('festivmart_checkouts_total', result='empty_cart')
+            return redirect('cart')
+        except InsufficientStock as exc:
+            metrics.inc_on_commit('festivmart_checkouts_total', result='insufficient_stock')
+            metrics.inc_on_commit('festivmart_stock_out_rejections_total', len(exc.shortages))
+            error = str(exc)
+            totals = cart_obj.get_totals()
+        else:
+            metrics.inc_on_commit('festivmart_checkouts_total', result='success')
+            # Redirect to success page
+            return redirect('order_success', order_number=order.order_number)
+    else:
+        error = None
     
     context = {
         'cart': cart_obj,
-        'cart_items': cart_items,
+        'cart_items': totals.items,
+        'totals': totals,
+        'error': error,
     }
     return render(request, 'FestivMartApp/checkout.html', context)
 
@@ -269,7 +311,7 @@ def login_view(request):
         # In this project, we might be using email as username or just username.
         # Let's check if the user exists with this email
         try:
-            user_obj = User.objects.get(email=email)
+            user_obj = users_by_email(email).get()
             username = user_obj.username
         except User.DoesNotExist:
             username = email # Fallback to using email as username
@@ -277,7 +319,7 @@ def login_view(request):
         user = authenticate(request, username=username, password=password)
         
         if user is not None:
-            login(request, user)
+            login_and_merge_cart(request, user)
             return redirect('dashboard')
         else:
             return render(request, 'FestivMartApp/login.html', {'error': 'Invalid credentials'})
@@ -335,7 +377,7 @@ def signup_view(request):
             }
         )
         
-        login(request, user)
+        login_and_merge_cart(request, user)
         return redirect('dashboard')
         
     return render(request, 'FestivMartApp/signup.html')
@@ -345,118 +387,153 @@ def signup_view(request):
 def score_view(request):
     """View to display user's activity score and statistics."""
     user = request.user
-    is_business = False
-    if hasattr(user, 'profile'):
-        is_business = user.profile.is_business
-    
-    # Calculate stats
-    today = timezone.now()
-    member_since = user.date_joined
-    account_age_days = (today - member_since).days
-    
-    total_products = 0
-    seasonal_products = 0
-    if is_business:
-        my_products = Product.objects.filter(seller=user)
-        total_products = my_products.count()
-        seasonal_products = my_products.filter(is_seasonal=True).count()
-    
-    # Points logic (Simplified for demo)
-    points = (account_age_days * 5) + (total_products * 50) + (seasonal_products * 20)
-    level = (points // 500) + 1
-    next_level_points = (level * 500) - points
-    progress_percentage = (points % 500) / 500 * 100
-    
-    badges = []
-    if account_age_days > 7:
-        badges.append({'name': 'Early Adopter', 'icon': '🌟', 'color': '#FF6B35'})
-    if total_products > 0:
-        badges.append({'name': 'First Listing', 'icon': '📦', 'color': '#7C3AED'})
-    if total_products >= 5:
-        badges.append({'name': 'Pro Seller', 'icon': '🚀', 'color': '#FBBF24'})
-        
+    profile = UserProfile.objects.filter(user=user).first()
+
     context = {
-        'is_business': is_business,
-        'stats': {
-            'member_since': member_since.strftime('%B %Y'),
-            'account_age_days': account_age_days,
-            'total_products': total_products,
-            'seasonal_products': seasonal_products,
-            'total_orders': 0, # Placeholder
-        },
-        'score_data': {
-            'points': points,
-            'level': level,
-            'next_level_points': next_level_points,
-            'progress_percentage': progress_percentage,
-            'badges': badges
-        }
+        'is_business': bool(profile and profile.is_business),
+        'stats': profile_stats(user, profile),
+        'score_data': points.score_data(profile, user),
     }
     return render(request, 'FestivMartApp/score.html', context)
 
+def leaderboard_api(request):
+    """
+    API for the points leaderboard: the top ?top= profiles and, for a
+    signed-in user with a profile, their rank and ?around= neighbours.
+    """
+    try:
+        top = min(max(int(request.GET.get('top', 10)), 1), 100)
+        around = min(max(int(request.GET.get('around', 3)), 0), 25)
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Invalid top or around'}, status=400)
+
+    profile = None
+    if request.user.is_authenticated:
+        profile = UserProfile.objects.filter(user=request.user).first()
+    if profile is None:
+        data = {'total': leaderboard.total(), 'top': leaderboard.top(top), 'me': None, 'above': [], 'below': []}
+    else:
+        data = leaderboard.standing(profile, top, around)
+    return JsonResponse({'success': True, **data})
+
+
+def search_api(request):
+    """API for ranked full-text product search with optional filters."""
+    text = request.GET.get('q', '').strip()
+    categories = [c for c in request.GET.getlist('category') if c.isdigit()]
+    seasonal = request.GET.get('seasonal')
+    if seasonal is not None:
+        seasonal = seasonal.lower() in ('1', 'true', 'on', 'yes')
+    try:
+        limit = int(request.GET.get('limit', 20))
+        offset = int(request.GET.get('offset', 0))
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Invalid paging parameters'}, status=400)
+
+    page = search_product_ids(
+        text, categories=categories, seasonal=seasonal, limit=limit, offset=offset
+    )
+    return JsonResponse({
+        'success': True,
+        'query': text,
+        'results': [serialize_product(p) for p in load_products(page.ids)],
+        # Null when the query matched too much to rank in full; narrow it
+        'total': page.total,
+        'truncated': page.truncated,
+    })
+
+
 def year_dates_api(request):
     """
-    API to fetch the entire year dates and occasional days.
+    API to fetch the festival calendar: every season and occasion, or the
+    years ?from=YYYY&to=YYYY.
     """
-    current_year = timezone.now().year
-    
-    # Fetch all seasons and occasions
-    seasons = Season.objects.all().values('name', 'start_date', 'end_date', 'description')
-    occasions = Occasion.objects.all().values('name', 'date', 'description')
-    
-    data = {
-        'year': current_year,
-        'seasons': list(seasons),
-        'occasions': list(occasions)
-    }
-    
-    return JsonResponse(data)
+    current_year = timezone.localdate().year
+    start, end = request.GET.get('from'), request.GET.get('to')
+    if start is None and end is None:
+        calendar = festival_calendar.get_all(current_year)
+    else:
+        try:
+            first, last = festival_calendar.parse_range(start, end, current_year)
+        except festival_calendar.InvalidRange as exc:
+            return JsonResponse({'success': False, 'error': str(exc)}, status=400)
+        calendar = festival_calendar.get_range(first, last)
+    return conditional_response(request, calendar.body, calendar.etag, cache_control='public, max-age=3600')
+
+
+def conditional_response(request, body, etag, last_modified=None, cache_control='public, no-cache'):
+    """JSON response with validators, or 304 when the client's copy is current."""
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match is not None:
+        etags = parse_etags(if_none_match)
+        not_modified = '*' in etags or etag in {tag.removeprefix('W/') for tag in etags}
+    else:
+        since = parse_http_date_safe(request.headers.get('If-Modified-Since', ''))
+        not_modified = (since is not None and last_modified is not None
+                        and int(last_modified.timestamp()) <= since)
+
+    if not_modified:
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(body, content_type='application/json')
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    response['Cache-Control'] = cache_control
+    return response
 
 
 def product_detail_api(request, product_id):
     """API to get detailed product info and related products."""
-    product = get_object_or_404(Product, id=product_id)
-    
-    # Related products: same category, exclude current, limit 4
-    related = Product.objects.filter(category=product.category, available=True).exclude(id=product.id)[:4]
-    
-    related_data = []
-    for p in related:
-        related_data.append({
-            'id': p.id,
-            'name': p.name,
-            'price': float(p.price),
-            'discounted_price': float(p.discounted_price),
-            'image': p.get_image_url(),
-            'discount_percent': p.discount_percent
-        })
-        
-    data = {
-        'id': product.id,
-        'name': product.name,
-        'description': product.description,
-        'price': float(product.price),
-        'discounted_price': float(product.discounted_price),
-        'discount_percent': product.discount_percent,
-        'image': product.get_image_url(),
-        'stock': product.stock,
-        'category': str(product.category),
-        
-        # Mock/Calculated data features
-        'rating': 4.5, 
-        'reviews_count': 42 + product.id,
-        'total_buys': 120 + product.id * 5, 
-        'return_policy': '7 Days Return & Exchange',
-        'is_in_stock': product.is_in_stock,
-        
-        'related_products': related_data
-    }
-    return JsonResponse(data)
+    entry = product_detail.get_entry(product_id)
+    if entry is None:
+        raise Http404('No Product matches the given query.')
+    # Cacheable, but revalidated on every modal open so stock stays current
+    return conditional_response(request, entry.body, entry.etag, entry.last_modified)
+
+
+def _open_image(find, *args):
+    """Open the cache file find(*args) names; if it was evicted before it could be opened, find it again."""
+    for attempt in range(2):
+        path = find(*args)
+        if path is None:
+            return None
+        try:
+            return open(path, 'rb')
+        except FileNotFoundError:
+            continue
+    return None
+
+
+def _image_response(image, ext, cache_control):
+    response = FileResponse(image, content_type=image_proxy.CONTENT_TYPES[ext])
+    response['Cache-Control'] = cache_control
+    return response
+
+
+def image_proxy_view(request, token, size, ext):
+    """Serve a linked product image from the local proxy cache."""
+    url = image_proxy.unsign(token)
+    if url is None or size not in image_proxy.SIZES or ext not in image_proxy.CONTENT_TYPES:
+        raise Http404('Unknown image')
+    image = _open_image(image_proxy.get, url, size, ext)
+    if image is None:
+        # Fetch failed: show the placeholder, but let clients retry soon
+        return _image_response(_open_image(image_proxy.placeholder, size, ext), ext, 'public, max-age=300')
+    return _image_response(image, ext, 'public, max-age=31536000, immutable')
+
+
+def image_placeholder(request, size, ext):
+    """The locally generated "no image" placeholder."""
+    if size not in image_proxy.SIZES or ext not in image_proxy.CONTENT_TYPES:
+        raise Http404('Unknown image')
+    return _image_response(_open_image(image_proxy.placeholder, size, ext), ext, 'public, max-age=31536000, immutable')
 
 
 # ============== CART API VIEWS ==============
 
 @csrf_exempt
+@retry_locked
 def cart_add(request):
     """API to add item to cart."""
     if request.method != 'POST':
@@ -469,29 +546,28 @@ def cart_add(request):
     except (json.JSONDecodeError, ValueError):
         return JsonResponse({'success': False, 'error': 'Invalid data'}, status=400)
     
-    product = get_object_or_404(Product, id=product_id, available=True)
+    product = get_object_or_404(Product.objects.only('id', 'name'), id=product_id, available=True)
     cart = get_or_create_cart(request)
     
-    # Check if item already in cart
-    cart_item, created = CartItem.objects.get_or_create(
-        cart=cart,
-        product=product,
-        defaults={'quantity': quantity}
+    # Bump the quantity in place; insert only if the item is not in the cart yet
+    updated = CartItem.objects.filter(cart=cart, product=product).update(
+        quantity=F('quantity') + quantity
     )
+    if not updated:
+        CartItem.objects.create(cart=cart, product=product, quantity=quantity)
+    metrics.inc_on_commit('festivmart_cart_adds_total', api='add')
     
-    if not created:
-        cart_item.quantity += quantity
-        cart_item.save()
-    
+    totals = cart.get_totals()
     return JsonResponse({
         'success': True,
         'message': f'{product.name} added to cart',
-        'cart_count': cart.item_count,
-        'cart_total': float(cart.total),
+        'cart_count': totals.item_count,
+        'cart_total': float(totals.total),
     })
 
 
 @csrf_exempt
+@retry_locked
 def cart_update(request):
     """API to update cart item quantity."""
     if request.method != 'POST':
@@ -504,34 +580,27 @@ def cart_update(request):
     except (json.JSONDecodeError, ValueError):
         return JsonResponse({'success': False, 'error': 'Invalid data'}, status=400)
     
-    cart = get_or_create_cart(request)
-    
-    try:
-        cart_item = CartItem.objects.get(id=item_id, cart=cart)
-    except CartItem.DoesNotExist:
-        return JsonResponse({'success': False, 'error': 'Item not found'}, status=404)
+    cart = get_cart(request)
+    items = CartItem.objects.filter(id=item_id, cart_id=cart.pk)
     
     if quantity <= 0:
-        cart_item.delete()
+        changed, _ = items.delete()
         message = 'Item removed from cart'
     else:
-        cart_item.quantity = quantity
-        cart_item.save()
+        changed = items.update(quantity=quantity)
         message = 'Cart updated'
+    if not changed:
+        return JsonResponse({'success': False, 'error': 'Item not found'}, status=404)
     
     return JsonResponse({
         'success': True,
         'message': message,
-        'cart_count': cart.item_count,
-        'subtotal': float(cart.subtotal),
-        'discount': float(cart.discount_amount),
-        'tax': float(cart.tax_amount),
-        'shipping': float(cart.shipping_cost),
-        'total': float(cart.total),
+        **cart.get_totals().as_json(),
     })
 
 
 @csrf_exempt
+@retry_locked
 def cart_remove(request):
     """API to remove item from cart."""
     if request.method != 'POST':
@@ -543,27 +612,56 @@ def cart_remove(request):
     except json.JSONDecodeError:
         return JsonResponse({'success': False, 'error': 'Invalid data'}, status=400)
     
-    cart = get_or_create_cart(request)
+    cart = get_cart(request)
     
-    try:
-        cart_item = CartItem.objects.get(id=item_id, cart=cart)
-        cart_item.delete()
-    except CartItem.DoesNotExist:
+    deleted, _ = CartItem.objects.filter(id=item_id, cart_id=cart.pk).delete()
+    if not deleted:
         return JsonResponse({'success': False, 'error': 'Item not found'}, status=404)
     
     return JsonResponse({
         'success': True,
         'message': 'Item removed',
-        'cart_count': cart.item_count,
-        'subtotal': float(cart.subtotal),
-        'discount': float(cart.discount_amount),
-        'tax': float(cart.tax_amount),
-        'shipping': float(cart.shipping_cost),
-        'total': float(cart.total),
+        **cart.get_totals().as_json(),
     })
 
 
 @csrf_exempt
+@retry_locked
+def cart_batch(request):
+    """API to apply a list of add/set/remove operations to the cart in one go."""
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'error': 'POST required'}, status=405)
+    
+    try:
+        data = json.loads(request.body)
+        operations = data.get('operations')
+    except (json.JSONDecodeError, AttributeError):
+        return JsonResponse({'success': False, 'error': 'Invalid data'}, status=400)
+    
+    try:
+        parse_operations(operations)
+    except CartOperationError as exc:
+        return JsonResponse({'success': False, 'error': 'Invalid data', 'errors': exc.errors}, status=400)
+    
+    cart = get_or_create_cart(request)
+    try:
+        changed = apply_cart_operations(cart, operations)
+    except CartOperationError as exc:
+        return JsonResponse({'success': False, 'error': 'Invalid data', 'errors': exc.errors}, status=400)
+    adds = sum(1 for operation in operations if operation.get('op') == 'add')
+    if adds:
+        metrics.inc_on_commit('festivmart_cart_adds_total', adds, api='batch')
+    
+    return JsonResponse({
+        'success': True,
+        'message': 'Cart updated',
+        'changed': changed,
+        **cart.get_totals().as_json(),
+    })
+
+
+@csrf_exempt
+@retry_locked
 def cart_apply_coupon(request):
     """API to apply coupon code."""
     if request.method != 'POST':
@@ -577,31 +675,32 @@ def cart_apply_coupon(request):
     
     cart = get_or_create_cart(request)
     success, message = cart.apply_coupon(code)
+    metrics.inc_on_commit('festivmart_coupon_applications_total', result='applied' if success else 'rejected')
+    totals = cart.get_totals().as_json()
+    totals.pop('cart_count')
     
     return JsonResponse({
         'success': success,
         'message': message,
         'discount_percent': cart.discount_percent,
-        'subtotal': float(cart.subtotal),
-        'discount': float(cart.discount_amount),
-        'tax': float(cart.tax_amount),
-        'shipping': float(cart.shipping_cost),
-        'total': float(cart.total),
+        **totals,
     })
 
 
+@primary_reads()
 def cart_data(request):
     """API to get cart data for JS."""
-    cart = get_or_create_cart(request)
+    cart = get_cart(request)
+    totals = cart.get_totals()
     
     items = []
-    for item in cart.items.select_related('product', 'product__category').all():
+    for item in totals.items:
         items.append({
             'id': item.id,
             'product_id': item.product.id,
             'name': item.product.name,
             'category': item.product.category.name if item.product.category else '',
-            'image': item.product.get_image_url(),
+            'image': item.product.get_image_url('thumb'),
             'price': float(item.unit_price),
             'original_price': float(item.product.price),
             'quantity': item.quantity,
@@ -611,18 +710,14 @@ def cart_data(request):
     return JsonResponse({
         'success': True,
         'items': items,
-        'cart_count': cart.item_count,
         'coupon_code': cart.coupon_code or '',
         'discount_percent': cart.discount_percent,
-        'subtotal': float(cart.subtotal),
-        'discount': float(cart.discount_amount),
-        'tax': float(cart.tax_amount),
-        'shipping': float(cart.shipping_cost),
-        'total': float(cart.total),
+        **totals.as_json(),
     })
 
 
 @login_required
+@primary_reads()
 def order_success(request, order_number):
     """Display order success page."""
     order = get_object_or_404(Order, order_number=order_number, user=request.user)
@@ -634,3 +729,14 @@ def order_success(request, order_number):
     }
     return render(request, 'FestivMartApp/order_success.html', context)
 
+
+# ============== METRICS ==============
+
+def metrics_view(request):
+    """Prometheus scrape endpoint; off until METRICS_TOKEN is set, then needs it as a bearer token."""
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    if not token:
+        raise Http404('Metrics are off: set METRICS_TOKEN')
+    if not constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return HttpResponse('Unauthorized', status=401, content_type='text/plain')
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -10,6 +10,8 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/6.0/ref/settings/
 """
 
+import os
+import tempfile
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -41,6 +43,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so their timings and query counts include the other middleware
+    'FestivMartApp.metrics.MetricsMiddleware',
+    'FestivMartApp.instrumentation.InstrumentationMiddleware',
+    'FestivMartApp.replicas.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -73,11 +79,88 @@ WSGI_APPLICATION = 'FestivMartProject.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/6.0/ref/settings/#databases
 
+# SQLite production mode (see FestivMartApp/database.py), off for
+# development: set FESTIVMART_SQLITE_PRODUCTION=1 where the site is served.
+SQLITE_PRODUCTION_MODE = os.environ.get('FESTIVMART_SQLITE_PRODUCTION') == '1'
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    },
+    # A local copy of default for catalog reads (see FestivMartApp/replicas.py)
+    'replica1': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db.replica1.sqlite3',
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'init_command': 'PRAGMA query_only = 1',
+        },
+        'TEST': {'MIRROR': 'default'},
+    },
+}
+
+DATABASE_ROUTERS = ['FestivMartApp.replicas.ReplicaRouter']
+
+# Aliases the router reads the catalog from, once `manage.py
+# refresh_replicas` keeps them at most REPLICA_MAX_LAG seconds behind
+# default (refreshing every REPLICA_REFRESH_SECONDS); until then, and
+# whenever they fall further behind, reads go to default.
+REPLICAS = ['replica1']
+REPLICA_MAX_LAG = 10
+REPLICA_REFRESH_SECONDS = 2
+
+if SQLITE_PRODUCTION_MODE:
+    DATABASES['default'].update({
+        # Persistent connections, checked before reuse
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            # Writers take the lock at BEGIN, where the busy timeout applies
+            'transaction_mode': 'IMMEDIATE',
+        },
+    })
+
+# In production mode: pragmas run on every new connection, how often a
+# write view's transaction is retried when it still meets a lock, backing
+# off exponentially from SQLITE_RETRY_BACKOFF seconds, and whether those
+# transactions queue at the write gate (a "<NAME>-writers" lock file next
+# to the database), waiting at most SQLITE_WRITE_GATE_TIMEOUT seconds.
+
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,          # ms
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -16000,          # KiB per connection
+}
+SQLITE_WRITE_RETRIES = 5
+SQLITE_RETRY_BACKOFF = 0.05
+SQLITE_WRITE_GATE = True
+SQLITE_WRITE_GATE_TIMEOUT = 5.0
+
+
+# Cache
+# https://docs.djangoproject.com/en/6.0/topics/cache/
+# Shared by all worker processes so that invalidations (category tree,
+# seasonal merchandising snapshot) reach every worker, not just the one
+# that handled the write.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': Path(tempfile.gettempdir()) / 'festivmart-cache',
+    },
+    # Product detail payloads, kept by each worker process: FileBasedCache
+    # lists its whole directory on every set, so a file cache big enough for
+    # them would slow every write. The version tokens deciding whether a
+    # payload is still current stay in default (see product_detail.py).
+    'product_detail': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'festivmart-product-detail',
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    },
 }
 
 
@@ -121,5 +204,51 @@ STATIC_URL = 'static/'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Processes generate_image_derivatives resizes product images with (see
+# FestivMartApp/images.py), None for one per CPU; with 0, uploads are
+# resized inline in the request instead. Run the command with --loop to
+# pick up new uploads every IMAGE_DERIVATIVES_POLL_SECONDS.
+IMAGE_WORKERS = None
+IMAGE_DERIVATIVES_POLL_SECONDS = 5
+
+# Disk cache of linked (image_url) product images served by the image
+# proxy (see FestivMartApp/image_proxy.py), least recently used evicted
+IMAGE_PROXY_CACHE_DIR = Path(tempfile.gettempdir()) / 'festivmart-images'
+IMAGE_PROXY_CACHE_BYTES = 512 * 1024 * 1024
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Order numbers (see FestivMartApp/order_numbers.py). The default worker id
+# is the process id; set a distinct ORDER_NUMBER_WORKER_ID per process when
+# running on more than one host.
+
+ORDER_NUMBER_GENERATOR = 'FestivMartApp.order_numbers.SnowflakeGenerator'
+ORDER_NUMBER_WORKER_ID = None
+
+# Request instrumentation (see FestivMartApp/instrumentation.py): the share
+# of requests profiled, 0 to turn it off, and whether profiled responses
+# carry a Server-Timing header. Profiles are logged as JSON lines.
+
+INSTRUMENTATION_SAMPLE_RATE = 0.0
+INSTRUMENTATION_SERVER_TIMING = True
+
+# Metrics served at /metrics/ (see FestivMartApp/metrics.py). With several
+# worker processes, point METRICS_DIR at a directory they share; each
+# writes its totals there every METRICS_FLUSH_SECONDS. The endpoint is off
+# (404) until METRICS_TOKEN is set, and then requires it as a bearer token.
+
+METRICS_DIR = None
+METRICS_FLUSH_SECONDS = 5
+METRICS_TOKEN = None
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'FestivMartApp.instrumentation': {'handlers': ['console'], 'level': 'INFO', 'propagate': False},
+    },
+}
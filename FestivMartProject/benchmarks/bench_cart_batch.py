@@ -0,0 +1,65 @@
+"""
+Batch cart endpoint vs. N single cart_add calls ("add the whole hamper").
+
+    python benchmarks/bench_cart_batch.py --items 5 10 25 50
+"""
+import json
+import time
+
+import harness
+
+
+def main():
+    p = harness.parser(__doc__)
+    p.add_argument('--items', type=int, nargs='+', default=[5, 10, 25, 50])
+    p.add_argument('--rounds', type=int, default=20)
+    args = p.parse_args()
+    path = harness.setup(args.db)
+
+    from django.contrib.auth.models import User
+
+    from FestivMartApp.models import Cart, Category, Product
+
+    category = Category.objects.create(name='Festival Gifts')
+    products = Product.objects.bulk_create(
+        Product(name=f'Hamper item {i}', description='', price=100 + i, category=category, stock=10_000)
+        for i in range(max(args.items))
+    )
+    user = User.objects.create_user('bench', 'bench@example.com', 'pw')
+    client = harness.client(user)
+
+    def single_calls(items):
+        for product in items:
+            client.post('/api/cart/add/', json.dumps({'product_id': product.pk, 'quantity': 1}),
+                        content_type='application/json')
+
+    def one_batch(items):
+        ops = [{'op': 'add', 'product_id': product.pk, 'quantity': 1} for product in items]
+        client.post('/api/cart/batch/', json.dumps({'operations': ops}), content_type='application/json')
+
+    results = {}
+    for n in args.items:
+        items = products[:n]
+        for label, fn in (('single cart_add calls', single_calls), ('one batch call', one_batch)):
+            Cart.objects.filter(user=user).delete()
+            _, queries = harness.count_queries(lambda: fn(items))
+            samples = []
+            for _ in range(args.rounds):
+                Cart.objects.filter(user=user).delete()
+                start = time.perf_counter()
+                fn(items)
+                samples.append((time.perf_counter() - start) * 1000)
+            samples.sort()
+            results[f'{n} items, {label}'] = {
+                'requests': n if fn is single_calls else 1,
+                'queries': queries,
+                'p50_ms': round(harness.percentile(samples, 50), 2),
+                'p95_ms': round(harness.percentile(samples, 95), 2),
+            }
+
+    harness.report('Batch cart mutation', results, as_json=args.json)
+    harness.teardown(path, keep=bool(args.db))
+
+
+if __name__ == '__main__':
+    main()
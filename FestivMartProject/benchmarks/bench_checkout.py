@@ -0,0 +1,133 @@
+"""
+Checkout under contention: many shoppers racing for the same few products.
+
+Each worker thread has its own user and cart and keeps placing orders
+until the stock runs out. Afterwards every unit must be accounted for:
+initial stock == remaining stock + units ordered, and no stock is negative.
+--legacy runs the old per-line read-modify-write loop for comparison.
+
+    python benchmarks/bench_checkout.py --threads 8 --products 5 --stock 200
+"""
+import random
+import sys
+import threading
+import time
+
+import harness
+
+
+def legacy_place_order(cart, user, **details):
+    """The checkout loop as it was: no transaction, stock saved line by line."""
+    from FestivMartApp.models import Order, OrderItem
+
+    totals = cart.get_totals()
+    order = Order.objects.create(
+        user=user, subtotal=totals.subtotal, discount_amount=totals.discount_amount,
+        tax_amount=totals.tax_amount, shipping_cost=totals.shipping_cost, total=totals.total,
+        coupon_code=totals.coupon_code, **details,
+    )
+    for item in totals.items:
+        OrderItem.objects.create(
+            order=order, product=item.product, product_name=item.product.name,
+            quantity=item.quantity, unit_price=item.unit_price, line_total=item.line_total,
+        )
+        item.product.stock -= item.quantity
+        item.product.save()
+    cart.clear()
+    return order
+
+
+def main():
+    p = harness.parser(__doc__)
+    p.add_argument('--threads', type=int, default=8)
+    p.add_argument('--products', type=int, default=5)
+    p.add_argument('--stock', type=int, default=200, help="Initial stock per product")
+    p.add_argument('--lines', type=int, default=3, help="Products per order")
+    p.add_argument('--legacy', action='store_true')
+    args = p.parse_args()
+    # BEGIN IMMEDIATE + busy timeout: writers queue for the lock instead of failing
+    path = harness.setup(args.db, options={'timeout': 30, 'transaction_mode': 'IMMEDIATE'})
+
+    from django.contrib.auth.models import User
+    from django.db import connection
+    from django.db.models import Sum
+
+    from FestivMartApp.checkout import InsufficientStock, place_order
+    from FestivMartApp.models import Cart, CartItem, Category, OrderItem, Product
+
+    category = Category.objects.create(name='Festival Gifts')
+    products = Product.objects.bulk_create(
+        Product(name=f'Limited diya {i}', description='', price=100, category=category, stock=args.stock)
+        for i in range(args.products)
+    )
+    users = [User.objects.create_user(f'shopper{i}', f'shopper{i}@example.com', 'pw')
+             for i in range(args.threads)]
+    address = {'full_name': 'Shopper', 'email': 's@example.com', 'phone': '1', 'address': 'x',
+               'city': 'Pune', 'postal_code': '411001'}
+    checkout = legacy_place_order if args.legacy else place_order
+    counts = {'orders': 0, 'rejected': 0, 'errors': 0}
+    lock = threading.Lock()
+    errors = []
+
+    def shopper(user, seed):
+        rng = random.Random(seed)
+        cart = Cart.objects.create(user=user)
+        misses = 0
+        try:
+            while misses < 5:
+                lines = rng.sample(products, min(args.lines, len(products)))
+                CartItem.objects.bulk_create(
+                    CartItem(cart=cart, product=product, quantity=rng.randint(1, 3)) for product in lines
+                )
+                try:
+                    checkout(cart, user, **address)
+                    outcome = 'orders'
+                    misses = 0
+                except InsufficientStock:
+                    outcome = 'rejected'
+                    misses += 1
+                    cart.items.all().delete()
+                except Exception as exc:
+                    outcome = 'errors'
+                    misses += 1
+                    errors.append(repr(exc))
+                    cart.items.all().delete()
+                with lock:
+                    counts[outcome] += 1
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=shopper, args=(user, i)) for i, user in enumerate(users)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    remaining = dict(Product.objects.values_list('id', 'stock'))
+    ordered = dict(OrderItem.objects.values('product_id').annotate(n=Sum('quantity')).values_list('product_id', 'n'))
+    oversold = sum(max(0, ordered.get(pk, 0) - args.stock) for pk in remaining)
+    results = {
+        'mode': 'legacy loop' if args.legacy else 'transactional place_order',
+        'threads': args.threads,
+        'orders': counts['orders'],
+        'rejected (insufficient stock)': counts['rejected'],
+        'errors': counts['errors'],
+        'orders_per_sec': round(counts['orders'] / elapsed, 1),
+        'units ordered': sum(ordered.values()),
+        'units initially in stock': args.stock * args.products,
+        'units remaining': sum(remaining.values()),
+        'units oversold': oversold,
+        'stock accounted for': all(ordered.get(pk, 0) + remaining[pk] == args.stock for pk in remaining),
+    }
+    if errors:
+        results['first error'] = errors[0]
+    harness.report('Checkout under contention', results, as_json=args.json)
+    harness.teardown(path, keep=bool(args.db))
+    if not args.legacy and (oversold or not results['stock accounted for'] or counts['errors']):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""
+Image proxy: a cold miss (fetch + normalize), a warm hit from the disk
+cache, and a burst of concurrent cold misses for one URL, against a local
+stand-in image host that adds --latency to every request.
+
+    python benchmarks/bench_image_proxy.py --latency 0.15
+"""
+import io
+import random
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import harness
+
+
+def image_host(latency, body):
+    hits = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            hits.append(self.path)
+            time.sleep(latency)
+            self.send_response(200)
+            self.send_header('Content-Type', 'image/jpeg')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, hits
+
+
+def main():
+    p = harness.parser(__doc__)
+    p.add_argument('--latency', type=float, default=0.15, help="Seconds the image host takes per request")
+    p.add_argument('--urls', type=int, default=20)
+    p.add_argument('--burst', type=int, default=16, help="Concurrent requests for one cold URL")
+    args = p.parse_args()
+    path = harness.setup(args.db)
+
+    from django.conf import settings
+    from PIL import Image
+
+    from FestivMartApp import image_proxy
+
+    settings.IMAGE_PROXY_CACHE_DIR = tempfile.mkdtemp(prefix='festivmart-images-')
+    settings.IMAGE_PROXY_ALLOW_PRIVATE = True
+    buffer = io.BytesIO()
+    Image.effect_noise((2400, 1800), 60).convert('RGB').save(buffer, 'JPEG', quality=90)
+    server, hits = image_host(args.latency, buffer.getvalue())
+    base = f'http://127.0.0.1:{server.server_address[1]}'
+    client = harness.client()
+
+    def get(url):
+        response = client.get(url)
+        b''.join(response.streaming_content)
+        assert response.status_code == 200
+
+    urls = [image_proxy.proxy_url(f'{base}/cold{i}.jpg', 'thumb') for i in range(args.urls)]
+    cold = iter(urls)
+    rng = random.Random(7)
+
+    burst_times = []
+    for i in range(5):
+        url = f'{base}/burst{i}.jpg'
+        start = time.perf_counter()
+        with ThreadPoolExecutor(args.burst) as pool:
+            list(pool.map(lambda _: image_proxy.get(url, 'thumb', 'jpg'), range(args.burst)))
+        burst_times.append(time.perf_counter() - start)
+
+    results = {
+        'upstream': {'latency_ms': args.latency * 1000, 'image': '2400x1800 JPEG', 'bytes': len(buffer.getvalue())},
+        'cold miss (fetch + 4 derivatives)': harness.measure(lambda: get(next(cold)), repeat=args.urls, warmup=0),
+        'warm hit': harness.measure(lambda: get(rng.choice(urls)), repeat=500),
+        f'{args.burst} concurrent misses, one URL': {
+            'mean_ms': round(sum(burst_times) / len(burst_times) * 1000, 1),
+            'upstream fetches per URL': sum(1 for h in hits if h.startswith('/burst')) / len(burst_times),
+        },
+    }
+    harness.report('Image proxy', results, as_json=args.json)
+    server.shutdown()
+    shutil.rmtree(settings.IMAGE_PROXY_CACHE_DIR)
+    harness.teardown(path, keep=bool(args.db))
+
+
+if __name__ == '__main__':
+    main()
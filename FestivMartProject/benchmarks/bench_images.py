@@ -0,0 +1,78 @@
+"""
+Image derivatives: backfill throughput with one worker and with a full
+process pool, and the bytes a grid tile downloads before and after.
+
+    python benchmarks/bench_images.py --images 200
+"""
+import io
+import os
+import random
+import shutil
+import tempfile
+import time
+
+import harness
+
+
+def photo(rng, size):
+    """A noisy gradient, so the encoders see something like a photo."""
+    from PIL import Image, ImageFilter
+
+    image = Image.effect_noise(size, 60).convert('RGB')
+    tint = Image.new('RGB', size, tuple(rng.randrange(256) for _ in range(3)))
+    image = Image.blend(image, tint, 0.6).filter(ImageFilter.GaussianBlur(2))
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=90)
+    return buffer.getvalue()
+
+
+def main():
+    p = harness.parser(__doc__)
+    p.add_argument('--images', type=int, default=200)
+    p.add_argument('--width', type=int, default=2400)
+    p.add_argument('--height', type=int, default=1800)
+    args = p.parse_args()
+    path = harness.setup(args.db)
+
+    from django.conf import settings
+    from django.core.files.base import ContentFile
+
+    from FestivMartApp import images
+    from FestivMartApp.models import Category, Product
+
+    settings.MEDIA_ROOT = tempfile.mkdtemp(prefix='festivmart-media-')
+    rng = random.Random(42)
+    category = Category.objects.create(name='Bench')
+    for i in range(args.images):
+        product = Product(name=f'Product {i}', description='', price=100, category=category)
+        # Saving the file without the model keeps the upload hook out of the way
+        product.image.save(f'bench{i}.jpg', ContentFile(photo(rng, (args.width, args.height))), save=False)
+        Product.objects.bulk_create([product])
+
+    results = {'dataset': {'images': args.images, 'size': f'{args.width}x{args.height}', 'cpus': os.cpu_count()}}
+    for workers in sorted({1, images.workers()}):
+        start = time.perf_counter()
+        generated, failed = images.generate(images.pending(force=True), max_workers=workers)
+        elapsed = time.perf_counter() - start
+        results[f'backfill, {workers} worker(s)'] = {
+            'seconds': round(elapsed, 2), 'images/s': round(generated / elapsed, 1), 'failed': failed,
+        }
+
+    def mean_size(name_of):
+        sizes = [os.path.getsize(os.path.join(settings.MEDIA_ROOT, name_of(p))) for p in Product.objects.all()]
+        return round(sum(sizes) / len(sizes) / 1024, 1)
+
+    results['mean KiB per tile'] = {
+        'original': mean_size(lambda p: p.image.name),
+        'thumb jpeg': mean_size(lambda p: p.image_variants['thumb']['jpeg']),
+        'thumb webp': mean_size(lambda p: p.image_variants['thumb']['webp']),
+        'medium jpeg': mean_size(lambda p: p.image_variants['medium']['jpeg']),
+        'medium webp': mean_size(lambda p: p.image_variants['medium']['webp']),
+    }
+    harness.report('Product image derivatives', results, as_json=args.json)
+    shutil.rmtree(settings.MEDIA_ROOT)
+    harness.teardown(path, keep=bool(args.db))
+
+
+if __name__ == '__main__':
+    main()
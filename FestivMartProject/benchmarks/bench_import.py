@@ -0,0 +1,96 @@
+"""
+Bulk product import: rows/s and peak memory of import_products() on a
+generated CSV, against one Product.objects.create() per row (what
+add_product does) on a sample. Run at two sizes to see that peak memory
+does not grow with the file:
+
+    python benchmarks/bench_import.py --rows 100000
+    python benchmarks/bench_import.py --rows 1000000
+"""
+import os
+import random
+import resource
+import tempfile
+import time
+
+import harness
+
+
+def write_csv(path, rows, categories, occasions):
+    rng = random.Random(42)
+    with open(path, 'w') as f:
+        f.write('name,price,category,description,stock,discount_percent,is_seasonal,occasions\n')
+        for i in range(rows):
+            seasonal = rng.random() < 0.3
+            f.write(
+                f'Product {i},{rng.randint(50, 5000)}.{rng.randint(0, 99):02d},{rng.choice(categories)},'
+                f'"Festive item {i}, hand made",{rng.randint(0, 50)},{rng.choice((0, 0, 5, 10))},'
+                f'{"yes" if seasonal else "no"},{rng.choice(occasions) if seasonal else ""}\n'
+            )
+            if i % 50 == 0:
+                # An invalid row now and then, as real uploads have
+                f.write(f'Broken {i},not-a-price,Nowhere,,,,,\n')
+
+
+def main():
+    p = harness.parser(__doc__)
+    p.add_argument('--rows', type=int, default=100_000)
+    p.add_argument('--batch-size', type=int, default=500)
+    p.add_argument('--sample', type=int, default=2000, help="Rows for the per-row create() baseline")
+    args = p.parse_args()
+    path = harness.setup(args.db)
+
+    import datetime
+
+    from django.contrib.auth.models import User
+    from django.db import transaction
+
+    from FestivMartApp.models import Category, Occasion, Product, UserProfile
+    from FestivMartApp.product_import import import_products
+
+    categories = [Category.objects.create(name=f'Category {i}').name for i in range(40)]
+    occasions = [Occasion.objects.create(name=f'Occasion {i}', date=datetime.date(2026, 11, 1)).name
+                 for i in range(10)]
+    seller = User.objects.create_user('seller', 'seller@example.com', 'pw')
+    UserProfile.objects.create(user=seller, is_business=True)
+
+    csv_path = tempfile.mktemp(suffix='.csv')
+    write_csv(csv_path, args.rows, categories, occasions)
+    size_mb = os.path.getsize(csv_path) / 1e6
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    with open(csv_path, 'rb') as f:
+        result = import_products(f, seller=seller, batch_size=args.batch_size)
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    os.remove(csv_path)
+
+    category = Category.objects.first()
+    start = time.perf_counter()
+    for i in range(args.sample):
+        # Each create() is its own transaction, as in the add_product view
+        with transaction.atomic():
+            Product.objects.create(name=f'Single {i}', description='', price=100, category=category,
+                                   seller=seller, stock=1)
+    single = time.perf_counter() - start
+
+    results = {
+        'input': {'rows': result.rows, 'csv_mb': round(size_mb, 1), 'batch_size': args.batch_size},
+        'import_products': {
+            'created': result.created,
+            'rejected': result.failed,
+            'seconds': round(result.seconds, 1),
+            'rows/s': round(result.rows_per_second),
+            'peak RSS before import (MB)': round(rss_before / 1024, 1),
+            'peak RSS after import (MB)': round(rss_after / 1024, 1),
+        },
+        'Product.objects.create per row': {
+            'rows': args.sample,
+            'rows/s': round(args.sample / single),
+        },
+    }
+    harness.report('Bulk product import', results, as_json=args.json)
+    harness.teardown(path, keep=bool(args.db))
+
+
+if __name__ == '__main__':
+    main()
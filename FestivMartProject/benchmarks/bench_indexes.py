@@ -0,0 +1,82 @@
+"""
+Hot query shapes (FestivMartApp/query_plans.py) with and without the
+indexes of migration 0017: p50 latency and plan of each. "Without" drops
+the indexes inside a transaction that is rolled back afterwards, so the
+database is left as it was. Seeds the catalog with seed_data's generator
+when the database has none; reuse a large one with --db:
+
+    python benchmarks/bench_indexes.py --products 1000000 --db /tmp/big.sqlite3
+"""
+import time
+
+import harness
+
+
+def main():
+    p = harness.parser(__doc__)
+    p.add_argument('--products', type=int, default=100_000)
+    p.add_argument('--repeat', type=int, default=20)
+    args = p.parse_args()
+    start = time.perf_counter()
+    path = harness.setup(args.db)
+    migrated = time.perf_counter() - start
+
+    from django.contrib.auth.models import User
+    from django.db import connection, transaction
+    from django.db.models import Count
+
+    from FestivMartApp import query_plans
+    from FestivMartApp.models import Cart, Product
+
+    if not Product.objects.exists():
+        import contextlib
+        import io
+
+        import seed_data
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            seed_data.create_initial_data()
+            seed_data.generate(products=args.products, users=max(args.products // 10, 10),
+                               orders=args.products // 2)
+
+    # The heaviest seller and category, an anonymous cart, the newest user
+    seller_id = (Product.objects.filter(seller__isnull=False).values('seller_id')
+                 .annotate(n=Count('id')).order_by('-n').values_list('seller_id', flat=True).first())
+    category_id = (Product.objects.values('category_id').annotate(n=Count('id')).order_by('-n')
+                   .values_list('category_id', flat=True).first())
+    session_key = Cart.objects.filter(user=None).values_list('session_key', flat=True).first() or 'none'
+    email = User.objects.order_by('-id').values_list('email', flat=True).first()
+
+    def run():
+        results = {}
+        for name, queryset in query_plans.hot_queries(seller_id, category_id, session_key, email).items():
+            scans, plan = query_plans.full_scans(queryset)
+            stats = harness.measure(lambda: list(queryset.all()), repeat=args.repeat, warmup=1)
+            results[name] = {'p50_ms': stats['p50_ms'], 'full scan': ', '.join(scans) or '-',
+                             'plan': ' | '.join(line.split(' ', 3)[-1] for line in plan.splitlines())}
+        return results
+
+    after = run()
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            for index in query_plans.INDEXES:
+                cursor.execute(f'DROP INDEX IF EXISTS "{index}"')
+        before = run()
+        transaction.set_rollback(True)
+
+    results = {
+        'products': Product.objects.count(),
+        'migrate (s)': round(migrated, 1),
+        'p50 ms (without -> with indexes)': {
+            name: f"{before[name]['p50_ms']} -> {after[name]['p50_ms']}" for name in after
+        },
+        'full scans without': {name: r['full scan'] for name, r in before.items() if r['full scan'] != '-'},
+        'full scans with': {name: r['full scan'] for name, r in after.items() if r['full scan'] != '-'},
+        'plans with indexes': {name: r['plan'] for name, r in after.items()},
+    }
+    harness.report('Hot query indexes', results, as_json=args.json)
+    harness.teardown(path, keep=bool(args.db))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""
+Request instrumentation: latency of a few pages without the middleware,
+with it installed but off (INSTRUMENTATION_SAMPLE_RATE = 0) and with every
+request profiled, the cost of the middleware itself when off, and what
+the profiles report for each page.
+
+    python benchmarks/bench_instrumentation.py --products 2000
+"""
+import json
+import logging
+import statistics
+import timeit
+
+import harness
+
+
+class Collect(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(json.loads(record.getMessage()))
+
+
+def main():
+    p = harness.parser(__doc__)
+    p.add_argument('--products', type=int, default=2000)
+    p.add_argument('--repeat', type=int, default=100)
+    p.add_argument('--rounds', type=int, default=5)
+    args = p.parse_args()
+    path = harness.setup(args.db)
+
+    from django.conf import settings
+    from django.test import override_settings
+
+    from FestivMartApp.models import Category, Product
+
+    category = Category.objects.create(name='Bench')
+    Product.objects.bulk_create(
+        Product(name=f'Product {i}', description='', price=100 + i % 50, category=category, stock=10)
+        for i in range(args.products)
+    )
+    pages = {'shop': '/shop/', 'catalog API': '/api/products/', 'product detail API': '/api/product/1/'}
+    middleware = [m for m in settings.MIDDLEWARE if not m.endswith('InstrumentationMiddleware')]
+    handler = Collect()
+    log = logging.getLogger('FestivMartApp.instrumentation')
+    log.handlers, log.propagate = [handler], False
+
+    configs = {
+        'without middleware': {'MIDDLEWARE': middleware},
+        'installed, rate 0': {'INSTRUMENTATION_SAMPLE_RATE': 0.0},
+        'every request profiled': {'INSTRUMENTATION_SAMPLE_RATE': 1.0},
+    }
+    samples = {label: {name: [] for name in pages} for label in configs}
+    # Interleaved rounds, so drift over the run does not favour one setup
+    for _ in range(args.rounds):
+        for label, overrides in configs.items():
+            with override_settings(**overrides):
+                client = harness.client()
+                for name, url in pages.items():
+                    samples[label][name].append(
+                        harness.measure(lambda: client.get(url), repeat=args.repeat)['p50_ms'])
+    results = {
+        label: {name: round(statistics.median(values), 3) for name, values in by_page.items()}
+        for label, by_page in samples.items()
+    }
+    # The cost when off, without the noise of a whole request around it
+    from django.test import RequestFactory
+
+    from FestivMartApp.instrumentation import InstrumentationMiddleware
+
+    request = RequestFactory().get('/')
+    with override_settings(INSTRUMENTATION_SAMPLE_RATE=0.0):
+        def view(r):
+            return None
+
+        off = InstrumentationMiddleware(view)
+        results['overhead when off (us per request)'] = round(
+            (timeit.timeit(lambda: off(request), number=100_000)
+             - timeit.timeit(lambda: view(request), number=100_000)) * 10, 2)
+    results['profile (last request)'] = {
+        record['path']: f"{record['queries']} queries, {record['duplicate_queries']} duplicates, "
+                        f"db {record['db_ms']} ms, templates {record['template_ms']} ms"
+        for record in handler.records[::-1]
+        if record['path'] in pages.values()
+    }
+    harness.report('Request instrumentation (p50 ms)', results, as_json=args.json)
+    harness.teardown(path, keep=bool(args.db))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""
+Leaderboard: rank lookup through the Fenwick tree against counting
+profiles with more points, plus standing() and the cost of a points move.
+
+    python benchmarks/bench_leaderboard.py --profiles 1000000 --db /tmp/leaderboard.sqlite3
+"""
+import random
+import time
+
+import harness
+
+
+def seed(args):
+    """Raw executemany inserts; the ORM would dominate the run at 1M rows."""
+    from django.contrib.auth.models import User
+    from django.db import connection, transaction
+    from django.utils import timezone
+
+    from FestivMartApp.models import UserProfile
+
+    rng = random.Random(42)
+    now = timezone.now().isoformat()
+    users = User._meta.db_table
+    profiles = UserProfile._meta.db_table
+    batch = 10_000
+    with transaction.atomic(), connection.cursor() as cursor:
+        for start in range(1, args.profiles + 1, batch):
+            ids = range(start, min(start + batch, args.profiles + 1))
+            cursor.executemany(
+                f'INSERT INTO "{users}" (id, password, is_superuser, username, first_name, last_name, email, '
+                f"is_staff, is_active, date_joined) VALUES (%s, '', 0, %s, '', '', '', 0, 1, %s)",
+                [(pk, f'user{pk}', now) for pk in ids],
+            )
+            # Long tail: most members have a few hundred points, a few have many thousands
+            scores = [int(rng.paretovariate(1.2) * 50) for _ in ids]
+            cursor.executemany(
+                f'INSERT INTO "{profiles}" (id, user_id, is_business, business_name, total_points, level, badges, '
+                f"product_count, seasonal_count, order_count, account_age_days) "
+                f"VALUES (%s, %s, 0, '', %s, %s, '[]', 0, 0, 0, 0)",
+                [(pk, pk, score, score // 500 + 1) for pk, score in zip(ids, scores)],
+            )
+
+
+def main():
+    p = harness.parser(__doc__)
+    p.add_argument('--profiles', type=int, default=1_000_000)
+    args = p.parse_args()
+    path = harness.setup(args.db)
+
+    from FestivMartApp import leaderboard, points
+    from FestivMartApp.models import PointsEntry, RankNode, UserProfile
+
+    start = time.perf_counter()
+    if not UserProfile.objects.exists():
+        seed(args)
+    seeded = time.perf_counter() - start
+
+    start = time.perf_counter()
+    leaderboard.rebuild()
+    rebuild = time.perf_counter() - start
+
+    rng = random.Random(7)
+    sample = list(UserProfile.objects.order_by('?')[:500])
+    scores = [profile.total_points for profile in sample]
+    low = min(scores)
+
+    def naive_rank(score):
+        return 1 + UserProfile.objects.filter(total_points__gt=score).count()
+
+    assert all(leaderboard.rank(score) == naive_rank(score) for score in scores[:20])
+
+    results = {
+        'dataset': {
+            'profiles': UserProfile.objects.count(), 'tree nodes': RankNode.objects.count(),
+            'seed_s': round(seeded, 1), 'rebuild_s': round(rebuild, 1),
+        },
+        'rank: Fenwick tree': harness.measure(lambda: leaderboard.rank(rng.choice(scores)), repeat=500),
+        'rank: COUNT(total_points > x)': harness.measure(lambda: naive_rank(rng.choice(scores)), repeat=50),
+        'rank: COUNT, lowest sampled score': harness.measure(lambda: naive_rank(low), repeat=20),
+        'standing(top 10, 3 either side)':
+            harness.measure(lambda: leaderboard.standing(rng.choice(sample), 10, 3), repeat=200),
+        'move: points.record (ledger + tree)':
+            harness.measure(lambda: points.record(rng.choice(sample).user_id, PointsEntry.ORDER, 10), repeat=200),
+    }
+    harness.report('Points leaderboard', results, as_json=args.json)
+    harness.teardown(path, keep=bool(args.db))
+
+
+if __name__ == '__main__':
+    main()
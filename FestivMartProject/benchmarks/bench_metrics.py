@@ -0,0 +1,98 @@
+"""
+Metrics: the cost of recording (inc() and observe() from one thread and
+from several at once), latency of a few pages with and without
+MetricsMiddleware, and the time to flush and to render a scrape.
+
+    python benchmarks/bench_metrics.py --products 2000
+"""
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+import timeit
+from pathlib import Path
+
+import harness
+
+
+def per_call_ns(fn, number):
+    return round(timeit.timeit(fn, number=number) / number * 1e9)
+
+
+def main():
+    p = harness.parser(__doc__)
+    p.add_argument('--products', type=int, default=2000)
+    p.add_argument('--repeat', type=int, default=100)
+    p.add_argument('--rounds', type=int, default=5)
+    p.add_argument('--threads', type=int, default=4)
+    args = p.parse_args()
+    path = harness.setup(args.db)
+
+    from django.conf import settings
+    from django.test import override_settings
+
+    from FestivMartApp import metrics
+    from FestivMartApp.models import Category, Product
+
+    number = 200_000
+    results = {
+        'inc() (ns)': per_call_ns(lambda: metrics.inc('festivmart_cart_adds_total', api='add'), number),
+        'observe() (ns)': per_call_ns(
+            lambda: metrics.observe('festivmart_http_request_duration_seconds', 0.012, view='shop'), number),
+    }
+
+    def work():
+        for _ in range(number):
+            metrics.inc('festivmart_cart_adds_total', api='bench')
+
+    threads = [threading.Thread(target=work) for _ in range(args.threads)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    results[f'inc() from {args.threads} threads'] = {
+        'ns per call': round(elapsed / (number * args.threads) * 1e9),
+        'counted': metrics.collect()[('festivmart_cart_adds_total', (('api', 'bench'),))],
+        'expected': number * args.threads,
+    }
+
+    category = Category.objects.create(name='Bench')
+    Product.objects.bulk_create(
+        Product(name=f'Product {i}', description='', price=100 + i % 50, category=category, stock=10)
+        for i in range(args.products)
+    )
+    pages = {'shop': '/shop/', 'catalog API': '/api/products/', 'product detail API': '/api/product/1/'}
+    without = [m for m in settings.MIDDLEWARE if not m.endswith('MetricsMiddleware')]
+    configs = {'without middleware': {'MIDDLEWARE': without}, 'with middleware': {}}
+    samples = {label: {name: [] for name in pages} for label in configs}
+    # Interleaved rounds, so drift over the run does not favour one setup
+    for _ in range(args.rounds):
+        for label, overrides in configs.items():
+            with override_settings(**overrides):
+                client = harness.client()
+                for name, url in pages.items():
+                    samples[label][name].append(
+                        harness.measure(lambda: client.get(url), repeat=args.repeat)['p50_ms'])
+    results['pages (p50 ms)'] = {
+        label: {name: round(statistics.median(values), 3) for name, values in by_page.items()}
+        for label, by_page in samples.items()
+    }
+
+    series = len(metrics.collect())
+    results[f'render, {series} series (ms)'] = harness.measure(metrics.render, repeat=50)['p50_ms']
+    with tempfile.TemporaryDirectory() as directory, override_settings(METRICS_DIR=directory):
+        results['flush (ms)'] = harness.measure(metrics.flush, repeat=50)['p50_ms']
+        # Seven more workers' files, copies of this one
+        written = next(Path(directory).glob('*.json'))
+        for pid in range(7):
+            shutil.copy(written, Path(directory) / f'{pid}-0.json')
+        results['collect from 8 process files (ms)'] = harness.measure(metrics.collect, repeat=50)['p50_ms']
+    harness.report('Metrics', results, as_json=args.json)
+    harness.teardown(path, keep=bool(args.db))
+
+
+if __name__ == '__main__':
+    main()
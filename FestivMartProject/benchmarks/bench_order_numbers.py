@@ -0,0 +1,70 @@
+"""
+Order number uniqueness and throughput across processes.
+
+Each worker process draws --count numbers as fast as it can; the parent
+checks the union for duplicates and each worker's sequence for order.
+The old 'FM' + 8 random digits scheme is run at the same volume for
+comparison.
+
+    python benchmarks/bench_order_numbers.py --processes 8 --count 200000
+"""
+import multiprocessing
+import random
+import string
+import time
+
+import harness
+
+
+def draw(count):
+    from FestivMartApp.order_numbers import next_order_number
+
+    start = time.perf_counter()
+    numbers = [next_order_number() for _ in range(count)]
+    return numbers, time.perf_counter() - start
+
+
+def legacy(count):
+    return ['FM' + ''.join(random.choices(string.digits, k=8)) for _ in range(count)]
+
+
+def main():
+    p = harness.parser(__doc__)
+    p.add_argument('--processes', type=int, default=8)
+    p.add_argument('--count', type=int, default=200_000, help="Numbers per process")
+    args = p.parse_args()
+
+    import django
+    django.setup()
+
+    start = time.perf_counter()
+    with multiprocessing.get_context('fork').Pool(args.processes) as pool:
+        batches = pool.map(draw, [args.count] * args.processes)
+    elapsed = time.perf_counter() - start
+
+    total = args.processes * args.count
+    unique = len({n for numbers, _ in batches for n in numbers})
+    per_process = [args.count / seconds for _, seconds in batches]
+    legacy_numbers = legacy(total)
+
+    results = {
+        'snowflake': {
+            'processes': args.processes,
+            'numbers': total,
+            'duplicates': total - unique,
+            'ordered within each process': all(numbers == sorted(numbers) for numbers, _ in batches),
+            'length': len(batches[0][0][0]),
+            'example': batches[0][0][0],
+            'per_process_per_sec': round(min(per_process)),
+            'aggregate_per_sec (wall clock)': round(total / elapsed),
+        },
+        'legacy random digits': {
+            'numbers': total,
+            'duplicates': total - len(set(legacy_numbers)),
+        },
+    }
+    harness.report('Order numbers', results, as_json=args.json)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""
+Product detail API: uncached view vs. cached payload vs. conditional GET.
+
+    python benchmarks/bench_product_detail.py --products 100000
+"""
+import random
+
+import harness
+
+
+def legacy_product_detail_api(request, product_id):
+    """The view before caching: three queries and a fresh dict per request."""
+    from django.http import JsonResponse
+    from django.shortcuts import get_object_or_404
+
+    from FestivMartApp.models import Product
+    from FestivMartApp.product_detail import serialize_detail
+
+    product = get_object_or_404(Product.objects.select_related('category'), id=product_id)
+    related = Product.objects.filter(category_id=product.category_id, available=True).exclude(id=product.id)[:4]
+    return JsonResponse(serialize_detail(product, related))
+
+
+def main():
+    p = harness.parser(__doc__)
+    p.add_argument('--products', type=int, default=100_000)
+    p.add_argument('--categories', type=int, default=90)
+    p.add_argument('--repeat', type=int, default=500)
+    args = p.parse_args()
+    path = harness.setup(args.db)
+
+    from django.core.cache import caches
+    from django.test import RequestFactory
+
+    from FestivMartApp import views
+    from FestivMartApp.models import Category, Product
+
+    if not Product.objects.exists():
+        categories = Category.objects.bulk_create(Category(name=f'Category {i}') for i in range(args.categories))
+        batch = 5000
+        for start in range(0, args.products, batch):
+            Product.objects.bulk_create(
+                Product(name=f'Product {i}', description='Festive item ' * 10, price=100 + i % 900,
+                        category=categories[i % len(categories)], stock=10)
+                for i in range(start, min(start + batch, args.products))
+            )
+    for alias in caches:
+        caches[alias].clear()
+    ids = list(Product.objects.values_list('id', flat=True))
+    rng = random.Random(1)
+    hot = rng.sample(ids, 200)
+    factory = RequestFactory()
+    etags = {pk: views.product_detail_api(factory.get('/'), pk)['ETag'] for pk in hot}
+
+    def run(view, headers=None):
+        def once():
+            pk = rng.choice(hot)
+            view(factory.get('/', headers=headers(pk) if headers else None), pk)
+        return once
+
+    results = {
+        'before: uncached view': harness.measure(run(legacy_product_detail_api), repeat=args.repeat),
+        'after: cached payload (200)': harness.measure(run(views.product_detail_api), repeat=args.repeat),
+        'after: If-None-Match (304)': harness.measure(
+            run(views.product_detail_api, lambda pk: {'If-None-Match': etags[pk]}), repeat=args.repeat),
+    }
+    harness.report(f'Product detail API ({len(ids)} products, {settings_cache()})', results, as_json=args.json)
+    harness.teardown(path, keep=bool(args.db))
+
+
+def settings_cache():
+    from django.conf import settings
+    return ', '.join(f"{alias}: {options['BACKEND'].rsplit('.', 1)[-1]}" for alias, options in settings.CACHES.items())
+
+
+if __name__ == '__main__':
+    main()
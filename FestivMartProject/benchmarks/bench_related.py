@@ -0,0 +1,106 @@
+"""
+Related-products index: full rebuild time, incremental refresh per order
+and the detail-API lookup.
+
+    python benchmarks/bench_related.py --lines 10000000 --db /tmp/related.sqlite3
+"""
+import random
+import time
+
+import harness
+
+
+def seed(args):
+    """Raw executemany inserts; the ORM would dominate the run at 10M rows."""
+    from django.db import connection, transaction
+    from django.contrib.auth.models import User
+    from django.utils import timezone
+
+    from FestivMartApp.models import Category, Order, OrderItem, Product
+
+    categories = Category.objects.bulk_create(Category(name=f'Category {i}') for i in range(args.categories))
+    batch = 10_000
+    for start in range(0, args.products, batch):
+        Product.objects.bulk_create(
+            Product(name=f'Product {i}', description='', price=100, category=categories[i % len(categories)])
+            for i in range(start, min(start + batch, args.products))
+        )
+    product_ids = list(Product.objects.values_list('id', flat=True))
+    user = User.objects.create_user('bench', 'bench@example.com', 'pw')
+    rng = random.Random(42)
+    now = timezone.now().isoformat()
+    orders_table = Order._meta.db_table
+    items_table = OrderItem._meta.db_table
+    order_id, lines = 0, 0
+    with transaction.atomic(), connection.cursor() as cursor:
+        while lines < args.lines:
+            orders, items = [], []
+            for _ in range(batch):
+                order_id += 1
+                orders.append((order_id, user.pk, f'B{order_id}', now, now))
+                size = rng.randint(2, 6)
+                # Skewed popularity: a few products appear in many baskets
+                basket = {product_ids[int(len(product_ids) * rng.random() ** 3)] for _ in range(size)}
+                items.extend((order_id, pk) for pk in basket)
+            lines += len(items)
+            cursor.executemany(
+                f'INSERT INTO "{orders_table}" (id, user_id, order_number, status, full_name, email, phone, '
+                f'address, city, postal_code, subtotal, discount_amount, tax_amount, shipping_cost, total, '
+                f"payment_method, payment_status, created_at, updated_at) VALUES (%s, %s, %s, 'delivered', "
+                f"'', '', '', '', '', '', 0, 0, 0, 0, 0, 'cod', 'paid', %s, %s)",
+                orders,
+            )
+            cursor.executemany(
+                f'INSERT INTO "{items_table}" (order_id, product_id, product_name, quantity, unit_price, '
+                f"line_total) VALUES (%s, %s, '', 1, 0, 0)",
+                items,
+            )
+    return order_id, lines
+
+
+def main():
+    p = harness.parser(__doc__)
+    p.add_argument('--lines', type=int, default=1_000_000, help="Order lines to generate")
+    p.add_argument('--products', type=int, default=100_000)
+    p.add_argument('--categories', type=int, default=90)
+    args = p.parse_args()
+    path = harness.setup(args.db)
+
+    from FestivMartApp import related
+    from FestivMartApp.models import Order, OrderItem, Product
+
+    start = time.perf_counter()
+    if not OrderItem.objects.exists():
+        orders, lines = seed(args)
+    else:
+        orders, lines = Order.objects.count(), OrderItem.objects.count()
+    seeded = time.perf_counter() - start
+
+    start = time.perf_counter()
+    pairs, entries = related.rebuild_related_index()
+    rebuild = time.perf_counter() - start
+
+    order_ids = list(Order.objects.order_by('-id').values_list('id', flat=True)[:200])
+    product_ids = list(Product.objects.values_list('id', flat=True)[:5000])
+    rng = random.Random(7)
+    results = {
+        'dataset': {
+            'orders': orders, 'order lines': lines, 'products': Product.objects.count(),
+            'seed_s': round(seeded, 1),
+        },
+        'full rebuild': {
+            'seconds': round(rebuild, 1),
+            'co-purchase pairs': pairs,
+            'related entries': entries,
+        },
+        'incremental: record_order (re-counting an existing order)':
+            harness.measure(lambda: related.record_order(rng.choice(order_ids)), repeat=100),
+        'lookup: related_products(product)':
+            harness.measure(lambda: related.related_products(rng.choice(product_ids), 4), repeat=500),
+    }
+    harness.report('Related products index', results, as_json=args.json)
+    harness.teardown(path, keep=bool(args.db))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,203 @@
+"""
+Catalog readers next to cart and checkout writers on one SQLite file, in
+production mode (FestivMartApp/database.py). The first run sends every
+read to the primary. The second sends catalog reads to a replica, which a
+refresher process copies from the primary every REPLICA_REFRESH_SECONDS
+(FestivMartApp/replicas.py). Reports the throughput and latency of
+readers and writers, how long each refresh took, and the share of
+catalog queries the replica served.
+
+    python benchmarks/bench_replicas.py --readers 2 --writers 2 --threads 4 --duration 15
+"""
+import argparse
+import json
+import logging
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import harness
+
+MODES = {'primary': [], 'replica': ['replica1']}
+LOCAL_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+def configure(args):
+    # The settings read the switch when they load, on first use below
+    os.environ['FESTIVMART_SQLITE_PRODUCTION'] = '1'
+    from django.conf import settings
+
+    settings.DATABASES['default']['NAME'] = args.db
+    settings.DATABASES['replica1']['NAME'] = f'{args.db}.replica1'
+    settings.REPLICAS = MODES[args.mode]
+    # Each process caches for itself, so readers do not share a file cache
+    settings.CACHES = LOCAL_CACHE
+    settings.DEBUG = False
+    import django
+    django.setup()
+    logging.getLogger('django.request').setLevel(logging.CRITICAL)
+
+
+def refresher(args):
+    """Refresh the replica until the deadline; prints the refresh times."""
+    from django.conf import settings
+
+    from FestivMartApp import replicas
+
+    deadline = time.monotonic() + args.duration
+    seconds = []
+    while time.monotonic() < deadline:
+        seconds.append(replicas.refresh('replica1'))
+        time.sleep(settings.REPLICA_REFRESH_SECONDS)
+    print(json.dumps({'refreshes': seconds}))
+
+
+def shoppers(args):
+    """--threads readers or writers until the deadline; prints a JSON summary."""
+    from django.contrib.auth.models import User
+    from django.db import OperationalError, connection, connections
+
+    from FestivMartApp.models import Category, Product
+
+    categories = list(Category.objects.values_list('id', flat=True))
+    products = list(Product.objects.values_list('id', flat=True)[:200])
+    users = list(User.objects.filter(pk__in=args.user_ids))
+    connection.close()
+    address = {'full_name': 'Shopper', 'email': 's@example.com', 'phone': '1', 'address': 'x',
+               'city': 'Pune', 'postal_code': '411001'}
+    deadline = time.monotonic() + args.duration
+    latencies, outcomes, lock = [], {'ok': 0, 'locked': 0, 'other': 0}, threading.Lock()
+    queries = {'default': 0, 'replica1': 0}
+
+    def count(alias):
+        def wrapper(execute, sql, params, many, context):
+            queries[alias] += 1
+            return execute(sql, params, many, context)
+        return wrapper
+
+    def read(client, step):
+        category = categories[step % len(categories)]
+        return client.get(f'/api/products/?category={category}&min_price={step % 500}')
+
+    def write(client, step):
+        if step % 3:
+            return client.post('/api/cart/add/', {'product_id': products[step % len(products)]},
+                               content_type='application/json')
+        return client.post('/checkout/', address)
+
+    def shopper(user, offset):
+        for alias, wrapper in ((alias, count(alias)) for alias in queries):
+            connections[alias].execute_wrappers.append(wrapper)
+        client = None
+        step = offset * 1000
+        while time.monotonic() < deadline:
+            step += 1
+            start = time.perf_counter()
+            try:
+                if client is None:
+                    client = harness.client(user)
+                    response = None
+                else:
+                    response = (read if args.worker == 'reader' else write)(client, step)
+                outcome = 'ok' if response is None or response.status_code in (200, 302) else 'other'
+            except OperationalError as exc:
+                outcome = 'locked' if 'locked' in str(exc) else 'other'
+            elapsed = (time.perf_counter() - start) * 1000
+            with lock:
+                outcomes[outcome] += 1
+                latencies.append(elapsed)
+        connections.close_all()
+
+    threads = [threading.Thread(target=shopper, args=(user, i)) for i, user in enumerate(users)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    print(json.dumps({'latencies': latencies, 'outcomes': outcomes, 'queries': queries}))
+
+
+def summarize(results, duration):
+    latencies = sorted(ms for r in results for ms in r['latencies'])
+    outcomes = {key: sum(r['outcomes'][key] for r in results) for key in ('ok', 'locked', 'other')}
+    return {
+        'requests/s': round(len(latencies) / duration, 1),
+        'ok': outcomes['ok'],
+        'database is locked': outcomes['locked'],
+        'other errors': outcomes['other'],
+        'p50 ms': round(harness.percentile(latencies, 50), 1) if latencies else None,
+        'p99 ms': round(harness.percentile(latencies, 99), 1) if latencies else None,
+    }
+
+
+def run(mode, path, user_ids, args):
+    from FestivMartApp import replicas
+
+    def spawn(role, ids=()):
+        return subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), '--worker', role, '--mode', mode, '--db', path,
+             '--duration', str(args.duration), '--user-ids', ','.join(map(str, ids)) or '0'],
+            stdout=subprocess.PIPE, text=True,
+        )
+
+    if mode == 'replica':
+        # Start from a fresh copy, as a deployment running refresh_replicas --loop would
+        replicas.refresh('replica1')
+    shards = [user_ids[i::args.readers + args.writers] for i in range(args.readers + args.writers)]
+    procs = {
+        'readers': [spawn('reader', ids) for ids in shards[:args.readers]],
+        'writers': [spawn('writer', ids) for ids in shards[args.readers:]],
+    }
+    if mode == 'replica':
+        procs['refresher'] = [spawn('refresher')]
+    results = {role: [json.loads(proc.communicate()[0]) for proc in group] for role, group in procs.items()}
+    summary = {role: summarize(results[role], args.duration) for role in ('readers', 'writers')}
+    reads = {alias: sum(r['queries'][alias] for r in results['readers']) for alias in ('default', 'replica1')}
+    summary['readers']['queries on the replica'] = f"{reads['replica1'] / (sum(reads.values()) or 1):.0%}"
+    if mode == 'replica':
+        seconds = sorted(s for r in results['refresher'] for s in r['refreshes'])
+        summary['refreshes'] = {'count': len(seconds), 'p50 s': round(harness.percentile(seconds, 50), 3),
+                                'max s': round(seconds[-1], 3) if seconds else None}
+    return summary
+
+
+def main():
+    p = harness.parser(__doc__)
+    p.add_argument('--readers', type=int, default=2, help="Reader processes")
+    p.add_argument('--writers', type=int, default=2, help="Writer processes")
+    p.add_argument('--threads', type=int, default=4, help="Shoppers per process")
+    p.add_argument('--duration', type=float, default=15, help="Seconds per mode")
+    p.add_argument('--products', type=int, default=20_000)
+    p.add_argument('--worker', choices=('reader', 'writer', 'refresher'), help=argparse.SUPPRESS)
+    p.add_argument('--mode', choices=MODES, help=argparse.SUPPRESS)
+    p.add_argument('--user-ids', type=lambda v: [int(pk) for pk in v.split(',')], help=argparse.SUPPRESS)
+    args = p.parse_args()
+    if args.worker:
+        configure(args)
+        return refresher(args) if args.worker == 'refresher' else shoppers(args)
+
+    path = harness.setup(args.db)
+
+    from django.contrib.auth.models import User
+
+    from FestivMartApp.models import Category, Product
+
+    categories = [Category.objects.create(name=f'Festival Gifts {i}') for i in range(10)]
+    Product.objects.bulk_create(
+        Product(name=f'Diya {i}', description='', price=100 + i % 400, category=categories[i % 10], stock=10 ** 9)
+        for i in range(args.products)
+    )
+    user_ids = [User.objects.create(username=f'shopper{i}', email=f'shopper{i}@example.com').pk
+                for i in range((args.readers + args.writers) * args.threads)]
+    results = {
+        'processes': f'{args.readers} readers and {args.writers} writers x {args.threads} threads, '
+                     f'{args.duration:g} s per mode',
+        **{f'{mode} reads': run(mode, path, user_ids, args) for mode in MODES},
+    }
+    harness.report('Read replicas', results, as_json=args.json)
+    harness.teardown(path, keep=bool(args.db))
+
+
+if __name__ == '__main__':
+    main()
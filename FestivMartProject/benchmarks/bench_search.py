@@ -0,0 +1,106 @@
+"""
+Full-text search benchmark: FTS5 index vs. the admin's LIKE '%term%' scan.
+
+    python benchmarks/bench_search.py --products 1000000 --db /tmp/search.sqlite3
+"""
+import random
+import time
+
+import harness
+
+ADJECTIVES = ['brass', 'golden', 'handmade', 'silver', 'organic', 'festive', 'royal',
+              'classic', 'vintage', 'painted', 'scented', 'copper', 'wooden', 'silk',
+              'cotton', 'terracotta', 'embroidered', 'herbal', 'traditional', 'premium']
+NOUNS = ['diya', 'lamp', 'thali', 'kurta', 'saree', 'rangoli', 'lantern', 'incense',
+         'garland', 'kalash', 'candle', 'hamper', 'sweets', 'toran', 'idol', 'bell',
+         'bowl', 'scarf', 'shawl', 'tray', 'vase', 'mirror', 'basket', 'box', 'plate']
+
+
+def syllable_word(rng):
+    return ''.join(rng.choice('bcdfghjklmnprstvz') + rng.choice('aeiou') for _ in range(rng.randint(2, 4)))
+
+
+def populate(count, seed=7):
+    from FestivMartApp.models import Category, Product
+
+    rng = random.Random(seed)
+    root = Category.objects.create(name='Festival & Religious Items')
+    categories = [Category.objects.create(name=f'Sub {i}', parent=root) for i in range(6)]
+    brands = [syllable_word(rng) for _ in range(20000)]
+    filler = [syllable_word(rng) for _ in range(5000)]
+
+    batch, start = [], time.perf_counter()
+    for i in range(count):
+        name = f'{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {rng.choice(brands)}'
+        description = ' '.join(rng.choice(filler) for _ in range(12)) + f' {rng.choice(NOUNS)}'
+        batch.append(Product(
+            name=name.title(), description=description, price=rng.randint(50, 5000),
+            category=rng.choice(categories), is_seasonal=rng.random() < 0.2,
+        ))
+        if len(batch) == 5000:
+            Product.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        Product.objects.bulk_create(batch)
+    return time.perf_counter() - start, categories, brands
+
+
+def main():
+    p = harness.parser(__doc__)
+    p.add_argument('--products', type=int, default=1_000_000)
+    p.add_argument('--repeat', type=int, default=50)
+    args = p.parse_args()
+    path = harness.setup(args.db)
+
+    from django.db import connection
+    from django.db.models import Q
+
+    from FestivMartApp.models import Category, Product
+    from FestivMartApp.search import filter_queryset, search_product_ids
+
+    existing = Product.objects.count()
+    if existing < args.products:
+        load_seconds, categories, brands = populate(args.products - existing)
+    else:
+        load_seconds = 0.0
+        categories = list(Category.objects.filter(depth=1))
+    rng = random.Random(11)
+    sample_names = list(Product.objects.order_by('?').values_list('name', flat=True)[:200])
+    brand_terms = [n.split()[-1].lower() for n in sample_names]
+
+    cases = {
+        'brand (selective)': lambda: search_product_ids(rng.choice(brand_terms)),
+        'brand prefix': lambda: search_product_ids(rng.choice(brand_terms)[:4]),
+        'adjective + noun': lambda: search_product_ids(f'{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)}'),
+        'brand + category': lambda: search_product_ids(
+            rng.choice(brand_terms), categories=[rng.choice(categories).pk]),
+        'noun + seasonal': lambda: search_product_ids(rng.choice(NOUNS), seasonal=True),
+        'noun, page 3': lambda: search_product_ids(rng.choice(NOUNS), offset=40),
+    }
+    results = {}
+    for name, fn in cases.items():
+        pages = []
+        stats = harness.measure(lambda: pages.append(fn()), repeat=args.repeat)
+        # Pages of queries too broad to rank in full (search.RANK_LIMIT)
+        stats['truncated'] = f'{sum(page.truncated for page in pages) / len(pages):.0%}'
+        results[name] = stats
+
+    # The admin changelist counts and pages its search results; before the
+    # FTS index its search_fields compiled to LIKE '%term%' scans.
+    term = brand_terms[0]
+    like_qs = Product.objects.filter(Q(name__icontains=term) | Q(description__icontains=term))
+    results['admin search, LIKE scan (before)'] = harness.measure(like_qs.count, repeat=3, warmup=0)
+    fts_qs = filter_queryset(Product.objects.all(), term)
+    results['admin search, FTS filter (after)'] = harness.measure(fts_qs.count, repeat=args.repeat)
+
+    harness.report('FTS5 product search', {
+        'products': Product.objects.count(),
+        'load_seconds': round(load_seconds, 1),
+        'sqlite': connection.cursor().connection.execute('select sqlite_version()').fetchone()[0],
+        'queries': results,
+    }, as_json=args.json)
+    harness.teardown(path, keep=bool(args.db))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+"""
+Concurrent writers against one SQLite file: worker processes, each with
+a few threads, add to their carts and check out through the views for a
+fixed time, first with stock SQLite settings (rollback journal, deferred
+transactions, the driver's 5 s timeout, a connection per request, no
+retries), then in production mode (FestivMartApp/database.py, switched on
+through FESTIVMART_SQLITE_PRODUCTION in each worker). Reports
+throughput, latency and "database is locked" failures of each.
+
+    python benchmarks/bench_sqlite_writers.py --processes 4 --threads 4 --duration 15
+"""
+import argparse
+import json
+import logging
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import harness
+
+# FESTIVMART_SQLITE_PRODUCTION per mode
+MODES = {'stock': '0', 'production': '1'}
+
+
+def worker(args):
+    """One worker process: --threads shoppers writing until the deadline; prints a JSON summary."""
+    # The settings read the switch when they load, on first use below
+    os.environ['FESTIVMART_SQLITE_PRODUCTION'] = MODES[args.mode]
+    from django.conf import settings
+
+    settings.DATABASES['default']['NAME'] = args.db
+    settings.DEBUG = False
+    import django
+    django.setup()
+    # Failed requests are counted, not logged
+    logging.getLogger('django.request').setLevel(logging.CRITICAL)
+
+    from django.contrib.auth.models import User
+    from django.db import OperationalError, connection
+
+    from FestivMartApp import metrics
+    from FestivMartApp.models import Product
+
+    products = list(Product.objects.values_list('id', flat=True))
+    users = list(User.objects.filter(pk__in=args.user_ids))
+    connection.close()
+    address = {'full_name': 'Shopper', 'email': 's@example.com', 'phone': '1', 'address': 'x',
+               'city': 'Pune', 'postal_code': '411001'}
+    deadline = time.monotonic() + args.duration
+    latencies, outcomes, lock = [], {'ok': 0, 'locked': 0, 'other': 0}, threading.Lock()
+    errors = []
+
+    def shopper(user, offset):
+        client = None
+        step = offset
+        while time.monotonic() < deadline:
+            step += 1
+            start = time.perf_counter()
+            try:
+                if client is None:
+                    # Logging in writes the session, so it can fail on a lock too
+                    client = harness.client(user)
+                    response = None
+                elif step % 3:
+                    response = client.post('/api/cart/add/', {'product_id': products[step % len(products)]},
+                                           content_type='application/json')
+                else:
+                    response = client.post('/checkout/', address)
+                outcome = 'ok' if response is None or response.status_code in (200, 302) else 'other'
+            except OperationalError as exc:
+                outcome = 'locked' if 'locked' in str(exc) else 'other'
+                errors.append(str(exc))
+            except Exception as exc:  # noqa: BLE001 - counted and reported
+                outcome = 'other'
+                errors.append(repr(exc))
+            elapsed = (time.perf_counter() - start) * 1000
+            with lock:
+                outcomes[outcome] += 1
+                latencies.append(elapsed)
+        connection.close()
+
+    threads = [threading.Thread(target=shopper, args=(user, i)) for i, user in enumerate(users)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    retries = sum(v for (name, labels), v in metrics.collect().items() if name == 'festivmart_db_lock_retries_total')
+    print(json.dumps({'latencies': latencies, 'outcomes': outcomes, 'retries': retries, 'errors': errors[:3]}))
+
+
+def run(mode, path, user_ids, args):
+    from django.db import connection
+
+    # Journal mode is a property of the file; switch it while nobody is connected
+    with connection.cursor() as cursor:
+        cursor.execute(f"PRAGMA journal_mode = {'WAL' if mode == 'production' else 'DELETE'}")
+    connection.close()
+    per_process = [user_ids[i::args.processes] for i in range(args.processes)]
+    procs = [
+        subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), '--worker', '--mode', mode, '--db', path,
+             '--duration', str(args.duration), '--user-ids', ','.join(map(str, ids))],
+            stdout=subprocess.PIPE, text=True,
+        )
+        for ids in per_process
+    ]
+    results = [json.loads(proc.communicate()[0]) for proc in procs]
+    latencies = sorted(ms for r in results for ms in r['latencies'])
+    outcomes = {key: sum(r['outcomes'][key] for r in results) for key in results[0]['outcomes']}
+    summary = {
+        'requests': len(latencies),
+        'requests/s': round(len(latencies) / args.duration, 1),
+        'ok': outcomes['ok'],
+        'database is locked': outcomes['locked'],
+        'other errors': outcomes['other'],
+        'lock retries': sum(r['retries'] for r in results),
+        'p50 ms': round(harness.percentile(latencies, 50), 1) if latencies else None,
+        'p99 ms': round(harness.percentile(latencies, 99), 1) if latencies else None,
+    }
+    errors = [e for r in results for e in r['errors']]
+    if errors:
+        summary['first error'] = errors[0]
+    return summary
+
+
+def main():
+    p = harness.parser(__doc__)
+    p.add_argument('--processes', type=int, default=4)
+    p.add_argument('--threads', type=int, default=4, help="Shoppers per process")
+    p.add_argument('--duration', type=float, default=15, help="Seconds per mode")
+    p.add_argument('--products', type=int, default=50)
+    p.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    p.add_argument('--mode', choices=MODES, help=argparse.SUPPRESS)
+    p.add_argument('--user-ids', type=lambda v: [int(pk) for pk in v.split(',')], help=argparse.SUPPRESS)
+    args = p.parse_args()
+    if args.worker:
+        return worker(args)
+
+    path = harness.setup(args.db)
+
+    from django.contrib.auth.models import User
+
+    from FestivMartApp.models import Category, Product
+
+    category = Category.objects.create(name='Festival Gifts')
+    Product.objects.bulk_create(
+        Product(name=f'Diya {i}', description='', price=100, category=category, stock=10 ** 9)
+        for i in range(args.products)
+    )
+    user_ids = [User.objects.create(username=f'writer{i}', email=f'writer{i}@example.com').pk
+                for i in range(args.processes * args.threads)]
+    results = {
+        'writers': f'{args.processes} processes x {args.threads} threads, {args.duration:g} s per mode',
+        **{mode: run(mode, path, user_ids, args) for mode in MODES},
+    }
+    harness.report('Concurrent SQLite writers', results, as_json=args.json)
+    harness.teardown(path, keep=bool(args.db))
+
+
+if __name__ == '__main__':
+    main()
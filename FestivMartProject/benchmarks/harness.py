@@ -0,0 +1,120 @@
+"""
+Shared setup for the benchmark scripts in this directory.
+
+Benchmarks never touch db.sqlite3: they run against a throwaway SQLite
+file (or one passed with --db, so an expensive dataset can be reused).
+
+    python benchmarks/bench_search.py --products 1000000 --db /tmp/bench.sqlite3
+"""
+import argparse
+import glob
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_DIR not in sys.path:
+    sys.path.insert(0, PROJECT_DIR)
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'FestivMartProject.settings')
+
+
+def parser(description):
+    p = argparse.ArgumentParser(description=description)
+    p.add_argument('--db', help="SQLite file to use (kept afterwards); default is a temp file")
+    p.add_argument('--json', action='store_true', help="Print the report as JSON only")
+    return p
+
+
+def setup(db_path=None, options=None):
+    """Point Django at a benchmark database, migrate it and return its path."""
+    import django
+    from django.conf import settings
+
+    path = db_path or tempfile.mktemp(prefix='festivmart-bench-', suffix='.sqlite3')
+    settings.DATABASES['default']['NAME'] = path
+    for alias in settings.REPLICAS:
+        # Replicas of the benchmark database, unused until refreshed
+        settings.DATABASES[alias]['NAME'] = f'{path}.{alias}'
+    if options:
+        settings.DATABASES['default'].setdefault('OPTIONS', {}).update(options)
+    settings.DEBUG = False
+    django.setup()
+
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0)
+    return path
+
+
+def client(user=None):
+    """A Django test client (in-process requests), optionally logged in."""
+    from django.conf import settings
+    from django.test import Client
+
+    if 'testserver' not in settings.ALLOWED_HOSTS:
+        settings.ALLOWED_HOSTS.append('testserver')
+    c = Client()
+    if user is not None:
+        c.force_login(user)
+    return c
+
+
+def count_queries(fn):
+    """Run fn and return (result, number of SQL queries it issued)."""
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    with CaptureQueriesContext(connection) as ctx:
+        result = fn()
+    return result, len(ctx.captured_queries)
+
+
+def teardown(path, keep):
+    if not keep:
+        for name in glob.glob(glob.escape(path) + '*'):
+            os.remove(name)
+
+
+def measure(fn, repeat=50, warmup=3):
+    """Run fn repeatedly and return latency stats in milliseconds."""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        'runs': repeat,
+        'mean_ms': round(statistics.fmean(samples), 3),
+        'p50_ms': round(percentile(samples, 50), 3),
+        'p95_ms': round(percentile(samples, 95), 3),
+        'p99_ms': round(percentile(samples, 99), 3),
+        'max_ms': round(samples[-1], 3),
+    }
+
+
+def percentile(sorted_samples, pct):
+    if not sorted_samples:
+        return 0.0
+    k = (len(sorted_samples) - 1) * pct / 100
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_samples) - 1)
+    return sorted_samples[lo] + (sorted_samples[hi] - sorted_samples[lo]) * (k - lo)
+
+
+def report(title, data, as_json=False):
+    if as_json:
+        print(json.dumps(data, indent=2, default=str))
+        return
+    print(f"\n== {title} ==")
+    for key, value in data.items():
+        if isinstance(value, dict):
+            print(f"  {key}:")
+            for k, v in value.items():
+                print(f"    {k}: {v}")
+        else:
+            print(f"  {key}: {value}")
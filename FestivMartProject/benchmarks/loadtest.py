@@ -0,0 +1,569 @@
+"""
+End-to-end load test: virtual shoppers walking through the shop over HTTP,
+against a server this script starts (or --url), with per-endpoint p50/p95/
+p99 latency, throughput and error rates.
+
+Each virtual user repeats a journey until --duration is up:
+
+    landing -> seasonal -> shop / catalog API -> search -> product modal
+    (detail API + image) -> cart add / update / batch -> coupon -> cart
+    -> checkout
+
+Anonymous shoppers are bounced to the login page at checkout. Logged-in
+shoppers (--logged-in, a share of the virtual users) log in first, place
+the order, look at the order page, dashboard and score, and log out;
+sellers among them also open add-product and import one product. Every
+named URL of FestivMartApp.urls is requested by some step, and the report
+lists any that were not.
+
+Without --url the script seeds a throwaway database with seed_data's
+generator (or reuses --db), starts a threaded Django server on it in a
+subprocess and a local stand-in image host for the image proxy. Logged-in
+shoppers are generated users, who all share seed_data's password.
+
+    python benchmarks/loadtest.py --concurrency 16 --duration 60
+    python benchmarks/loadtest.py --db /tmp/big.sqlite3 --output run.json
+    python benchmarks/loadtest.py --baseline run.json --tolerance 0.2
+
+--output writes the report as JSON; --baseline compares p95 latency and
+error rates per endpoint with an earlier report and exits with status 1
+on a regression. The load generator runs in this process, so on a small
+machine it competes with the server for CPU; compare runs made on the
+same machine with the same options.
+"""
+import argparse
+import http.cookiejar
+import io
+import json
+import logging
+import os
+import random
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import harness
+
+COUPONS = ('FESTIV20', 'SAVE10', 'HOLI15', 'DIWALI25')
+TIMEOUT = 30
+
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    """Redirects are requests of their own: time them separately."""
+
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.error_samples = defaultdict(list)
+        self.outcomes = defaultdict(int)
+        self.recording = False
+
+    def record(self, name, ms, error=None):
+        if not self.recording:
+            return
+        with self.lock:
+            self.samples[name].append(ms)
+            if error:
+                self.errors[name] += 1
+                if len(self.error_samples[name]) < 5:
+                    self.error_samples[name].append(error)
+
+    def outcome(self, name):
+        if self.recording:
+            with self.lock:
+                self.outcomes[name] += 1
+
+
+class Response:
+    def __init__(self, status, body, headers):
+        self.status = status
+        self.body = body
+        self.headers = headers
+
+    def json(self):
+        return json.loads(self.body)
+
+
+class Shopper:
+    """One virtual user: a cookie jar and a journey."""
+
+    def __init__(self, base, stats, rng, context, account=None):
+        self.base = base
+        self.stats = stats
+        self.rng = rng
+        self.context = context
+        self.account = account
+        self.jar = http.cookiejar.CookieJar()
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(self.jar), NoRedirect)
+        self.product_ids = []
+        self.words = []
+
+    def csrf_token(self):
+        return next((c.value for c in self.jar if c.name == 'csrftoken'), '')
+
+    def request(self, name, path, method='GET', form=None, payload=None, body=None, content_type=None,
+                expect=(200,)):
+        headers = {}
+        data = None
+        if form is not None:
+            data = urllib.parse.urlencode({**form, 'csrfmiddlewaretoken': self.csrf_token()}).encode()
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        elif payload is not None:
+            data = json.dumps(payload).encode()
+            headers['Content-Type'] = 'application/json'
+        elif body is not None:
+            data = body
+            headers['Content-Type'] = content_type
+            headers['X-CSRFToken'] = self.csrf_token()
+        request = urllib.request.Request(self.base + path, data=data, headers=headers, method=method)
+        start = time.perf_counter()
+        try:
+            with self.opener.open(request, timeout=TIMEOUT) as response:
+                result = Response(response.status, response.read(), response.headers)
+        except urllib.error.HTTPError as exc:
+            result = Response(exc.code, exc.read(), exc.headers)
+        except (OSError, ValueError) as exc:
+            self.stats.record(name, (time.perf_counter() - start) * 1000, f'{type(exc).__name__}: {exc}')
+            return None
+        elapsed = (time.perf_counter() - start) * 1000
+        error = None if result.status in expect else f'HTTP {result.status} for {method} {path}'
+        self.stats.record(name, elapsed, error)
+        return result if error is None else None
+
+    def remember(self, products):
+        for product in products:
+            self.product_ids.append(product['id'])
+            self.words.extend(w for w in product['name'].split() if len(w) > 3 and w.isalpha())
+        del self.product_ids[:-200], self.words[:-200]
+
+    def pick_product(self):
+        # Half from what this shopper has seen, half from across the catalog
+        if self.product_ids and self.rng.random() < 0.5:
+            return self.rng.choice(self.product_ids)
+        return self.rng.choice(self.context['product_ids'])
+
+    # Journey steps
+
+    def browse(self):
+        self.request('home', '/')
+        self.request('seasonal', '/seasonal/')
+        if self.rng.random() < 0.5:
+            self.request('shop', '/shop/')
+        params = {'sort': self.rng.choice(('newest', 'price-low', 'price-high'))}
+        if self.rng.random() < 0.3:
+            params['seasonal'] = '1'
+        page = self.request('catalog_api', '/api/products/?' + urllib.parse.urlencode(params))
+        if page:
+            data = page.json()
+            self.remember(data['products'])
+            if data['next_cursor'] and self.rng.random() < 0.5:
+                params['cursor'] = data['next_cursor']
+                page = self.request('catalog_api', '/api/products/?' + urllib.parse.urlencode(params))
+                if page:
+                    self.remember(page.json()['products'])
+        if self.words:
+            found = self.request('search_api', '/api/search/?' + urllib.parse.urlencode({'q': self.rng.choice(self.words)}))
+            if found:
+                self.remember(found.json()['results'])
+        self.request('year_dates_api', '/api/dates/')
+        for _ in range(self.rng.randint(1, 3)):
+            self.product_modal(self.pick_product())
+        self.request('leaderboard_api', '/api/leaderboard/')
+
+    def product_modal(self, product_id):
+        detail = self.request('product_detail_api', f'/api/product/{product_id}/', expect=(200, 404))
+        if not detail or detail.status != 200:
+            return
+        self.image(detail.json()['image'])
+        if self.context.get('image_host'):
+            # Linked (image_url) products go through the proxy
+            self.image(self.context['proxy_urls'][product_id % len(self.context['proxy_urls'])])
+
+    def image(self, url):
+        path = urllib.parse.urlsplit(url).path
+        self.request('image_placeholder' if path.startswith('/img/placeholder/') else 'image_proxy', path)
+
+    def shop_cart(self):
+        for _ in range(self.rng.randint(1, 3)):
+            # Out of stock or unavailable products are part of the traffic
+            self.request('cart_add', '/api/cart/add/', 'POST',
+                         payload={'product_id': self.pick_product(), 'quantity': self.rng.randint(1, 2)},
+                         expect=(200, 404))
+        cart = self.request('cart_data', '/api/cart/data/')
+        items = cart.json()['items'] if cart else []
+        if items:
+            item = self.rng.choice(items)
+            self.request('cart_update', '/api/cart/update/', 'POST',
+                         payload={'item_id': item['id'], 'quantity': self.rng.randint(1, 3)})
+        self.request('cart_batch', '/api/cart/batch/', 'POST', payload={'operations': [
+            {'op': 'add', 'product_id': self.pick_product(), 'quantity': 1},
+            {'op': 'set', 'product_id': self.pick_product(), 'quantity': 2},
+        ]}, expect=(200, 400))
+        if self.rng.random() < 0.5:
+            self.request('cart_apply_coupon', '/api/cart/coupon/', 'POST', payload={'code': self.rng.choice(COUPONS)})
+        if len(items) > 1 and self.rng.random() < 0.3:
+            self.request('cart_remove', '/api/cart/remove/', 'POST', payload={'item_id': items[0]['id']})
+        self.request('cart', '/cart/')
+
+    def anonymous_journey(self):
+        self.browse()
+        self.shop_cart()
+        self.request('checkout', '/checkout/', expect=(302,))
+        self.request('login', '/login/')
+        if self.rng.random() < 0.2:
+            self.request('signup', '/signup/')
+
+    def logged_in_journey(self):
+        username, email, is_seller = self.account
+        self.request('login', '/login/')
+        login = self.request('login', '/login/', 'POST', form={'email': email, 'password': self.context['password']},
+                             expect=(302,))
+        if login is None:
+            return
+        self.browse()
+        self.request('dashboard', '/dashboard/')
+        self.shop_cart()
+        page = self.request('checkout', '/checkout/', expect=(200, 302))
+        if page and page.status == 200:
+            city = self.rng.choice(('Mumbai', 'Pune', 'Jaipur', 'Kochi'))
+            placed = self.request('checkout', '/checkout/', 'POST', form={
+                'full_name': username, 'email': email, 'phone': '9876543210', 'address': '12, MG Road',
+                'city': city, 'postal_code': '400001', 'payment_method': self.rng.choice(('cod', 'upi', 'card')),
+            }, expect=(200, 302))
+            if placed and placed.status == 302:
+                self.stats.outcome('orders placed')
+                self.request('order_success', urllib.parse.urlsplit(placed.headers['Location']).path)
+            elif placed:
+                # The form again, with an error: some item ran out of stock
+                self.stats.outcome('checkouts rejected (stock)')
+        self.request('score', '/score/')
+        if is_seller:
+            self.request('add_product', '/add-product/')
+            if self.rng.random() < 0.2:
+                line = json.dumps({'name': f'Load test lamp {self.rng.randrange(10 ** 9)}', 'price': 99,
+                                   'category': self.context['category']})
+                self.request('import_products_api', '/api/products/import/', 'POST',
+                             body=(line + '\n').encode(), content_type='application/x-ndjson')
+        self.request('logout', '/logout/', expect=(302,))
+
+    def run(self, deadline, think):
+        journeys = 0
+        while time.monotonic() < deadline:
+            # A fresh visit: new cookies, new session
+            self.jar.clear()
+            if self.account:
+                self.logged_in_journey()
+            else:
+                self.anonymous_journey()
+            journeys += 1
+            if think:
+                time.sleep(self.rng.expovariate(1 / think))
+        return journeys
+
+
+def image_host():
+    """A local stand-in for sellers' image hosts."""
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.effect_noise((1200, 900), 50).convert('RGB').save(buffer, 'JPEG', quality=85)
+    body = buffer.getvalue()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header('Content-Type', 'image/jpeg')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class OneLineFormatter(logging.Formatter):
+    def formatException(self, exc_info):
+        return f'  {exc_info[0].__name__}: {exc_info[1]}'
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def serve(args):
+    """Run the shop on --db with a threaded WSGI server (the --serve subprocess)."""
+    harness.setup(args.db)
+    from django.conf import settings
+    from django.core.servers.basehttp import run
+    from django.core.wsgi import get_wsgi_application
+
+    settings.CACHES['default']['LOCATION'] = args.cache_dir
+    settings.IMAGE_PROXY_CACHE_DIR = os.path.join(args.cache_dir, 'images')
+    settings.IMAGE_PROXY_ALLOW_PRIVATE = True
+    application = get_wsgi_application()
+    # After get_wsgi_application(), which configures logging again: no access
+    # log, but server errors and their exception go to stderr
+    logging.getLogger('django.server').setLevel(logging.ERROR)
+    errors = logging.StreamHandler()
+    errors.setFormatter(OneLineFormatter('%(message)s'))
+    logging.getLogger('django.request').addHandler(errors)
+    run('127.0.0.1', args.port, application, threading=True)
+
+
+def start_server(db, cache_dir):
+    port = free_port()
+    process = subprocess.Popen([sys.executable, __file__, '--serve', '--db', db, '--port', str(port),
+                                '--cache-dir', cache_dir])
+    base = f'http://127.0.0.1:{port}'
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(base + '/api/dates/', timeout=5).read()
+            return process, base
+        except OSError:
+            if process.poll() is not None:
+                break
+            time.sleep(0.2)
+    process.kill()
+    raise SystemExit('The server did not start')
+
+
+def prepare(args):
+    """Seed the database if it has no products; return the journeys' shared context."""
+    from django.conf import settings
+
+    settings.CACHES['default']['LOCATION'] = args.cache_dir
+    from django.contrib.auth.models import User
+
+    from FestivMartApp.models import Category, Product
+
+    if not Product.objects.filter(pk__gt=5).exists():
+        import contextlib
+
+        import seed_data
+
+        print(f"Seeding {args.products} products, {args.users} users, {args.orders} orders...", file=sys.stderr)
+        with contextlib.redirect_stdout(sys.stderr):
+            seed_data.create_initial_data()
+            seed_data.generate(products=args.products, users=args.users, orders=args.orders,
+                               carts=args.users // 5, seed=args.seed)
+
+    rng = random.Random(args.seed)
+    ids = list(Product.objects.filter(available=True).order_by('-pk').values_list('pk', flat=True)[:5000])
+    accounts = list(
+        User.objects.filter(is_staff=False, email__endswith='@example.com', profile__isnull=False)
+        .order_by('pk').values_list('username', 'email', 'profile__is_business')[:5000]
+    )
+    sellers = [a for a in accounts if a[2]]
+    rng.shuffle(accounts)
+    leaf = Category.objects.filter(subcategories__isnull=True).order_by('pk').values_list('breadcrumb', flat=True).first()
+    return {
+        'product_ids': ids,
+        'accounts': accounts,
+        'sellers': sellers,
+        'password': args.password,
+        'category': leaf,
+    }
+
+
+def summarize(stats, seconds):
+    endpoints = {}
+    total = errors = 0
+    for name in sorted(stats.samples):
+        samples = sorted(stats.samples[name])
+        count, failed = len(samples), stats.errors[name]
+        total += count
+        errors += failed
+        endpoints[name] = {
+            'requests': count,
+            'errors': failed,
+            'error_rate': round(failed / count, 4),
+            'rps': round(count / seconds, 2),
+            'mean_ms': round(statistics.fmean(samples), 2),
+            'p50_ms': round(harness.percentile(samples, 50), 2),
+            'p95_ms': round(harness.percentile(samples, 95), 2),
+            'p99_ms': round(harness.percentile(samples, 99), 2),
+            'max_ms': round(samples[-1], 2),
+        }
+        if stats.error_samples[name]:
+            endpoints[name]['sample_errors'] = stats.error_samples[name]
+    return {
+        'requests': total,
+        'errors': errors,
+        'error_rate': round(errors / total, 4) if total else 0.0,
+        'throughput_rps': round(total / seconds, 1),
+    }, endpoints
+
+
+def compare(report, baseline, tolerance):
+    """Endpoints whose p95 or error rate got worse than `baseline` by more than `tolerance`."""
+    regressions = []
+    for name, now in report['endpoints'].items():
+        before = baseline.get('endpoints', {}).get(name)
+        if not before:
+            continue
+        if now['p95_ms'] > before['p95_ms'] * (1 + tolerance) and now['p95_ms'] - before['p95_ms'] > 1:
+            regressions.append(f"{name}: p95 {before['p95_ms']} -> {now['p95_ms']} ms")
+        if now['error_rate'] > before['error_rate'] + 0.01:
+            regressions.append(f"{name}: error rate {before['error_rate']} -> {now['error_rate']}")
+    return regressions
+
+
+def print_table(report):
+    totals = report['totals']
+    print(f"\n== Load test: {report['config']['concurrency']} users, {report['config']['duration']}s ==")
+    print(f"  {totals['requests']} requests, {totals['throughput_rps']} req/s, "
+          f"{totals['errors']} errors ({totals['error_rate']:.2%}), {report['journeys']} journeys")
+    for name, count in report['outcomes'].items():
+        print(f"  {name}: {count}")
+    print(f"\n  {'endpoint':<22}{'reqs':>7}{'err%':>7}{'rps':>8}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}")
+    for name, row in report['endpoints'].items():
+        print(f"  {name:<22}{row['requests']:>7}{row['error_rate']:>7.1%}{row['rps']:>8}"
+              f"{row['p50_ms']:>9}{row['p95_ms']:>9}{row['p99_ms']:>9}{row['max_ms']:>9}")
+    if report['not_covered']:
+        print(f"\n  not requested: {', '.join(report['not_covered'])}")
+    for name, row in report['endpoints'].items():
+        for error in row.get('sample_errors', []):
+            print(f"  ! {name}: {error}")
+
+
+def main():
+    p = harness.parser(__doc__)
+    p.add_argument('--url', help="Load-test a running server instead of starting one (it must use --db)")
+    p.add_argument('--concurrency', type=int, default=8, help="Virtual users")
+    p.add_argument('--duration', type=float, default=30, help="Seconds of measured load")
+    p.add_argument('--warmup', type=float, default=5, help="Seconds of load before measuring")
+    p.add_argument('--logged-in', type=float, default=0.3, help="Share of virtual users who log in")
+    p.add_argument('--think', type=float, default=0.0, help="Mean seconds between journeys")
+    p.add_argument('--seed', type=int, default=1)
+    p.add_argument('--products', type=int, default=5000, help="Products to seed into an empty database")
+    p.add_argument('--users', type=int, default=500)
+    p.add_argument('--orders', type=int, default=2000)
+    p.add_argument('--password', default='password', help="Password of the seeded users")
+    p.add_argument('--output', help="Write the JSON report to this file")
+    p.add_argument('--baseline', help="Earlier JSON report to compare with")
+    p.add_argument('--tolerance', type=float, default=0.2, help="Allowed p95 slowdown against --baseline")
+    p.add_argument('--serve', action='store_true', help=argparse.SUPPRESS)
+    p.add_argument('--port', type=int, help=argparse.SUPPRESS)
+    p.add_argument('--cache-dir', help=argparse.SUPPRESS)
+    args = p.parse_args()
+    if args.serve:
+        return serve(args)
+
+    # The server and the seeding share a cache directory of their own
+    args.cache_dir = tempfile.mkdtemp(prefix='festivmart-loadtest-')
+    path = harness.setup(args.db)
+    context = prepare(args)
+    process = None
+    if args.url:
+        base = args.url.rstrip('/')
+    else:
+        process, base = start_server(path, args.cache_dir)
+        host = image_host()
+        from FestivMartApp import image_proxy
+
+        context['image_host'] = host
+        context['proxy_urls'] = [
+            image_proxy.proxy_url(f'http://127.0.0.1:{host.server_address[1]}/seller/{i}.jpg', 'medium')
+            for i in range(200)
+        ]
+
+    stats = Stats()
+    rng = random.Random(args.seed)
+    logged_in = round(args.concurrency * args.logged_in)
+    accounts = context['accounts']
+    if logged_in and not accounts:
+        raise SystemExit('No generated users to log in with; seed the database with seed_data.py')
+    shoppers = []
+    for i in range(args.concurrency):
+        account = None
+        if i < logged_in:
+            # Every fourth logged-in shopper is a seller, if there are any
+            pool = context['sellers'] if i % 4 == 0 and context['sellers'] else accounts
+            account = pool[i % len(pool)]
+        shoppers.append(Shopper(base, stats, random.Random(rng.random()), context, account))
+
+    start = time.monotonic()
+    deadline = start + args.warmup + args.duration
+    journeys = [0] * len(shoppers)
+
+    def drive(i):
+        journeys[i] = shoppers[i].run(deadline, args.think)
+
+    threads = [threading.Thread(target=drive, args=(i,), daemon=True) for i in range(len(shoppers))]
+    for thread in threads:
+        thread.start()
+    time.sleep(args.warmup)
+    stats.recording = True
+    measured_from = time.monotonic()
+    for thread in threads:
+        thread.join()
+    stats.recording = False
+    seconds = time.monotonic() - measured_from
+
+    from django.urls import get_resolver
+
+    totals, endpoints = summarize(stats, seconds)
+    from FestivMartApp.models import Product, UserProfile
+
+    names = sorted(name for name in get_resolver().reverse_dict if isinstance(name, str))
+    report = {
+        'config': {
+            'url': base, 'concurrency': args.concurrency, 'logged_in': logged_in, 'duration': args.duration,
+            'warmup': args.warmup, 'think': args.think, 'seed': args.seed,
+            'products': Product.objects.count(), 'users': UserProfile.objects.count(),
+        },
+        'totals': totals,
+        'journeys': sum(journeys),
+        'outcomes': dict(stats.outcomes),
+        'endpoints': endpoints,
+        'not_covered': [name for name in names if name not in endpoints],
+    }
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        report['regressions'] = regressions
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_table(report)
+        for line in regressions:
+            print(f"  REGRESSION {line}")
+
+    if process:
+        process.terminate()
+        process.wait()
+        context['image_host'].shutdown()
+    shutil.rmtree(args.cache_dir, ignore_errors=True)
+    harness.teardown(path, keep=bool(args.db))
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,14 +1,118 @@
+"""
+Seed data for FestivMart.
+
+    python seed_data.py
+    python seed_data.py --products 1000000 --users 100000 --orders 500000 --seed 7
+
+Without sizes this creates what it always has: the admin user, the
+category tree, two seasons, one occasion and five demo products. With
+sizes it then generates a synthetic shop on top of them for load tests:
+
+* users with profiles, about 1 in 20 of them business sellers; every
+  generated user logs in with --password;
+* a festival calendar (a season around each festival and the festival
+  day as an occasion) for last, this and next year;
+* products spread over the CATEGORIES_DATA taxonomy with per-category
+  weights and log-normal prices, seasonal products concentrated in the
+  festival and gift categories, and a Pareto-like split across sellers;
+* open carts (of users and of anonymous sessions) and orders with 1-5
+  items, both picking products and buyers with a Zipf-like skew, so a
+  small head of products and customers gets most of the traffic.
+
+Rows are generated in chunks of --batch-size, each chunk from its own
+random generator seeded with (--seed, table, chunk number), and written
+with executemany in one transaction per chunk. --workers generates chunks
+in a process pool; the parent writes them in order, so the data only
+depends on the seed, --today and the rows already in the database, not on
+the number of workers. Order lines and totals are filled in SQL from the
+product prices, the way checkout computes them. Generated order numbers
+use the highest Snowflake worker id, which live processes never get, and
+a run spreads its orders over the time after the newest existing order,
+so they never repeat an earlier run's numbers; a run that would need more
+than 128 orders in a millisecond of that window stops before writing.
+
+The points ledger, leaderboard and related-products index are rebuilt at
+the end (the FTS triggers index products as they are inserted), unless
+--skip-derived is given. Use --db to seed a scratch SQLite file instead of
+the project database.
+"""
+import argparse
+import collections
+import datetime
+import itertools
+import math
+import multiprocessing
 import os
+import random
+import time
+from datetime import timedelta
+
 import django
-import datetime
 from django.utils import timezone
-from datetime import timedelta
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'FestivMartProject.settings')
 django.setup()
 
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
 from django.contrib.auth.models import User
-from FestivMartApp.models import Category, Season, Occasion, Product
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.models import Max
+
+from FestivMartApp import merchandising, order_numbers, points, pricing, product_detail, related
+from FestivMartApp.models import (
+    Cart, CartItem, Category, Occasion, Order, OrderItem, Product, Season, UserProfile,
+)
+
+CATEGORIES_DATA = {
+    "Fashion & Apparel": [
+        "Men's Clothing", "Women's Clothing", "Kids' Wear", "Ethnic Wear", "Footwear", "Accessories (belts, caps, scarves)"
+    ],
+    "Electronics & Gadgets": [
+        "Mobile Phones", "Laptops & Computers", "Headphones & Audio", "Smart Watches", "Cameras", "Computer Accessories"
+    ],
+    "Home & Living": [
+        "Furniture", "Home Décor", "Kitchenware", "Storage & Organization", "Lighting", "Bedding & Bath"
+    ],
+    "Beauty & Personal Care": [
+        "Skincare", "Haircare", "Makeup", "Fragrances", "Grooming Tools", "Organic / Herbal Products"
+    ],
+    "Grocery & Food": [
+        "Fruits & Vegetables", "Packaged Foods", "Snacks & Beverages", "Spices & Masalas", "Sweets & Desserts", "Organic Foods"
+    ],
+    "Health & Wellness": [
+        "Fitness Equipment", "Yoga Accessories", "Supplements", "Ayurvedic Products", "Medical Devices"
+    ],
+    "Sports & Outdoors": [
+        "Sports Equipment", "Gym Accessories", "Outdoor Gear", "Cycling & Hiking", "Camping Products"
+    ],
+    "Books, Stationery & Education": [
+        "Books (Academic, Fiction, Non-fiction)", "Study Materials", "Office Supplies", "Art & Craft Supplies", "School Essentials"
+    ],
+    "Toys, Kids & Baby": [
+        "Toys & Games", "Baby Care Products", "Baby Clothing", "Educational Toys", "Kids Furniture"
+    ],
+    "Automotive": [
+        "Bike Accessories", "Car Accessories", "Helmets", "Car Care Products", "Spare Parts"
+    ],
+    "Jewelry & Watches": [
+        "Gold / Silver Jewelry", "Fashion Jewelry", "Smart Watches", "Traditional Jewelry"
+    ],
+    "Gifts & Occasions": [
+        "Birthday Gifts", "Wedding Gifts", "Festival Gifts", "Personalized Items", "Greeting Cards"
+    ],
+    "Festival & Religious Items": [
+        "Puja Items", "Diyas & Lamps", "Incense & Dhoop", "Flowers & Garlands", "Kalash & Thalis", "Kumkum & Turmeric", "Festival Decorations", "Sweets for Festivals"
+    ],
+    "Handicrafts & Traditional Products": [
+        "Wooden Crafts", "Terracotta Items", "Brass & Copper Items", "Handloom Products", "Tribal Art"
+    ],
+    "Digital Products": [
+        "E-books", "Online Courses", "Software Licenses", "Templates", "Subscriptions"
+    ]
+}
+
 
 def create_initial_data():
     print("Creating superuser...")
@@ -19,54 +123,6 @@ def create_initial_data():
         print("Superuser 'admin' already exists")
 
     print("Creating Categories...")
-    
-    categories_data = {
-        "Fashion & Apparel": [
-            "Men's Clothing", "Women's Clothing", "Kids' Wear", "Ethnic Wear", "Footwear", "Accessories (belts, caps, scarves)"
-        ],
-        "Electronics & Gadgets": [
-            "Mobile Phones", "Laptops & Computers", "Headphones & Audio", "Smart Watches", "Cameras", "Computer Accessories"
-        ],
-        "Home & Living": [
-            "Furniture", "Home Décor", "Kitchenware", "Storage & Organization", "Lighting", "Bedding & Bath"
-        ],
-        "Beauty & Personal Care": [
-            "Skincare", "Haircare", "Makeup", "Fragrances", "Grooming Tools", "Organic / Herbal Products"
-        ],
-        "Grocery & Food": [
-            "Fruits & Vegetables", "Packaged Foods", "Snacks & Beverages", "Spices & Masalas", "Sweets & Desserts", "Organic Foods"
-        ],
-        "Health & Wellness": [
-            "Fitness Equipment", "Yoga Accessories", "Supplements", "Ayurvedic Products", "Medical Devices"
-        ],
-        "Sports & Outdoors": [
-            "Sports Equipment", "Gym Accessories", "Outdoor Gear", "Cycling & Hiking", "Camping Products"
-        ],
-        "Books, Stationery & Education": [
-            "Books (Academic, Fiction, Non-fiction)", "Study Materials", "Office Supplies", "Art & Craft Supplies", "School Essentials"
-        ],
-        "Toys, Kids & Baby": [
-            "Toys & Games", "Baby Care Products", "Baby Clothing", "Educational Toys", "Kids Furniture"
-        ],
-        "Automotive": [
-            "Bike Accessories", "Car Accessories", "Helmets", "Car Care Products", "Spare Parts"
-        ],
-        "Jewelry & Watches": [
-            "Gold / Silver Jewelry", "Fashion Jewelry", "Smart Watches", "Traditional Jewelry"
-        ],
-        "Gifts & Occasions": [
-            "Birthday Gifts", "Wedding Gifts", "Festival Gifts", "Personalized Items", "Greeting Cards"
-        ],
-        "Festival & Religious Items": [
-            "Puja Items", "Diyas & Lamps", "Incense & Dhoop", "Flowers & Garlands", "Kalash & Thalis", "Kumkum & Turmeric", "Festival Decorations", "Sweets for Festivals"
-        ],
-        "Handicrafts & Traditional Products": [
-            "Wooden Crafts", "Terracotta Items", "Brass & Copper Items", "Handloom Products", "Tribal Art"
-        ],
-        "Digital Products": [
-            "E-books", "Online Courses", "Software Licenses", "Templates", "Subscriptions"
-        ]
-    }
 
     # Helper to get specific subcategory for product creation
     def get_subcat(parent_name, subcat_name):
@@ -78,7 +134,7 @@ def create_initial_data():
             # Ideally this shouldn't happen if the loop below runs first
             return None
 
-    for parent_name, subcats in categories_data.items():
+    for parent_name, subcats in CATEGORIES_DATA.items():
         parent, _ = Category.objects.get_or_create(name=parent_name, parent=None)
         print(f"  Category: {parent_name}")
         for sub_name in subcats:
@@ -200,5 +256,512 @@ def create_initial_data():
 
     print("Data population complete!")
 
-if __name__ == '__main__':
+
+
+# --- Synthetic shop for load tests -----------------------------------------
+
+BATCH_SIZE = 10_000
+# Generated order numbers use a worker id no live process gets
+SEED_WORKER = order_numbers.MAX_WORKER
+SELLER_EVERY = 20
+HISTORY_DAYS = 3 * 365
+ORDER_DAYS = 365
+CART_DAYS = 30
+# Popularity is Zipf-like past a flat head of about this many items
+SKEW_HEAD = 10
+
+# Share of the catalog, median price (INR) and share of seasonal products
+# for each top-level category of CATEGORIES_DATA
+CATEGORY_PROFILES = {
+    "Fashion & Apparel": (18, 900, 0.15),
+    "Electronics & Gadgets": (10, 6000, 0.05),
+    "Home & Living": (12, 1200, 0.15),
+    "Beauty & Personal Care": (8, 450, 0.10),
+    "Grocery & Food": (8, 250, 0.15),
+    "Health & Wellness": (4, 800, 0.03),
+    "Sports & Outdoors": (4, 1500, 0.03),
+    "Books, Stationery & Education": (6, 350, 0.03),
+    "Toys, Kids & Baby": (5, 700, 0.10),
+    "Automotive": (3, 1100, 0.02),
+    "Jewelry & Watches": (5, 3500, 0.25),
+    "Gifts & Occasions": (6, 650, 0.60),
+    "Festival & Religious Items": (7, 300, 0.75),
+    "Handicrafts & Traditional Products": (3, 900, 0.35),
+    "Digital Products": (1, 500, 0.02),
+}
+PRICE_SIGMA = 0.7
+
+# (festival, month, day, season days before, season days after, share of
+# seasonal products); the same dates are used every year
+FESTIVALS = [
+    ("Makar Sankranti", 1, 14, 10, 2, 3),
+    ("Republic Day", 1, 26, 7, 1, 1),
+    ("Valentine's Day", 2, 14, 10, 1, 3),
+    ("Holi", 3, 14, 14, 2, 6),
+    ("Eid al-Fitr", 3, 31, 14, 3, 5),
+    ("Raksha Bandhan", 8, 9, 14, 1, 6),
+    ("Independence Day", 8, 15, 5, 1, 1),
+    ("Ganesh Chaturthi", 8, 27, 10, 10, 5),
+    ("Navratri", 9, 22, 7, 9, 6),
+    ("Durga Puja", 9, 28, 7, 5, 4),
+    ("Diwali", 10, 20, 21, 3, 15),
+    ("Bhai Dooj", 10, 23, 5, 1, 2),
+    ("Christmas", 12, 25, 21, 2, 7),
+    ("New Year", 12, 31, 7, 2, 3),
+]
+# Share of seasonal products for last, this and next year's seasons
+YEAR_WEIGHTS = (1, 3, 2)
+
+# The codes Cart.apply_coupon accepts
+COUPONS = {'FESTIV20': 20, 'SAVE10': 10, 'HOLI15': 15, 'DIWALI25': 25}
+
+BRAND_STARTS = ["Shri", "Kala", "Desi", "Noor", "Ved", "Utsav", "Rang", "Anand", "Sona", "Veda",
+                "Mitti", "Jyoti", "Roop", "Nirmal", "Tara", "Sakhi", "Param", "Aarna"]
+BRAND_ENDS = ["kart", "craft", "home", "life", "style", "mart", "works", "leaf", "nest", "glow",
+              "tex", "ware", "wala", " & Sons", " Co.", " Naturals"]
+ADJECTIVES = ["Classic", "Premium", "Handmade", "Festive", "Eco-friendly", "Deluxe", "Traditional",
+              "Modern", "Compact", "Organic", "Royal", "Everyday", "Vintage", "Smart", "Luxury",
+              "Lightweight", "Hand-painted", "Limited Edition"]
+VARIANTS = ["", "", "", "Set of 2", "Pack of 3", "Combo", "Gift Box", "XL", "Mini", "Pro",
+            "Family Pack", "2026 Edition"]
+MATERIALS = ["cotton", "brass", "silk", "terracotta", "sheesham wood", "recycled paper", "steel",
+             "bamboo", "jute", "khadi", "silver-plated metal", "natural ingredients"]
+PITCHES = ["Perfect for gifting.", "Made by local artisans.", "Ships in 2 days.",
+           "Loved by thousands of customers.", "A festive favourite.", "Easy returns within 7 days."]
+FIRST_NAMES = ["Aarav", "Vivaan", "Aditya", "Arjun", "Sai", "Reyansh", "Krishna", "Ishaan", "Rohan",
+               "Kabir", "Ananya", "Diya", "Saanvi", "Aadhya", "Pari", "Myra", "Ira", "Meera", "Kavya",
+               "Priya", "Fatima", "Zoya", "Imran", "Joseph", "Maria", "Harpreet", "Gurpreet", "Lakshmi",
+               "Nikhil", "Sneha"]
+LAST_NAMES = ["Sharma", "Verma", "Patel", "Reddy", "Iyer", "Nair", "Gupta", "Singh", "Khan", "Das",
+              "Mukherjee", "Rao", "Joshi", "Kulkarni", "Menon", "Fernandes", "Chopra", "Mehta",
+              "Banerjee", "Pillai", "Shaikh", "Bose", "Yadav", "Gill"]
+STREETS = ["MG Road", "Station Road", "Gandhi Nagar", "Park Street", "Nehru Marg", "Temple Street",
+           "Lake View Road", "Market Lane", "Church Street", "Ring Road"]
+# (city, first three digits of its PIN codes)
+CITIES = [("Mumbai", "400"), ("Delhi", "110"), ("Bengaluru", "560"), ("Hyderabad", "500"),
+          ("Chennai", "600"), ("Kolkata", "700"), ("Pune", "411"), ("Ahmedabad", "380"),
+          ("Jaipur", "302"), ("Lucknow", "226"), ("Kochi", "682"), ("Indore", "452"),
+          ("Chandigarh", "160"), ("Bhopal", "462"), ("Patna", "800"), ("Guwahati", "781")]
+PAYMENT_METHODS = (('cod', 'upi', 'card'), (45, 35, 20))
+ORDER_SIZES = ((1, 2, 3, 4, 5), (45, 25, 15, 9, 6))
+CART_SIZES = ((1, 2, 3, 4, 5, 6), (35, 25, 17, 11, 7, 5))
+QUANTITIES = ((1, 2, 3), (80, 15, 5))
+DISCOUNTS = ((0, 5, 10, 15, 20, 25, 30, 40, 50), (55, 6, 10, 6, 8, 5, 4, 3, 3))
+
+# Columns written for each generated table, in row order
+COLUMNS = {
+    'users': (User, ('id', 'password', 'last_login', 'is_superuser', 'username', 'first_name',
+                     'last_name', 'email', 'is_staff', 'is_active', 'date_joined')),
+    'profiles': (UserProfile, ('user_id', 'is_business', 'business_name', 'badges', 'level',
+                               'total_points', 'product_count', 'seasonal_count', 'order_count',
+                               'account_age_days')),
+    'products': (Product, ('id', 'name', 'description', 'price', 'category_id', 'image', 'image_url',
+                           'image_variants', 'stock', 'discount_percent', 'is_seasonal', 'season_id',
+                           'available', 'seller_id', 'created_at')),
+    'product_occasions': (Product.occasions.through, ('product_id', 'occasion_id')),
+    'carts': (Cart, ('id', 'user_id', 'session_key', 'created_at', 'updated_at', 'coupon_code',
+                     'discount_percent')),
+    'cart_items': (CartItem, ('cart_id', 'product_id', 'quantity', 'added_at')),
+    'orders': (Order, ('id', 'user_id', 'order_number', 'status', 'full_name', 'email', 'phone',
+                       'address', 'city', 'postal_code', 'subtotal', 'discount_amount', 'tax_amount',
+                       'shipping_cost', 'total', 'coupon_code', 'payment_method', 'payment_status',
+                       'created_at', 'updated_at')),
+    'order_items': (OrderItem, ('order_id', 'product_id', 'product_name', 'quantity', 'unit_price',
+                                'line_total')),
+}
+
+
+def create_calendar(today):
+    """Seasons and occasions of FESTIVALS around `today`, as (weight, season id, occasion id)."""
+    calendar = []
+    for year, year_weight in zip((today.year - 1, today.year, today.year + 1), YEAR_WEIGHTS):
+        for name, month, day, before, after, weight in FESTIVALS:
+            date = datetime.date(year, month, day)
+            season, _ = Season.objects.get_or_create(
+                name=f"{name} {year}",
+                defaults={
+                    'start_date': date - timedelta(days=before),
+                    'end_date': date + timedelta(days=after),
+                    'description': f"Everything you need for {name}.",
+                },
+            )
+            occasion, _ = Occasion.objects.get_or_create(
+                name=f"{name} {year}", defaults={'date': date, 'description': f"{name} {year}"},
+            )
+            calendar.append((weight * year_weight, season.pk, occasion.pk))
+    return calendar
+
+
+def _next_id(model):
+    return (model.objects.aggregate(m=Max('id'))['m'] or 0) + 1
+
+
+def _stride(n):
+    """A multiplier coprime to n, to scatter ranks over a pool."""
+    stride = 2654435761 % n if n > 1 else 1
+    while math.gcd(stride, n) != 1:
+        stride += 1
+    return stride
+
+
+def _skewed(rng, n):
+    """A rank in [0, n) with P(rank k) roughly proportional to 1 / (k + SKEW_HEAD)."""
+    return min(int(SKEW_HEAD * ((n + SKEW_HEAD) / SKEW_HEAD) ** rng.random()) - SKEW_HEAD, n - 1)
+
+
+def _pick(rng, pool, stride):
+    # Ranks are scattered, so the popular items are not all the oldest ones
+    return pool[_skewed(rng, len(pool)) * stride % len(pool)]
+
+
+def _stamp(moment):
+    """Naive UTC text, the way Django stores datetimes in SQLite."""
+    return moment.astimezone(datetime.timezone.utc).replace(tzinfo=None).isoformat(' ')
+
+
+def _person(user_id):
+    """Name and username of a generated user, derived from the id alone."""
+    first = FIRST_NAMES[user_id * 2654435761 % len(FIRST_NAMES)]
+    last = LAST_NAMES[user_id * 40503 % len(LAST_NAMES)]
+    return first, last, f"{first}.{last}{user_id}".lower()
+
+
+def _users(plan, rng, first_id, count):
+    users, profiles = [], []
+    start, span, n = plan['history_start'], HISTORY_DAYS * 86400, plan['users'][1]
+    for user_id in range(first_id, first_id + count):
+        i = user_id - plan['users'][0]
+        first, last, username = _person(user_id)
+        joined = start + timedelta(seconds=span * (i + rng.random()) / n)
+        users.append((user_id, plan['password'], None, False, username, first, last,
+                      f"{username}@example.com", False, True, _stamp(joined)))
+        business = i % SELLER_EVERY == 0
+        business_name = f"{rng.choice(BRAND_STARTS)}{rng.choice(BRAND_ENDS)} Traders" if business else ''
+        profiles.append((user_id, business, business_name, '[]', 1, 0, 0, 0, 0, 0))
+    return {'users': users, 'profiles': profiles}
+
+
+def _products(plan, rng, first_id, count):
+    products, occasions = [], []
+    parents, weights = plan['categories']
+    calendar, calendar_weights = plan['calendar']
+    sellers = plan['sellers']
+    start, span, n = plan['history_start'], HISTORY_DAYS * 86400, plan['products'][1]
+    for product_id in range(first_id, first_id + count):
+        i = product_id - plan['products'][0]
+        median, seasonal_share, subcategories = rng.choices(parents, cum_weights=weights)[0]
+        category_id, label = rng.choice(subcategories)
+        brand = rng.choice(BRAND_STARTS) + rng.choice(BRAND_ENDS)
+        adjective = rng.choice(ADJECTIVES)
+        name = f"{brand} {adjective} {label} {rng.choice(VARIANTS)}".strip()
+        description = (f"{adjective} {label.lower()} in {rng.choice(MATERIALS)} from {brand}. "
+                       f"{rng.choice(PITCHES)}")
+        price = max(19, rng.lognormvariate(math.log(median), PRICE_SIGMA))
+        price = f"{int(price)}.{'99' if price < 1000 else '00'}"
+        stock = 0 if rng.random() < 0.04 else min(1 + int(rng.expovariate(1 / 25)), 5000)
+        seasonal = rng.random() < seasonal_share and bool(calendar)
+        season_id = None
+        if seasonal:
+            weight, season_id, occasion_id = rng.choices(calendar, cum_weights=calendar_weights)[0]
+            if rng.random() < 0.4:
+                occasions.append((product_id, occasion_id))
+        seller_id = sellers[_skewed(rng, len(sellers))] if sellers and rng.random() < 0.85 else None
+        created = start + timedelta(seconds=span * (i + rng.random()) / n)
+        products.append((product_id, name[:200], description, price, category_id, None, None, '{}',
+                         stock, rng.choices(*DISCOUNTS)[0], seasonal, season_id,
+                         rng.random() >= 0.03, seller_id, _stamp(created)))
+    return {'products': products, 'product_occasions': occasions}
+
+
+def _basket(rng, plan, sizes):
+    pool, stride = plan['product_pool']
+    size = rng.choices(*sizes)[0]
+    return list(dict.fromkeys(_pick(rng, pool, stride) for _ in range(size)))
+
+
+def _carts(plan, rng, first_id, count):
+    carts, items = [], []
+    buyers, buyer_stride = plan['buyers']
+    # Only users generated in this run are known to have no cart yet
+    user_carts = min(len(buyers), plan['carts'][1] * 3 // 5) if plan['users'][1] else 0
+    now = plan['now']
+    for cart_id in range(first_id, first_id + count):
+        i = cart_id - plan['carts'][0]
+        if i < user_carts:
+            user_id, session_key = buyers[i * buyer_stride % len(buyers)], None
+        else:
+            user_id, session_key = None, f"{rng.getrandbits(128):032x}"
+        created = now - timedelta(seconds=rng.random() * CART_DAYS * 86400)
+        coupon = rng.choice(list(COUPONS)) if rng.random() < 0.08 else None
+        added = created
+        for product_id in _basket(rng, plan, CART_SIZES):
+            added = min(now, added + timedelta(seconds=rng.expovariate(1 / 3600)))
+            items.append((cart_id, product_id, rng.choices(*QUANTITIES)[0], _stamp(added)))
+        carts.append((cart_id, user_id, session_key, _stamp(created), _stamp(added), coupon,
+                      COUPONS.get(coupon, 0)))
+    return {'carts': carts, 'cart_items': items}
+
+
+def _status(rng, age_days, method):
+    if age_days < 1:
+        status = rng.choices(('pending', 'confirmed'), (55, 45))[0]
+    elif age_days < 3:
+        status = rng.choices(('confirmed', 'shipped', 'cancelled'), (50, 45, 5))[0]
+    elif age_days < 7:
+        status = rng.choices(('shipped', 'delivered', 'cancelled'), (45, 45, 10))[0]
+    else:
+        status = rng.choices(('delivered', 'cancelled'), (90, 10))[0]
+    if status == 'cancelled':
+        return status, 'pending' if method == 'cod' else 'refunded'
+    return status, 'paid' if method != 'cod' or status == 'delivered' else 'pending'
+
+
+def _order_window(now, count):
+    """(first millisecond, length in ms) of the order numbers this run can use."""
+    window_start = max(order_numbers.EPOCH, now - timedelta(days=ORDER_DAYS))
+    start_ms = int((window_start - order_numbers.EPOCH).total_seconds() * 1000)
+    end_ms = int((now - order_numbers.EPOCH).total_seconds() * 1000)
+    # Order numbers sort by time: start after the newest one before now
+    newest = (Order.objects.filter(order_number__lt=order_numbers.PREFIX + order_numbers.encode(
+        max(end_ms, 0) << (order_numbers.WORKER_BITS + order_numbers.SEQUENCE_BITS)))
+        .order_by('-order_number').values_list('order_number', flat=True).first())
+    if newest:
+        created = order_numbers.decode(newest)[0]
+        start_ms = max(start_ms, int((created - order_numbers.EPOCH).total_seconds() * 1000) + 1)
+    span_ms = end_ms - start_ms
+    if count and span_ms * (order_numbers.MAX_SEQUENCE + 1) < count:
+        raise ValueError(f"No room for {count} order numbers between the newest order and --today: "
+                         f"pass a later --today or fewer --orders")
+    return start_ms, span_ms
+
+
+def _orders(plan, rng, first_id, count):
+    orders, items = [], []
+    buyers, buyer_stride = plan['buyers']
+    now = plan['now']
+    start_ms, span_ms = plan['order_window']
+    n = plan['orders'][1]
+    for order_id in range(first_id, first_id + count):
+        i = order_id - plan['orders'][0]
+        millis = start_ms + span_ms * i // n
+        # Orders before this one in the same millisecond: at most 128 fit
+        sequence = i + (start_ms - millis) * n // span_ms
+        value = (millis << (order_numbers.WORKER_BITS + order_numbers.SEQUENCE_BITS)) | \
+            (SEED_WORKER << order_numbers.SEQUENCE_BITS) | sequence
+        created = order_numbers.EPOCH + timedelta(milliseconds=millis)
+        # Half the orders come from a skewed head of repeat customers
+        if rng.random() < 0.5:
+            user_id = _pick(rng, buyers, buyer_stride)
+        else:
+            user_id = buyers[rng.randrange(len(buyers))]
+        first, last, username = _person(user_id)
+        city, pin = rng.choice(CITIES)
+        method = rng.choices(*PAYMENT_METHODS)[0]
+        age_days = (now - created).total_seconds() / 86400
+        status, payment_status = _status(rng, age_days, method)
+        updated = created + timedelta(days=min(age_days, rng.uniform(0, 6)))
+        orders.append((
+            order_id, user_id, order_numbers.PREFIX + order_numbers.encode(value), status,
+            f"{first} {last}", f"{username}@example.com", f"9{rng.randrange(10 ** 9):09d}",
+            f"{rng.randint(1, 400)}, {rng.choice(STREETS)}", city, f"{pin}{rng.randrange(1000):03d}",
+            0, 0, 0, 0, 0, rng.choice(list(COUPONS)) if rng.random() < 0.12 else None,
+            method, payment_status, _stamp(created), _stamp(updated),
+        ))
+        for product_id in _basket(rng, plan, ORDER_SIZES):
+            items.append((order_id, product_id, '', rng.choices(*QUANTITIES)[0], 0, 0))
+    return {'orders': orders, 'order_items': items}
+
+
+GENERATORS = {'users': _users, 'products': _products, 'carts': _carts, 'orders': _orders}
+_plan = None
+
+
+def _init_worker(plan):
+    global _plan
+    _plan = plan
+
+
+def _generate(task):
+    kind, chunk, first_id, count = task
+    rng = random.Random(f"{_plan['seed']}:{kind}:{chunk}")
+    return task, GENERATORS[kind](_plan, rng, first_id, count)
+
+
+def _price_orders(cursor, first_id, last_id):
+    """Fill order lines from product prices and order totals from their lines, as checkout does."""
+    q = connection.ops.quote_name
+    order, item, product = (q(m._meta.db_table) for m in (Order, OrderItem, Product))
+    unit_price = 'ROUND(p.price * (100 - p.discount_percent) / 100.0, 2)'
+    cursor.execute(
+        f'UPDATE {item} SET product_name = p.name, unit_price = {unit_price}, '
+        f'line_total = {unit_price} * {item}.quantity '
+        f'FROM {product} p WHERE p.id = {item}.product_id AND {item}.order_id BETWEEN %s AND %s',
+        [first_id, last_id],
+    )
+    percent = 'CASE o.coupon_code ' + ' '.join(f"WHEN '{code}' THEN {pct}" for code, pct in COUPONS.items()) \
+        + ' ELSE 0 END'
+    cursor.execute(
+        f'''
+        UPDATE {order} SET subtotal = t.subtotal, discount_amount = t.discount, tax_amount = t.tax,
+            shipping_cost = t.shipping, total = t.subtotal - t.discount + t.tax + t.shipping
+        FROM (
+            SELECT d.*, ROUND((d.subtotal - d.discount) * %s, 2) AS tax,
+                   CASE WHEN d.subtotal >= %s THEN 0 ELSE %s END AS shipping
+            FROM (
+                SELECT i.order_id, SUM(i.line_total) AS subtotal,
+                       ROUND(SUM(i.line_total) * {percent} / 100.0, 2) AS discount
+                FROM {item} i JOIN {order} o ON o.id = i.order_id
+                WHERE i.order_id BETWEEN %s AND %s
+                GROUP BY i.order_id
+            ) d
+        ) t
+        WHERE {order}.id = t.order_id
+        ''',
+        [float(pricing.TAX_RATE), float(pricing.FREE_SHIPPING_THRESHOLD), float(pricing.FLAT_SHIPPING),
+         first_id, last_id],
+    )
+
+
+def _write(task, tables):
+    kind, chunk, first_id, count = task
+    q = connection.ops.quote_name
+    with transaction.atomic(), connection.cursor() as cursor:
+        for name, rows in tables.items():
+            if not rows:
+                continue
+            model, columns = COLUMNS[name]
+            cursor.executemany(
+                f'INSERT INTO {q(model._meta.db_table)} ({", ".join(q(c) for c in columns)}) '
+                f'VALUES ({", ".join(["%s"] * len(columns))})',
+                rows,
+            )
+        if kind == 'orders':
+            _price_orders(cursor, first_id, first_id + count - 1)
+
+
+def _plan_for(products, users, orders, carts, seed, today, password):
+    now = datetime.datetime.combine(today, datetime.time(), tzinfo=datetime.timezone.utc)
+    plan = {'seed': seed, 'now': now, 'history_start': now - timedelta(days=HISTORY_DAYS)}
+    for kind, model, count in (('users', User, users), ('products', Product, products),
+                               ('carts', Cart, carts), ('orders', Order, orders)):
+        plan[kind] = (_next_id(model), count)
+    plan['order_window'] = _order_window(now, orders)
+
+    tree = {parent.name: parent for parent in Category.objects.filter(parent=None, name__in=CATEGORIES_DATA)}
+    parents, weights, total = [], [], 0
+    for name, (weight, median, seasonal_share) in CATEGORY_PROFILES.items():
+        subcategories = [
+            (pk, sub.split(' (')[0])
+            for pk, sub in Category.objects.filter(parent=tree[name]).order_by('pk').values_list('pk', 'name')
+        ]
+        total += weight
+        parents.append((median, seasonal_share, subcategories))
+        weights.append(total)
+    plan['categories'] = (parents, weights)
+
+    calendar = create_calendar(today)
+    plan['calendar'] = (calendar, list(itertools.accumulate(weight for weight, season, occasion in calendar)))
+
+    first_user = plan['users'][0]
+    if users:
+        sellers = range(first_user, first_user + users, SELLER_EVERY)
+        buyers = range(first_user, first_user + users)
+    else:
+        sellers = list(UserProfile.objects.filter(is_business=True).order_by('user_id')
+                       .values_list('user_id', flat=True))
+        buyers = list(User.objects.filter(is_staff=False).order_by('pk').values_list('pk', flat=True))
+    if products:
+        pool = range(plan['products'][0], plan['products'][0] + products)
+    else:
+        pool = list(Product.objects.filter(available=True).order_by('pk').values_list('pk', flat=True))
+    if (orders or carts) and not (buyers and pool):
+        raise ValueError("Orders and carts need customers and products: pass --users and --products")
+    plan['sellers'] = sellers
+    plan['buyers'] = (buyers, _stride(len(buyers) or 1))
+    plan['product_pool'] = (pool, _stride(len(pool) or 1))
+    # One hash for every generated user: hashing each would dominate the run
+    plan['password'] = make_password(password, salt=f"seed{seed}")
+    return plan
+
+
+def generate(products=0, users=0, orders=0, carts=0, seed=0, workers=1, batch_size=BATCH_SIZE,
+             today=None, password='password', derived=True):
+    """Generate a synthetic shop on top of the existing data (see the module docstring)."""
+    today = today or timezone.now().date()
+    plan = _plan_for(products, users, orders, carts, seed, today, password)
+    tasks = [
+        (kind, chunk, first_id + offset, min(batch_size, count - offset))
+        for kind in GENERATORS
+        for first_id, count in [plan[kind]]
+        for chunk, offset in enumerate(range(0, count, batch_size))
+    ]
+    done = dict.fromkeys(GENERATORS, 0)
+    started = time.perf_counter()
+
+    def write(task, tables):
+        _write(task, tables)
+        kind = task[0]
+        done[kind] += task[3]
+        if done[kind] == plan[kind][1]:
+            print(f"  {kind}: {done[kind]} rows ({time.perf_counter() - started:.0f}s)")
+
+    _init_worker(plan)
+    if workers > 1:
+        with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(plan,)) as pool:
+            # Chunks are written in order; a bounded queue keeps memory flat
+            pending = collections.deque()
+            for task in tasks:
+                pending.append(pool.apply_async(_generate, (task,)))
+                if len(pending) >= workers * 2:
+                    write(*pending.popleft().get())
+            while pending:
+                write(*pending.popleft().get())
+    else:
+        for task in tasks:
+            write(*_generate(task))
+
+    if derived:
+        print("Rebuilding points, leaderboard and related products...")
+        points.rebuild_points()
+        related.rebuild_related_index()
+    merchandising.invalidate_snapshot()
+    product_detail.invalidate_all()
+    product_detail.invalidate_categories(Category.objects.values_list('pk', flat=True))
+    print(f"Generated data in {time.perf_counter() - started:.0f}s")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--products', type=int, default=0)
+    parser.add_argument('--users', type=int, default=0)
+    parser.add_argument('--orders', type=int, default=0)
+    parser.add_argument('--carts', type=int, help="Open carts (default: a fifth of --users)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=1, help="Processes generating rows")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help="Rows per chunk and transaction")
+    parser.add_argument('--today', type=datetime.date.fromisoformat,
+                        help="Date the data is generated around, YYYY-MM-DD (default: today)")
+    parser.add_argument('--password', default='password', help="Password of every generated user")
+    parser.add_argument('--skip-derived', action='store_true',
+                        help="Do not rebuild points, leaderboard and related products")
+    parser.add_argument('--db', help="SQLite file to seed (migrated first) instead of the project database")
+    args = parser.parse_args(argv)
+
+    if args.db:
+        # No connection is open yet, so this is the database everything below uses
+        settings.DATABASES['default']['NAME'] = args.db
+        for alias in settings.REPLICAS:
+            # Replicas of the seeded file, not of the project database
+            settings.DATABASES[alias]['NAME'] = f'{args.db}.{alias}'
+        call_command('migrate', verbosity=0)
     create_initial_data()
+    carts = args.users // 5 if args.carts is None else args.carts
+    if args.products or args.users or args.orders or carts:
+        print("Generating synthetic data...")
+        generate(args.products, args.users, args.orders, carts, seed=args.seed, workers=args.workers,
+                 batch_size=args.batch_size, today=args.today, password=args.password,
+                 derived=not args.skip_derived)
+
+
+if __name__ == '__main__':
+    main()